@@ -58,6 +58,10 @@ class ApiClient:
         the API.
     :param cookie: a cookie to include in the header when making calls
         to the API
+    :param response_cache: optional response_cache.ResponseCache used to
+        serve GET requests on rarely-changing endpoints.
+    :param single_flight: optional single_flight.SingleFlight used to
+        coalesce identical concurrent idempotent requests.
     """
 
     PRIMITIVE_TYPES = (float, bool, bytes, str, int)
@@ -75,7 +79,13 @@ class ApiClient:
     _pool = None
 
     def __init__(
-        self, configuration=None, header_name=None, header_value=None, cookie=None
+        self,
+        configuration=None,
+        header_name=None,
+        header_value=None,
+        cookie=None,
+        response_cache=None,
+        single_flight=None,
     ) -> None:
         # use default configuration if none is provided
         if configuration is None:
@@ -87,6 +97,8 @@ class ApiClient:
         if header_name is not None:
             self.default_headers[header_name] = header_value
         self.cookie = cookie
+        self.response_cache = response_cache
+        self.single_flight = single_flight
         # Set default User-Agent.
         self.user_agent = "OpenAPI-Generator/1.2.2/python"
         self.client_side_validation = configuration.client_side_validation
@@ -254,17 +266,32 @@ class ApiClient:
         :return: RESTResponse
         """
 
-        try:
-            # perform request and return response
-            response_data = self.rest_client.request(
+        def send(headers):
+            return self.rest_client.request(
                 method,
                 url,
-                headers=header_params,
+                headers=headers,
                 body=body,
                 post_params=post_params,
                 _request_timeout=_request_timeout,
             )
 
+        fetch = send
+        single_flight = self.single_flight
+        if single_flight is not None and single_flight.accepts(method):
+
+            def deduplicated(headers):
+                return single_flight.request(method, url, headers, send)
+
+            fetch = deduplicated
+
+        try:
+            # perform request and return response
+            if self.response_cache is not None and method.upper() == "GET":
+                response_data = self.response_cache.request(url, header_params, fetch)
+            else:
+                response_data = fetch(header_params)
+
         except ApiException as e:
             raise e
 
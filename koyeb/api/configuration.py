@@ -329,6 +329,10 @@ class Configuration:
         self.retries = retries
         """Adding retries to override urllib3 default value 3
         """
+        self.rate_limiter = None
+        """Optional rate_limit.RateLimiter throttling requests per host and
+           token, with Retry-After aware backoff on 429/502/503/504
+        """
         # Enable client side validation
         self.client_side_validation = True
 
@@ -0,0 +1,426 @@
+# coding: utf-8
+
+"""
+Koyeb Rest API - incremental event watcher
+
+Follows the ``list_*_events`` endpoints of many resources from a single
+loop and yields each new event once::
+
+    watcher = EventWatcher(api_client)
+    for instance_id in instance_ids:
+        watcher.watch("instance", instance_id)
+    watcher.on(alert, types=["instance.oom", "instance.crash"])
+
+    for watched in watcher:
+        print(watched.kind, watched.resource_id, watched.event.message)
+"""  # noqa: E501
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    FrozenSet,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+
+from koyeb.api.api.apps_api import AppsApi
+from koyeb.api.api.deployments_api import DeploymentsApi
+from koyeb.api.api.instances_api import InstancesApi
+from koyeb.api.api.persistent_volumes_api import PersistentVolumesApi
+from koyeb.api.api.services_api import ServicesApi
+from koyeb.api.api_client import ApiClient
+from koyeb.api.log_stream import iterate_in_thread
+
+logger = logging.getLogger(__name__)
+
+# kind -> (API class, list method, filter parameter, resource id attribute)
+EVENT_SOURCES = {
+    "app": (AppsApi, "list_app_events", "app_id", "app_id"),
+    "service": (ServicesApi, "list_service_events", "service_id", "service_id"),
+    "deployment": (
+        DeploymentsApi,
+        "list_deployment_events",
+        "deployment_id",
+        "deployment_id",
+    ),
+    "instance": (InstancesApi, "list_instance_events", "instance_ids", "instance_id"),
+    "persistent_volume": (
+        PersistentVolumesApi,
+        "list_persistent_volume_events",
+        "persistent_volume_id",
+        "persistent_volume_id",
+    ),
+}
+
+# Kinds whose endpoint accepts several resource ids in one request
+_BATCHED_KINDS = frozenset(["instance"])
+
+# Number of event ids remembered per resource for deduplication
+_RECENT_IDS = 256
+
+
+@dataclass
+class WatchedEvent:
+    """An event of a watched resource."""
+
+    kind: str
+    resource_id: str
+    event: Any  # AppEvent, ServiceEvent, DeploymentEvent, InstanceEvent...
+
+
+@dataclass
+class _Handler:
+
+    callback: Callable[[WatchedEvent], None]
+    kinds: Optional[FrozenSet[str]] = None
+    types: Optional[FrozenSet[str]] = None
+
+    def matches(self, watched: WatchedEvent) -> bool:
+        if self.kinds is not None and watched.kind not in self.kinds:
+            return False
+        return self.types is None or watched.event.type in self.types
+
+
+@dataclass
+class _Target:
+    """Cursor and schedule of a watched resource."""
+
+    kind: str
+    resource_id: str
+    types: Optional[Tuple[str, ...]]
+    cursor: datetime
+    interval: float
+    due: float = 0.0
+    in_flight: bool = False
+    removed: bool = False
+    recent: "OrderedDict[str, None]" = field(default_factory=OrderedDict)
+
+    def accept(self, event) -> bool:
+        """Returns whether ``event`` is new, and advances the cursor if so."""
+        when = event.when
+        if when is not None and when < self.cursor:
+            return False
+        if event.id is not None:
+            if event.id in self.recent:
+                return False
+            self.recent[event.id] = None
+            if len(self.recent) > _RECENT_IDS:
+                self.recent.popitem(last=False)
+        if when is not None:
+            self.cursor = when
+        return True
+
+
+def _aware(value: datetime) -> datetime:
+    return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
+
+
+class EventWatcher:
+    """Polls the events of many resources and yields only new ones.
+
+    Each watched resource keeps a cursor (the time of its last event and the
+    ids of its recent events). A poll reads the newest events in small pages
+    and stops at the first page reaching the cursor, so an idle resource
+    costs one small request per poll instead of a full page re-read.
+    Instances are polled in batches, since ``list_instance_events`` accepts
+    several ids.
+
+    Polling intervals adapt per resource: a poll returning events resets the
+    interval to ``min_interval``, an empty poll multiplies it by ``backoff``
+    up to ``max_interval``. A single loop schedules every resource and runs
+    the due polls in a pool of ``concurrency`` threads.
+
+    Iterate with ``for`` or ``async for``; handlers registered with ``on``
+    are called for each matching event as it is iterated. ``run()`` iterates
+    until ``close()`` is called.
+
+    :param api_client: ApiClient to use. Defaults to ``ApiClient.get_default()``.
+    :param min_interval: shortest delay between two polls of a resource.
+    :param max_interval: longest delay between two polls of a resource.
+    :param backoff: growth factor of the interval after an empty poll.
+    :param page_size: events requested per page.
+    :param max_pages: pages read per poll before giving up on catching up.
+    :param concurrency: maximum number of concurrent polls.
+    :param batch_size: maximum number of instances polled by one request.
+    """
+
+    def __init__(
+        self,
+        api_client: Optional[ApiClient] = None,
+        min_interval: float = 2.0,
+        max_interval: float = 60.0,
+        backoff: float = 1.5,
+        page_size: int = 20,
+        max_pages: int = 10,
+        concurrency: int = 8,
+        batch_size: int = 50,
+    ) -> None:
+        if not 0 < min_interval <= max_interval:
+            raise ValueError("intervals must satisfy 0 < min_interval <= max_interval")
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+        api_client = api_client or ApiClient.get_default()
+        self._apis = {
+            kind: api_class(api_client)
+            for kind, (api_class, _, _, _) in EVENT_SOURCES.items()
+        }
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.requests = 0
+        self._targets: Dict[Tuple[str, str], _Target] = {}
+        self._schedule: List[Tuple[float, int, _Target]] = []
+        self._counter = itertools.count()
+        self._handlers: List[_Handler] = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = threading.Event()
+
+    def watch(
+        self,
+        kind: str,
+        resource_id: str,
+        since: Optional[datetime] = None,
+        types: Optional[Iterable[str]] = None,
+    ) -> None:
+        """Starts watching the events of a resource.
+
+        :param kind: ``"app"``, ``"service"``, ``"deployment"``, ``"instance"``
+            or ``"persistent_volume"``.
+        :param resource_id: id of the resource.
+        :param since: report events from this time. Defaults to now, so only
+            events occurring after the call are reported.
+        :param types: only report events of these types.
+        """
+        if kind not in EVENT_SOURCES:
+            raise ValueError(
+                f"Unknown event source {kind!r}, expected one of {sorted(EVENT_SOURCES)}"
+            )
+        target = _Target(
+            kind=kind,
+            resource_id=resource_id,
+            types=tuple(sorted(types)) if types else None,
+            cursor=_aware(since) if since else datetime.now(timezone.utc),
+            interval=self.min_interval,
+        )
+        with self._lock:
+            previous = self._targets.get((kind, resource_id))
+            if previous is not None:
+                previous.removed = True
+            self._targets[(kind, resource_id)] = target
+            self._push(target, time.monotonic())
+        self._wakeup.set()
+
+    def unwatch(self, kind: str, resource_id: str) -> None:
+        """Stops watching a resource."""
+        with self._lock:
+            target = self._targets.pop((kind, resource_id), None)
+            if target is not None:
+                target.removed = True
+
+    def watched(self) -> List[Tuple[str, str]]:
+        """Returns the (kind, resource id) pairs being watched."""
+        with self._lock:
+            return list(self._targets)
+
+    def on(
+        self,
+        callback: Callable[[WatchedEvent], None],
+        kinds: Optional[Iterable[str]] = None,
+        types: Optional[Iterable[str]] = None,
+    ) -> None:
+        """Registers a handler called with each matching event.
+
+        :param callback: callable receiving a WatchedEvent. Exceptions it
+            raises are logged and do not stop the watcher.
+        :param kinds: only call it for these resource kinds.
+        :param types: only call it for these event types.
+        """
+        self._handlers.append(
+            _Handler(
+                callback,
+                frozenset(kinds) if kinds is not None else None,
+                frozenset(types) if types is not None else None,
+            )
+        )
+
+    def close(self) -> None:
+        """Stops the watcher."""
+        self._closed.set()
+        self._wakeup.set()
+
+    def run(self) -> None:
+        """Dispatches events to the handlers until ``close()`` is called."""
+        for _ in self:
+            pass
+
+    def __iter__(self) -> Iterator[WatchedEvent]:
+        pool = ThreadPoolExecutor(
+            max_workers=self.concurrency, thread_name_prefix="koyeb-event-watch"
+        )
+        in_flight: Dict[Future[List[WatchedEvent]], List[_Target]] = {}
+        try:
+            while not self._closed.is_set():
+                for batch in self._due_batches():
+                    in_flight[pool.submit(self._poll, batch)] = batch
+
+                timeout = self._next_due()
+                if in_flight:
+                    # Resources watched meanwhile are picked up without delay
+                    timeout = min(timeout, self.min_interval)
+                    done, _ = wait(
+                        in_flight, timeout=timeout, return_when=FIRST_COMPLETED
+                    )
+                else:
+                    self._wakeup.wait(timeout)
+                    self._wakeup.clear()
+                    continue
+
+                for future in done:
+                    batch = in_flight.pop(future)
+                    try:
+                        events = future.result()
+                    except Exception as e:
+                        logger.warning(
+                            f"Could not poll {batch[0].kind} events "
+                            f"({len(batch)} resources): {e}"
+                        )
+                        events = []
+                    self._reschedule(batch, events)
+                    for watched in events:
+                        self._dispatch(watched)
+                        yield watched
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def __aiter__(self) -> AsyncIterator[WatchedEvent]:
+        return iterate_in_thread(self.__iter__, self.close)
+
+    def _push(self, target: _Target, due: float) -> None:
+        target.due = due
+        heapq.heappush(self._schedule, (due, next(self._counter), target))
+
+    def _next_due(self) -> float:
+        with self._lock:
+            while self._schedule and self._schedule[0][2].removed:
+                heapq.heappop(self._schedule)
+            if not self._schedule:
+                return self.max_interval
+            return max(
+                0.0, min(self.max_interval, self._schedule[0][0] - time.monotonic())
+            )
+
+    def _due_batches(self) -> List[List[_Target]]:
+        now = time.monotonic()
+        due: List[_Target] = []
+        with self._lock:
+            while self._schedule and self._schedule[0][0] <= now:
+                _, _, target = heapq.heappop(self._schedule)
+                if target.removed or target.in_flight or target.due > now:
+                    continue
+                target.in_flight = True
+                due.append(target)
+
+        batches: List[List[_Target]] = []
+        groups: Dict[Tuple[str, Optional[Tuple[str, ...]]], List[_Target]] = {}
+        for target in due:
+            if target.kind in _BATCHED_KINDS:
+                groups.setdefault((target.kind, target.types), []).append(target)
+            else:
+                batches.append([target])
+        for group in groups.values():
+            for i in range(0, len(group), self.batch_size):
+                batches.append(group[i : i + self.batch_size])
+        return batches
+
+    def _reschedule(self, batch: List[_Target], events: List[WatchedEvent]) -> None:
+        active = {w.resource_id for w in events}
+        now = time.monotonic()
+        with self._lock:
+            for target in batch:
+                target.in_flight = False
+                if target.removed:
+                    continue
+                if target.resource_id in active:
+                    target.interval = self.min_interval
+                else:
+                    target.interval = min(
+                        self.max_interval, target.interval * self.backoff
+                    )
+                self._push(target, now + target.interval)
+
+    def _dispatch(self, watched: WatchedEvent) -> None:
+        for handler in list(self._handlers):
+            if not handler.matches(watched):
+                continue
+            try:
+                handler.callback(watched)
+            except Exception as e:
+                logger.exception(f"Event handler {handler.callback!r} failed: {e}")
+
+    def _poll(self, batch: List[_Target]) -> List[WatchedEvent]:
+        kind = batch[0].kind
+        _, method, param, id_attr = EVENT_SOURCES[kind]
+        list_events = getattr(self._apis[kind], method)
+        ids = [t.resource_id for t in batch]
+        oldest_cursor = min(t.cursor for t in batch)
+
+        fetched: List[Any] = []
+        offset = 0
+        for page in range(self.max_pages):
+            with self._lock:
+                self.requests += 1
+            reply = list_events(
+                **{param: ids if kind in _BATCHED_KINDS else ids[0]},
+                types=list(batch[0].types) if batch[0].types else None,
+                limit=str(self.page_size),
+                offset=str(offset),
+                order="desc",
+            )
+            events = reply.events or []
+            fetched.extend(events)
+            offset += len(events)
+            reached = any(e.when is not None and e.when < oldest_cursor for e in events)
+            if reached or not events or not reply.has_next:
+                break
+        else:
+            logger.warning(
+                f"{kind} events of {len(ids)} resources have more than "
+                f"{self.max_pages * self.page_size} new entries, older ones are skipped"
+            )
+
+        targets = {t.resource_id: t for t in batch}
+        new_events: List[WatchedEvent] = []
+        # Pages are newest first: replay them oldest first
+        for event in sorted(
+            fetched,
+            key=lambda e: e.when or datetime.min.replace(tzinfo=timezone.utc),
+        ):
+            resource_id = getattr(event, id_attr, None)
+            if resource_id is None and len(ids) == 1:
+                resource_id = ids[0]
+            if resource_id is None:
+                continue
+            target = targets.get(resource_id)
+            if target is None or target.removed or not target.accept(event):
+                continue
+            new_events.append(WatchedEvent(kind, resource_id, event))
+        return new_events
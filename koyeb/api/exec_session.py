@@ -0,0 +1,417 @@
+# coding: utf-8
+
+"""
+Koyeb Rest API - interactive exec sessions
+
+``InstancesApi.exec_command`` is generated as a plain HTTP call, but
+``/v1/streams/instances/exec`` is a websocket exchanging JSON frames.
+``AsyncExecSession`` and ``ExecSession`` open that websocket once, stream
+stdin, stdout and stderr, resize the TTY and report the exit code::
+
+    async with AsyncExecSession(api_client, instance_id, ["sh"]) as session:
+        await session.write("echo hello\\nexit 3\\n")
+        async for chunk in session:
+            print(chunk.stream, chunk.data)
+        exit_code = await session.wait()
+
+    result = ExecSession.run(api_client, instance_id, ["uname", "-a"])
+"""  # noqa: E501
+
+import asyncio
+import base64
+import json
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple, Union
+from urllib.parse import urlencode, urlsplit, urlunsplit
+
+from websockets.asyncio.client import ClientConnection, connect
+from websockets.exceptions import ConnectionClosed
+
+from koyeb.api.api_client import ApiClient
+from koyeb.api.exceptions import ApiException
+
+logger = logging.getLogger(__name__)
+
+EXEC_PATH = "/v1/streams/instances/exec"
+
+STDOUT = "stdout"
+STDERR = "stderr"
+
+
+class ExecError(ApiException):
+    """Raised when the exec stream reports an error or ends without an exit code."""
+
+
+@dataclass
+class ExecOutput:
+    """A chunk of output of an exec session."""
+
+    stream: str  # "stdout" or "stderr"
+    data: bytes
+
+
+@dataclass
+class ExecResult:
+    """Outcome of a command run to completion."""
+
+    exit_code: int
+    stdout: bytes
+    stderr: bytes
+
+
+def _exec_url(api_client: ApiClient, resource_id: str, id_type: Optional[str]) -> str:
+    parts = urlsplit(api_client.configuration.host)
+    scheme = "wss" if parts.scheme == "https" else "ws"
+    query = {"id": resource_id}
+    if id_type:
+        query["id_type"] = id_type
+    path = parts.path.rstrip("/") + EXEC_PATH
+    return urlunsplit((scheme, parts.netloc, path, urlencode(query), ""))
+
+
+def _encode(data: Union[bytes, str]) -> str:
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return base64.b64encode(data).decode("ascii")
+
+
+class AsyncExecSession:
+    """Streaming exec session over the exec websocket.
+
+    The websocket is opened by ``start()`` (or ``async with``) with the
+    command in the first frame. Output is received by a background task as
+    soon as the server sends it and is read with ``read()`` or ``async for``;
+    it is buffered in a queue of at most ``max_queue`` chunks, beyond which
+    reading from the websocket pauses. Many sessions can run concurrently on
+    one event loop.
+
+    :param api_client: ApiClient whose host and credentials are used.
+        Defaults to ``ApiClient.get_default()``.
+    :param resource_id: id of the instance (or service, see ``id_type``).
+    :param command: command and arguments to run.
+    :param tty: allocate a TTY. Without a TTY, stdout and stderr are
+        reported separately.
+    :param tty_size: initial (width, height) of the TTY.
+    :param id_type: ``"INSTANCE_ID"`` (default) or ``"SERVICE_ID"``.
+    :param open_timeout: seconds allowed to open the websocket.
+    :param max_queue: maximum number of buffered output chunks.
+    """
+
+    def __init__(
+        self,
+        api_client: Optional[ApiClient] = None,
+        resource_id: str = "",
+        command: Optional[List[str]] = None,
+        tty: bool = False,
+        tty_size: Optional[Tuple[int, int]] = None,
+        id_type: Optional[str] = None,
+        open_timeout: float = 10.0,
+        max_queue: int = 1024,
+    ) -> None:
+        if not resource_id:
+            raise ValueError("resource_id is required")
+        if not command:
+            raise ValueError("command is required")
+        self.api_client = api_client or ApiClient.get_default()
+        self.resource_id = resource_id
+        self.command = list(command)
+        self.tty = tty
+        self.tty_size = tty_size
+        self.id_type = id_type
+        self.open_timeout = open_timeout
+        self.exit_code: Optional[int] = None
+        self._max_queue = max_queue
+        self._websocket: Optional[ClientConnection] = None
+        self._reader: Optional[asyncio.Task[None]] = None
+        self._queue: Optional[asyncio.Queue[Any]] = None
+        self._exited: Optional[asyncio.Event] = None
+        self._error: Optional[BaseException] = None
+        self._done = object()
+
+    async def start(self) -> "AsyncExecSession":
+        """Opens the websocket and starts the command."""
+        if self._websocket is not None:
+            return self
+        configuration = self.api_client.configuration
+        token = configuration.get_api_key_with_prefix("Bearer")
+        headers = {"Authorization": token} if token else {}
+        self._websocket = await connect(
+            _exec_url(self.api_client, self.resource_id, self.id_type),
+            additional_headers=headers,
+            open_timeout=self.open_timeout,
+            max_queue=self._max_queue,
+        )
+        self._queue = asyncio.Queue(maxsize=self._max_queue)
+        self._exited = asyncio.Event()
+
+        body = {"command": self.command, "disableTty": not self.tty}
+        if self.tty_size:
+            body["tty_size"] = {"width": self.tty_size[0], "height": self.tty_size[1]}
+        await self._send(body)
+        self._reader = asyncio.create_task(self._read_frames())
+        return self
+
+    async def write(self, data: Union[bytes, str]) -> None:
+        """Sends data to the command's stdin."""
+        await self._send({"stdin": {"data": _encode(data)}})
+
+    async def close_stdin(self) -> None:
+        """Signals the end of stdin to the command."""
+        await self._send({"stdin": {"close": True}})
+
+    async def resize(self, width: int, height: int) -> None:
+        """Resizes the TTY of the command."""
+        await self._send({"tty_size": {"width": width, "height": height}})
+
+    async def read(self) -> Optional[ExecOutput]:
+        """Returns the next chunk of output, or None once the command exited."""
+        if self._queue is None or self._exited is None:
+            raise RuntimeError("session is not started")
+        if self._exited.is_set() and self._queue.empty():
+            self._raise_error()
+            return None
+        item = await self._queue.get()
+        if item is self._done:
+            # Leave the marker for other readers
+            self._queue.put_nowait(self._done)
+            self._raise_error()
+            return None
+        return item
+
+    async def wait(self, timeout: Optional[float] = None) -> int:
+        """Waits for the command to exit, discarding unread output.
+
+        :param timeout: maximum seconds to wait.
+        :return: exit code of the command.
+        """
+        if self._reader is None:
+            raise RuntimeError("session is not started")
+
+        async def drain() -> None:
+            while await self.read() is not None:
+                pass
+
+        await asyncio.wait_for(drain(), timeout)
+        return self._exit_code()
+
+    async def communicate(
+        self, stdin: Optional[Union[bytes, str]] = None, timeout: Optional[float] = None
+    ) -> ExecResult:
+        """Sends stdin, closes it and collects the output until the command exits.
+
+        :param stdin: data sent to the command.
+        :param timeout: maximum seconds to wait for the command to exit.
+        :return: ExecResult
+        """
+        if stdin is not None:
+            await self.write(stdin)
+        await self.close_stdin()
+        stdout = bytearray()
+        stderr = bytearray()
+
+        async def collect() -> None:
+            async for chunk in self:
+                (stdout if chunk.stream == STDOUT else stderr).extend(chunk.data)
+
+        await asyncio.wait_for(collect(), timeout)
+        return ExecResult(self._exit_code(), bytes(stdout), bytes(stderr))
+
+    async def close(self) -> None:
+        """Closes the websocket. A command still running is terminated."""
+        if self._websocket is not None:
+            await self._websocket.close()
+        if self._reader is not None:
+            # The reader may be blocked on a full queue nobody reads anymore
+            self._reader.cancel()
+            try:
+                await self._reader
+            except asyncio.CancelledError:
+                pass
+
+    async def __aenter__(self) -> "AsyncExecSession":
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self.close()
+
+    def __aiter__(self) -> AsyncIterator[ExecOutput]:
+        return self._iterate()
+
+    async def _iterate(self) -> AsyncIterator[ExecOutput]:
+        while True:
+            chunk = await self.read()
+            if chunk is None:
+                return
+            yield chunk
+
+    async def _send(self, body: Dict[str, Any]) -> None:
+        if self._websocket is None:
+            raise RuntimeError("session is not started")
+        frame = {"id": self.resource_id, "body": body}
+        if self.id_type:
+            frame["id_type"] = self.id_type
+        await self._websocket.send(json.dumps(frame))
+
+    async def _read_frames(self) -> None:
+        websocket, queue, exited = self._websocket, self._queue, self._exited
+        if websocket is None or queue is None or exited is None:
+            raise RuntimeError("session is not started")
+        try:
+            async for message in websocket:
+                frame = json.loads(message)
+                error = frame.get("error")
+                if error:
+                    raise ExecError(
+                        status=error.get("code") or 0,
+                        reason=error.get("message") or "exec stream error",
+                    )
+                result = frame.get("result") or {}
+                for stream in (STDOUT, STDERR):
+                    data = (result.get(stream) or {}).get("data")
+                    if data:
+                        await queue.put(ExecOutput(stream, base64.b64decode(data)))
+                if result.get("exited"):
+                    self.exit_code = int(result.get("exit_code") or 0)
+                    break
+        except ConnectionClosed as e:
+            if self.exit_code is None:
+                logger.debug(f"Exec websocket closed before exit: {e}")
+        except asyncio.CancelledError:
+            raise
+        except BaseException as e:
+            self._error = e
+        finally:
+            exited.set()
+            try:
+                queue.put_nowait(self._done)
+            except asyncio.QueueFull:
+                # No reader is waiting: read() ends once the queue is drained
+                pass
+            if self.exit_code is not None:
+                await websocket.close()
+
+    def _raise_error(self) -> None:
+        if self._error is not None:
+            raise self._error
+
+    def _exit_code(self) -> int:
+        self._raise_error()
+        if self.exit_code is None:
+            raise ExecError(status=0, reason="exec stream ended without an exit code")
+        return self.exit_code
+
+
+class _LoopThread:
+    """Event loop shared by every synchronous session of the process."""
+
+    _lock = threading.Lock()
+    _loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @classmethod
+    def get(cls) -> asyncio.AbstractEventLoop:
+        with cls._lock:
+            if cls._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(
+                    target=loop.run_forever, name="koyeb-exec", daemon=True
+                )
+                thread.start()
+                cls._loop = loop
+            return cls._loop
+
+
+class ExecSession:
+    """Synchronous counterpart of AsyncExecSession.
+
+    Every synchronous session runs on a single background event loop, so
+    hundreds of concurrent sessions do not need a thread each. Arguments
+    are those of AsyncExecSession.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        self._session = AsyncExecSession(*args, **kwargs)
+        self._loop = _LoopThread.get()
+
+    @classmethod
+    def run(
+        cls,
+        api_client: Optional[ApiClient],
+        resource_id: str,
+        command: List[str],
+        stdin: Optional[Union[bytes, str]] = None,
+        timeout: Optional[float] = None,
+        **kwargs,
+    ) -> ExecResult:
+        """Runs a command to completion and returns its output.
+
+        :param api_client: ApiClient to use.
+        :param resource_id: id of the instance.
+        :param command: command and arguments to run.
+        :param stdin: data sent to the command's stdin.
+        :param timeout: maximum seconds to wait for the command to exit.
+        :return: ExecResult
+        """
+        with cls(api_client, resource_id, command, **kwargs) as session:
+            return session.communicate(stdin, timeout)
+
+    @property
+    def exit_code(self) -> Optional[int]:
+        return self._session.exit_code
+
+    def start(self) -> "ExecSession":
+        """Opens the websocket and starts the command."""
+        self._call(self._session.start())
+        return self
+
+    def write(self, data: Union[bytes, str]) -> None:
+        """Sends data to the command's stdin."""
+        self._call(self._session.write(data))
+
+    def close_stdin(self) -> None:
+        """Signals the end of stdin to the command."""
+        self._call(self._session.close_stdin())
+
+    def resize(self, width: int, height: int) -> None:
+        """Resizes the TTY of the command."""
+        self._call(self._session.resize(width, height))
+
+    def read(self, timeout: Optional[float] = None) -> Optional[ExecOutput]:
+        """Returns the next chunk of output, or None once the command exited."""
+        return self._call(self._session.read(), timeout)
+
+    def wait(self, timeout: Optional[float] = None) -> int:
+        """Waits for the command to exit and returns its exit code."""
+        return self._call(self._session.wait(timeout))
+
+    def communicate(
+        self, stdin: Optional[Union[bytes, str]] = None, timeout: Optional[float] = None
+    ) -> ExecResult:
+        """Sends stdin, closes it and collects the output until the command exits."""
+        return self._call(self._session.communicate(stdin, timeout))
+
+    def close(self) -> None:
+        """Closes the websocket. A command still running is terminated."""
+        self._call(self._session.close())
+
+    def __enter__(self) -> "ExecSession":
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def __iter__(self) -> Iterator[ExecOutput]:
+        while True:
+            chunk = self.read()
+            if chunk is None:
+                return
+            yield chunk
+
+    def _call(self, coroutine, timeout: Optional[float] = None):
+        future = asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+        try:
+            return future.result(timeout)
+        except BaseException:
+            future.cancel()
+            raise
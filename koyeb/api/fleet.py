@@ -0,0 +1,543 @@
+# coding: utf-8
+
+"""
+Koyeb Rest API - fleet operations
+
+Runs ``update_service``, ``re_deploy``, ``pause_service`` or
+``resume_service`` across many services in waves, with bounded parallelism,
+a health gate after each wave and automatic rollback::
+
+    fleet = FleetOrchestrator(api_client, concurrency=16, wave_size=50)
+    services = fleet.select_services(app_id=app_id)
+
+    def bump(definition):
+        definition.env.append(DeploymentEnv(key="FEATURE_X", value="on"))
+        return definition
+
+    for event in fleet.iter_update(services, bump):
+        print(event.type, event.service_id, event.message)
+"""  # noqa: E501
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from koyeb.api.api.deployments_api import DeploymentsApi
+from koyeb.api.api.services_api import ServicesApi
+from koyeb.api.api_client import ApiClient
+from koyeb.api.exceptions import ApiException
+from koyeb.api.models.deployment_definition import DeploymentDefinition
+from koyeb.api.models.deployment_status import DeploymentStatus
+from koyeb.api.models.redeploy_request_info import RedeployRequestInfo
+from koyeb.api.models.service_status import ServiceStatus
+from koyeb.api.models.update_service import UpdateService
+
+logger = logging.getLogger(__name__)
+
+# Deployment statuses ending a health wait
+HEALTHY_DEPLOYMENT_STATUSES = frozenset(
+    [DeploymentStatus.HEALTHY, DeploymentStatus.SLEEPING]
+)
+FAILED_DEPLOYMENT_STATUSES = frozenset(
+    [
+        DeploymentStatus.ERROR,
+        DeploymentStatus.ERRORING,
+        DeploymentStatus.CANCELING,
+        DeploymentStatus.CANCELED,
+        DeploymentStatus.STOPPED,
+        DeploymentStatus.STASHED,
+    ]
+)
+
+# Event types emitted by the orchestrator
+WAVE_STARTED = "wave_started"
+STARTED = "started"
+HEALTHY = "healthy"
+FAILED = "failed"
+ROLLED_BACK = "rolled_back"
+ROLLBACK_FAILED = "rollback_failed"
+WAVE_COMPLETED = "wave_completed"
+ABORTED = "aborted"
+COMPLETED = "completed"
+
+# Rollback scopes
+ROLLBACK_NONE = "none"
+ROLLBACK_WAVE = "wave"
+ROLLBACK_ALL = "all"
+
+
+class FleetError(ApiException):
+    """Raised when a fleet operation fails on a service."""
+
+
+def _describe(error: Exception) -> str:
+    if isinstance(error, FleetError) and error.reason:
+        return error.reason
+    return str(error).strip()
+
+
+@dataclass
+class FleetEvent:
+    """Progress of a fleet operation."""
+
+    type: str
+    wave: int
+    service_id: Optional[str] = None
+    deployment_id: Optional[str] = None
+    message: Optional[str] = None
+    # Services of a started wave, or services skipped by an abort
+    service_ids: List[str] = field(default_factory=list)
+    at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+@dataclass
+class FleetResult:
+    """Outcome of a fleet operation."""
+
+    succeeded: List[str] = field(default_factory=list)
+    failed: Dict[str, str] = field(default_factory=dict)
+    rolled_back: List[str] = field(default_factory=list)
+    skipped: List[str] = field(default_factory=list)
+    aborted: bool = False
+
+
+@dataclass
+class _Change:
+    """What was done to a service, and how to undo it."""
+
+    service_id: str
+    deployment_id: Optional[str] = None
+    undo: Optional[Callable[[], Optional[str]]] = None
+    # Health gate of changes without a deployment, e.g. waiting for a status
+    wait: Optional[Callable[[], None]] = None
+
+
+# An operation applies itself to a service and returns the change made
+_Operation = Callable[[str], _Change]
+
+
+class FleetOrchestrator:
+    """Applies service operations across a fleet, wave by wave.
+
+    Services are processed in waves of ``wave_size``; within a wave, at most
+    ``concurrency`` services are changed and watched at the same time, each
+    by its own worker, so the number of services polled in parallel does not
+    depend on a single loop. A service passes when its new deployment (or,
+    for pause and resume, the service itself) reaches a healthy status
+    within ``health_timeout``; on failure, the latest deployment events are
+    reported as the reason.
+
+    A wave with more than ``max_failures`` failed services fails its health
+    gate: the remaining waves are skipped and, depending on ``rollback``,
+    nothing is undone (``"none"``), the services changed by the failing
+    wave are restored (``"wave"``), or every service changed by the run is
+    (``"all"``). Updates and redeploys are rolled back by restoring the
+    definition of the deployment that was active before; pauses and
+    resumes by the opposite operation.
+
+    :param api_client: ApiClient to use. Defaults to ``ApiClient.get_default()``.
+    :param concurrency: maximum number of services changed at the same time.
+    :param wave_size: number of services per wave.
+    :param max_failures: failures tolerated in a wave before aborting.
+    :param health_timeout: seconds to wait for a service to become healthy.
+    :param poll_interval: seconds between status polls of a service.
+    :param rollback: ``"none"``, ``"wave"`` or ``"all"``.
+    """
+
+    def __init__(
+        self,
+        api_client: Optional[ApiClient] = None,
+        concurrency: int = 8,
+        wave_size: int = 10,
+        max_failures: int = 0,
+        health_timeout: float = 600.0,
+        poll_interval: float = 5.0,
+        rollback: str = ROLLBACK_WAVE,
+    ) -> None:
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+        if wave_size < 1:
+            raise ValueError("wave_size must be at least 1")
+        if rollback not in (ROLLBACK_NONE, ROLLBACK_WAVE, ROLLBACK_ALL):
+            raise ValueError(f"Invalid rollback scope {rollback!r}")
+        api_client = api_client or ApiClient.get_default()
+        self.services_api = ServicesApi(api_client)
+        self.deployments_api = DeploymentsApi(api_client)
+        self.concurrency = concurrency
+        self.wave_size = wave_size
+        self.max_failures = max_failures
+        self.health_timeout = health_timeout
+        self.poll_interval = poll_interval
+        self.rollback = rollback
+        self._stopped = threading.Event()
+
+    def select_services(
+        self,
+        app_id: Optional[str] = None,
+        name: Optional[str] = None,
+        types: Optional[List[str]] = None,
+        statuses: Optional[List[str]] = None,
+    ) -> List[str]:
+        """Returns the ids of the services matching the filters of ``list_services``.
+
+        :param app_id: only services of this app.
+        :param name: only services with this name.
+        :param types: only services of these types.
+        :param statuses: only services with these statuses.
+        :return: list of service ids.
+        """
+        ids: List[str] = []
+        offset = 0
+        while True:
+            reply = self.services_api.list_services(
+                app_id=app_id,
+                name=name,
+                types=types,
+                statuses=statuses,
+                limit="100",
+                offset=str(offset),
+            )
+            services = reply.services or []
+            ids.extend(s.id for s in services if s.id)
+            offset += len(services)
+            if not services or not reply.has_next:
+                return ids
+
+    def stop(self) -> None:
+        """Stops the run once the current wave is complete."""
+        self._stopped.set()
+
+    def iter_update(
+        self,
+        service_ids: Iterable[str],
+        change: Callable[[DeploymentDefinition], Optional[DeploymentDefinition]],
+        skip_build: Optional[bool] = None,
+    ) -> Iterator[FleetEvent]:
+        """Updates the definition of every service.
+
+        :param service_ids: services to update.
+        :param change: callable receiving a copy of a service's current
+            definition and returning the new one (or modifying it in place
+            and returning None).
+        :param skip_build: skip the build of the new deployments.
+        :return: iterator of FleetEvent.
+        """
+
+        def operation(service_id: str) -> _Change:
+            previous = self._current_definition(service_id)
+            definition = previous.model_copy(deep=True)
+            definition = change(definition) or definition
+            reply = self.services_api.update_service(
+                id=service_id,
+                service=UpdateService(definition=definition, skip_build=skip_build),
+            )
+            return _Change(
+                service_id,
+                reply.service.latest_deployment_id if reply.service else None,
+                lambda: self._restore(service_id, previous),
+            )
+
+        return self._run(service_ids, operation)
+
+    def iter_redeploy(
+        self, service_ids: Iterable[str], info: Optional[RedeployRequestInfo] = None
+    ) -> Iterator[FleetEvent]:
+        """Redeploys every service.
+
+        :param service_ids: services to redeploy.
+        :param info: redeploy options, e.g. ``use_cache`` or ``skip_build``.
+        :return: iterator of FleetEvent.
+        """
+
+        def operation(service_id: str) -> _Change:
+            previous = self._current_definition(service_id)
+            reply = self.services_api.re_deploy(
+                id=service_id, info=info or RedeployRequestInfo()
+            )
+            return _Change(
+                service_id,
+                reply.deployment.id if reply.deployment else None,
+                lambda: self._restore(service_id, previous),
+            )
+
+        return self._run(service_ids, operation)
+
+    def iter_pause(self, service_ids: Iterable[str]) -> Iterator[FleetEvent]:
+        """Pauses every service.
+
+        :param service_ids: services to pause.
+        :return: iterator of FleetEvent.
+        """
+
+        def operation(service_id: str) -> _Change:
+            self.services_api.pause_service(id=service_id)
+            return _Change(
+                service_id,
+                undo=lambda: self._resume(service_id),
+                wait=lambda: self._wait_service(service_id, ServiceStatus.PAUSED),
+            )
+
+        return self._run(service_ids, operation)
+
+    def iter_resume(
+        self, service_ids: Iterable[str], skip_build: Optional[bool] = None
+    ) -> Iterator[FleetEvent]:
+        """Resumes every service.
+
+        :param service_ids: services to resume.
+        :param skip_build: skip the build of the resumed deployments.
+        :return: iterator of FleetEvent.
+        """
+
+        def operation(service_id: str) -> _Change:
+            self.services_api.resume_service(id=service_id, skip_build=skip_build)
+            return _Change(
+                service_id,
+                undo=lambda: self._pause(service_id),
+                wait=lambda: self._wait_service(service_id, ServiceStatus.HEALTHY),
+            )
+
+        return self._run(service_ids, operation)
+
+    def update(self, service_ids, change, skip_build=None) -> FleetResult:
+        """Runs ``iter_update`` to completion and returns its FleetResult."""
+        return self.collect(self.iter_update(service_ids, change, skip_build))
+
+    def redeploy(self, service_ids, info=None) -> FleetResult:
+        """Runs ``iter_redeploy`` to completion and returns its FleetResult."""
+        return self.collect(self.iter_redeploy(service_ids, info))
+
+    def pause(self, service_ids) -> FleetResult:
+        """Runs ``iter_pause`` to completion and returns its FleetResult."""
+        return self.collect(self.iter_pause(service_ids))
+
+    def resume(self, service_ids, skip_build=None) -> FleetResult:
+        """Runs ``iter_resume`` to completion and returns its FleetResult."""
+        return self.collect(self.iter_resume(service_ids, skip_build))
+
+    @staticmethod
+    def collect(
+        events: Iterable[FleetEvent],
+        on_event: Optional[Callable[[FleetEvent], None]] = None,
+    ) -> FleetResult:
+        """Consumes an event stream into a FleetResult.
+
+        :param events: events of a run.
+        :param on_event: callback invoked with every event.
+        :return: FleetResult
+        """
+        result = FleetResult()
+        for event in events:
+            if on_event is not None:
+                on_event(event)
+            if event.type == ABORTED:
+                result.aborted = True
+                result.skipped.extend(event.service_ids)
+            elif event.service_id is None:
+                # Wave events are not about a single service
+                continue
+            elif event.type == HEALTHY:
+                result.succeeded.append(event.service_id)
+            elif event.type in (FAILED, ROLLBACK_FAILED):
+                result.failed[event.service_id] = event.message or event.type
+            elif event.type == ROLLED_BACK:
+                result.rolled_back.append(event.service_id)
+                if event.service_id in result.succeeded:
+                    result.succeeded.remove(event.service_id)
+        return result
+
+    def _run(
+        self, service_ids: Iterable[str], operation: _Operation
+    ) -> Iterator[FleetEvent]:
+        ids = list(dict.fromkeys(service_ids))
+        waves = [
+            ids[i : i + self.wave_size] for i in range(0, len(ids), self.wave_size)
+        ]
+        changed: List[_Change] = []
+        events: "queue.Queue[FleetEvent]" = queue.Queue()
+        self._stopped.clear()
+
+        pool = ThreadPoolExecutor(
+            max_workers=self.concurrency, thread_name_prefix="koyeb-fleet"
+        )
+        try:
+            for number, wave in enumerate(waves, 1):
+                yield FleetEvent(WAVE_STARTED, number, service_ids=list(wave))
+                pending: Set[Future[Tuple[Optional[_Change], bool]]] = {
+                    pool.submit(self._apply, number, service_id, operation, events)
+                    for service_id in wave
+                }
+                wave_changes: List[_Change] = []
+                failures = 0
+                while pending or not events.empty():
+                    try:
+                        yield events.get(timeout=0.2)
+                    except queue.Empty:
+                        pass
+                    for future in [f for f in pending if f.done()]:
+                        pending.discard(future)
+                        change, ok = future.result()
+                        if change is not None:
+                            wave_changes.append(change)
+                        if not ok:
+                            failures += 1
+                changed.extend(wave_changes)
+
+                if failures > self.max_failures:
+                    to_undo = (
+                        wave_changes if self.rollback == ROLLBACK_WAVE else changed
+                    )
+                    if self.rollback != ROLLBACK_NONE:
+                        yield from self._rollback(pool, number, to_undo)
+                    yield FleetEvent(
+                        ABORTED,
+                        number,
+                        message=f"{failures} services failed the health gate",
+                        service_ids=[s for w in waves[number:] for s in w],
+                    )
+                    return
+                yield FleetEvent(WAVE_COMPLETED, number, message=f"{failures} failed")
+                if self._stopped.is_set():
+                    yield FleetEvent(
+                        ABORTED,
+                        number,
+                        message="stopped",
+                        service_ids=[s for w in waves[number:] for s in w],
+                    )
+                    return
+            yield FleetEvent(COMPLETED, len(waves))
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def _apply(
+        self,
+        wave: int,
+        service_id: str,
+        operation: _Operation,
+        events: "queue.Queue[FleetEvent]",
+    ) -> Tuple[Optional[_Change], bool]:
+        events.put(FleetEvent(STARTED, wave, service_id))
+        try:
+            change = operation(service_id)
+        except Exception as e:
+            events.put(FleetEvent(FAILED, wave, service_id, message=_describe(e)))
+            return None, False
+        try:
+            if change.wait is not None:
+                change.wait()
+            elif change.deployment_id:
+                self._wait_deployment(change.deployment_id)
+        except Exception as e:
+            events.put(
+                FleetEvent(FAILED, wave, service_id, change.deployment_id, _describe(e))
+            )
+            return change, False
+        events.put(FleetEvent(HEALTHY, wave, service_id, change.deployment_id))
+        return change, True
+
+    def _rollback(
+        self,
+        pool: ThreadPoolExecutor,
+        wave: int,
+        changes: List[_Change],
+    ) -> Iterator[FleetEvent]:
+        def undo(change: _Change) -> FleetEvent:
+            try:
+                deployment_id = change.undo() if change.undo else None
+                if deployment_id:
+                    self._wait_deployment(deployment_id)
+            except Exception as e:
+                return FleetEvent(
+                    ROLLBACK_FAILED, wave, change.service_id, message=_describe(e)
+                )
+            return FleetEvent(ROLLED_BACK, wave, change.service_id)
+
+        # The pool is not stopped yet: rollbacks must run to completion
+        for future in [pool.submit(undo, change) for change in changes]:
+            yield future.result()
+
+    def _current_definition(self, service_id: str) -> DeploymentDefinition:
+        service = self.services_api.get_service(id=service_id).service
+        if service is None:
+            raise FleetError(status=0, reason=f"Service {service_id} not found")
+        deployment_id = service.active_deployment_id or service.latest_deployment_id
+        if not deployment_id:
+            raise FleetError(status=0, reason=f"Service {service_id} has no deployment")
+        deployment = self.deployments_api.get_deployment(id=deployment_id).deployment
+        if deployment is None or deployment.definition is None:
+            raise FleetError(
+                status=0, reason=f"Deployment {deployment_id} has no definition"
+            )
+        return deployment.definition
+
+    def _restore(
+        self, service_id: str, definition: DeploymentDefinition
+    ) -> Optional[str]:
+        reply = self.services_api.update_service(
+            id=service_id, service=UpdateService(definition=definition)
+        )
+        return reply.service.latest_deployment_id if reply.service else None
+
+    def _pause(self, service_id: str) -> None:
+        self.services_api.pause_service(id=service_id)
+        self._wait_service(service_id, ServiceStatus.PAUSED)
+
+    def _resume(self, service_id: str, skip_build: Optional[bool] = None) -> None:
+        self.services_api.resume_service(id=service_id, skip_build=skip_build)
+        self._wait_service(service_id, ServiceStatus.HEALTHY)
+
+    def _wait_service(self, service_id: str, status: ServiceStatus) -> None:
+        deadline = time.monotonic() + self.health_timeout
+        while True:
+            service = self.services_api.get_service(id=service_id).service
+            current = service.status if service else None
+            if current == status:
+                return
+            if current in (ServiceStatus.DELETING, ServiceStatus.DELETED):
+                raise FleetError(
+                    status=0, reason=f"Service {service_id} is {current.value}"
+                )
+            if time.monotonic() >= deadline:
+                raise FleetError(
+                    status=0,
+                    reason=f"Service {service_id} did not become {status.value} "
+                    f"within {self.health_timeout}s (status: {current})",
+                )
+            time.sleep(self.poll_interval)
+
+    def _wait_deployment(self, deployment_id: str) -> None:
+        deadline = time.monotonic() + self.health_timeout
+        while True:
+            deployment = self.deployments_api.get_deployment(
+                id=deployment_id
+            ).deployment
+            status = deployment.status if deployment else None
+            if status in HEALTHY_DEPLOYMENT_STATUSES:
+                return
+            if status in FAILED_DEPLOYMENT_STATUSES or time.monotonic() >= deadline:
+                reason = (
+                    f"Deployment {deployment_id} is {status.value}"
+                    if status in FAILED_DEPLOYMENT_STATUSES
+                    else f"Deployment {deployment_id} not healthy within "
+                    f"{self.health_timeout}s (status: {status.value if status else None})"
+                )
+                raise FleetError(
+                    status=0, reason=self._with_events(deployment_id, reason)
+                )
+            time.sleep(self.poll_interval)
+
+    def _with_events(self, deployment_id: str, reason: str) -> str:
+        try:
+            reply = self.deployments_api.list_deployment_events(
+                deployment_id=deployment_id, limit="5", order="desc"
+            )
+        except ApiException as e:
+            logger.debug(f"Could not list events of deployment {deployment_id}: {e}")
+            return reason
+        messages = [e.message for e in reply.events or [] if e.message]
+        return f"{reason}: {'; '.join(messages)}" if messages else reason
@@ -0,0 +1,332 @@
+# coding: utf-8
+
+"""
+Koyeb Rest API - streaming log tail
+
+``LogsApi.tail_logs`` buffers and deserializes the whole response before
+returning, which never happens for a live tail. ``LogTail`` reads the same
+endpoint incrementally and yields ``LogEntry`` objects as they arrive::
+
+    for entry in LogTail(api_client, service_id=service_id):
+        print(entry.created_at, entry.msg)
+
+    async for entry in LogTail(api_client, instance_ids=[instance_id]):
+        ...
+"""  # noqa: E501
+
+import asyncio
+import concurrent.futures
+import json
+import logging
+import threading
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, Iterator, Optional, Set, Tuple
+
+import urllib3
+
+from koyeb.api.api.logs_api import LogsApi
+from koyeb.api.api_client import ApiClient
+from koyeb.api.exceptions import ApiException
+from koyeb.api.models.log_entry import LogEntry
+from koyeb.api.models.stream_result_of_log_entry import StreamResultOfLogEntry
+
+logger = logging.getLogger(__name__)
+
+# Errors after which the tail is reopened from the last received timestamp
+_RECONNECT_ERRORS = (
+    urllib3.exceptions.HTTPError,
+    ConnectionError,
+    TimeoutError,
+)
+
+
+class LogStreamError(ApiException):
+    """Raised when the log stream reports an error frame."""
+
+
+def iterate_in_thread(
+    iterator_factory: Callable[[], Iterator[Any]],
+    close: Callable[[], None],
+    max_queue: int = 1000,
+) -> AsyncIterator[Any]:
+    """Exposes a blocking iterator as an async iterator.
+
+    The iterator is consumed in a dedicated daemon thread (not the default
+    executor, so that hundreds of concurrent streams do not starve it). Items
+    are passed through a bounded queue: when the consumer falls behind, the
+    thread blocks, which applies backpressure to the network read.
+
+    :param iterator_factory: callable returning the blocking iterator.
+    :param close: callable interrupting the blocking iterator.
+    :param max_queue: maximum number of buffered items.
+    :return: async iterator
+    """
+
+    async def agen():
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue[Any] = asyncio.Queue(maxsize=max_queue)
+        done = object()
+        stopped = threading.Event()
+
+        def put(item) -> bool:
+            future = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+            while not stopped.is_set():
+                try:
+                    future.result(timeout=0.5)
+                    return True
+                except concurrent.futures.TimeoutError:
+                    continue
+            future.cancel()
+            return False
+
+        def run() -> None:
+            try:
+                for item in iterator_factory():
+                    if not put((item, None)):
+                        return
+            except BaseException as e:
+                put((None, e))
+                return
+            put((done, None))
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        try:
+            while True:
+                item, error = await queue.get()
+                if error is not None:
+                    raise error
+                if item is done:
+                    return
+                yield item
+        finally:
+            stopped.set()
+            close()
+
+    return agen()
+
+
+class LogTail:
+    """Incremental consumer of ``/v1/streams/logs/tail``.
+
+    The response is read chunk by chunk and each newline-delimited
+    ``StreamResultOfLogEntry`` is parsed as soon as it is complete, so
+    memory use is bounded by ``max_line_bytes`` regardless of how long the
+    tail runs. When the connection drops, the tail is reopened from the
+    timestamp of the last entry and entries already yielded at that
+    timestamp are skipped.
+
+    Filter arguments are the ones of ``LogsApi.tail_logs`` (``service_id``,
+    ``instance_ids``, ``streams``, ``regex``...). Iterate with ``for`` or
+    ``async for``; call ``close()`` to stop from another thread.
+
+    :param api_client: ApiClient to use. Defaults to ``ApiClient.get_default()``.
+    :param reconnect: reopen the stream when it ends or fails.
+    :param max_reconnects: maximum consecutive reconnections without receiving
+        an entry. None means unlimited.
+    :param reconnect_backoff: initial delay between reconnections, doubled
+        after each consecutive failure.
+    :param max_backoff: maximum delay between reconnections.
+    :param read_timeout: seconds without data after which the connection is
+        considered dead and reopened.
+    :param chunk_size: size of network reads.
+    :param max_line_bytes: frames longer than this are dropped.
+    """
+
+    def __init__(
+        self,
+        api_client: Optional[ApiClient] = None,
+        reconnect: bool = True,
+        max_reconnects: Optional[int] = None,
+        reconnect_backoff: float = 1.0,
+        max_backoff: float = 30.0,
+        read_timeout: Optional[float] = 300.0,
+        chunk_size: int = 8192,
+        max_line_bytes: int = 1024 * 1024,
+        **filters,
+    ) -> None:
+        self.api_client = api_client or ApiClient.get_default()
+        self.reconnect = reconnect
+        self.max_reconnects = max_reconnects
+        self.reconnect_backoff = reconnect_backoff
+        self.max_backoff = max_backoff
+        self.read_timeout = read_timeout
+        self.chunk_size = chunk_size
+        self.max_line_bytes = max_line_bytes
+        self.filters = filters
+        self.last_timestamp: Optional[datetime] = filters.pop("start", None)
+        self._seen_at_last: Set[Tuple[Optional[str], str]] = set()
+        self._response = None
+        self._closed = threading.Event()
+
+    def close(self) -> None:
+        """Stops the tail and releases the connection."""
+        self._closed.set()
+        response = self._response
+        if response is not None:
+            # shutdown() (urllib3 >= 2.3) unblocks a read in progress
+            shutdown = getattr(response.response, "shutdown", None)
+            try:
+                if shutdown is not None:
+                    shutdown()
+                response.response.close()
+            except Exception as e:
+                logger.debug(f"Error closing log tail connection: {e}")
+
+    def __iter__(self) -> Iterator[LogEntry]:
+        failures = 0
+        while not self._closed.is_set():
+            received = False
+            try:
+                for entry in self._stream_once():
+                    received = True
+                    failures = 0
+                    yield entry
+            except _RECONNECT_ERRORS as e:
+                if self._closed.is_set():
+                    return
+                logger.debug(f"Log tail interrupted: {e}")
+            except ApiException as e:
+                # Server-side failures are transient, anything else is final
+                if isinstance(e, LogStreamError) or (e.status or 0) < 500:
+                    raise
+                logger.debug(f"Log tail failed: {e}")
+            finally:
+                self._response = None
+
+            if not self.reconnect or self._closed.is_set():
+                return
+            if not received:
+                failures += 1
+                if self.max_reconnects is not None and failures > self.max_reconnects:
+                    raise LogStreamError(
+                        status=0,
+                        reason=f"Log tail failed {failures} times in a row, giving up",
+                    )
+            delay = 0.0
+            if failures:
+                delay = min(
+                    self.max_backoff, self.reconnect_backoff * 2 ** (failures - 1)
+                )
+            if self._closed.wait(delay):
+                return
+
+    def __aiter__(self) -> AsyncIterator[LogEntry]:
+        return iterate_in_thread(self.__iter__, self.close)
+
+    def _open(self):
+        params = LogsApi(self.api_client)._tail_logs_serialize(
+            type=self.filters.get("type"),
+            app_id=self.filters.get("app_id"),
+            service_id=self.filters.get("service_id"),
+            deployment_id=self.filters.get("deployment_id"),
+            regional_deployment_id=self.filters.get("regional_deployment_id"),
+            instance_id=self.filters.get("instance_id"),
+            instance_ids=self.filters.get("instance_ids"),
+            stream=self.filters.get("stream"),
+            streams=self.filters.get("streams"),
+            start=self.last_timestamp,
+            limit=self.filters.get("limit"),
+            regex=self.filters.get("regex"),
+            text=self.filters.get("text"),
+            regions=self.filters.get("regions"),
+            _request_auth=None,
+            _content_type=None,
+            _headers=None,
+            _host_index=0,
+        )
+        method, url, headers, body, post_params = params
+        timeout = (10.0, self.read_timeout) if self.read_timeout else None
+        # Bypass ApiClient.call_api: the response cache and single-flight
+        # layers buffer whole bodies, which never completes for a tail.
+        response = self.api_client.rest_client.request(
+            method,
+            url,
+            headers=headers,
+            body=body,
+            post_params=post_params,
+            _request_timeout=timeout,
+        )
+        if not 200 <= response.status <= 299:
+            data = response.read()
+            raise ApiException.from_response(
+                http_resp=response,
+                body=data.decode("utf-8", "replace") if data else None,
+                data=None,
+            )
+        return response
+
+    def _stream_once(self) -> Iterator[LogEntry]:
+        response = self._open()
+        self._response = response
+        if self._closed.is_set():
+            self.close()
+            return
+        buffer = bytearray()
+        discarding = False
+        for chunk in response.response.stream(self.chunk_size):
+            start = 0
+            while True:
+                newline = chunk.find(b"\n", start)
+                if newline < 0:
+                    break
+                if discarding:
+                    discarding = False
+                else:
+                    buffer += chunk[start:newline]
+                    entry = self._parse(bytes(buffer))
+                    if entry is not None:
+                        yield entry
+                buffer.clear()
+                start = newline + 1
+            if not discarding:
+                buffer += chunk[start:]
+                if len(buffer) > self.max_line_bytes:
+                    logger.warning(
+                        f"Dropping log frame larger than {self.max_line_bytes} bytes"
+                    )
+                    buffer.clear()
+                    discarding = True
+        if buffer and not discarding:
+            entry = self._parse(bytes(buffer))
+            if entry is not None:
+                yield entry
+
+    def _parse(self, line: bytes) -> Optional[LogEntry]:
+        line = line.strip()
+        if not line:
+            return None
+        try:
+            frame = StreamResultOfLogEntry.from_dict(json.loads(line))
+        except ValueError as e:
+            logger.warning(f"Skipping malformed log frame: {e}")
+            return None
+        if frame is None:
+            return None
+        if frame.error is not None:
+            raise LogStreamError(
+                status=frame.error.code or 0,
+                reason=frame.error.message or "log stream error",
+            )
+        entry = frame.result
+        if entry is None:
+            return None
+        return entry if self._advance(entry) else None
+
+    def _advance(self, entry: LogEntry) -> bool:
+        """Tracks the resume position, returning False for duplicates."""
+        created_at = entry.created_at
+        if created_at is None:
+            return True
+        key = (entry.msg, json.dumps(entry.labels, sort_keys=True, default=str))
+        if self.last_timestamp is not None:
+            if created_at < self.last_timestamp:
+                return False
+            if created_at == self.last_timestamp:
+                if key in self._seen_at_last:
+                    return False
+                self._seen_at_last.add(key)
+                return True
+        self.last_timestamp = created_at
+        self._seen_at_last = {key}
+        return True
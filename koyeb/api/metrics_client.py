@@ -0,0 +1,468 @@
+# coding: utf-8
+
+"""
+Koyeb Rest API - columnar metrics
+
+``MetricsApi.get_metrics`` builds one pydantic ``Sample`` per data point.
+``MetricsClient`` reads the same endpoint but parses the JSON straight into
+compact columns (``array('d')``, or NumPy arrays when NumPy is installed),
+fetches many series concurrently and caches complete time windows on disk::
+
+    client = MetricsClient(api_client, cache_dir="~/.cache/koyeb/metrics")
+    series = client.fetch_many(
+        [MetricName.CPU_TOTAL_PERCENT, MetricName.MEM_RSS],
+        instance_ids=instance_ids,
+        start=start,
+        end=end,
+        step="1m",
+    )
+    grid, values = align(series[("instance", instance_ids[0], "MEM_RSS")], step="5m")
+"""  # noqa: E501
+
+import hashlib
+import importlib
+import json
+import logging
+import math
+import os
+import re
+import tempfile
+import threading
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from dateutil.parser import isoparse
+
+from koyeb.api.api.metrics_api import MetricsApi
+from koyeb.api.api_client import ApiClient
+from koyeb.api.exceptions import ApiException
+from koyeb.api.models.metric_name import MetricName
+
+np: Any
+try:
+    np = importlib.import_module("numpy")
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# (target kind, target id, metric name), e.g. ("instance", "abc", "MEM_RSS")
+SeriesKey = Tuple[str, str, str]
+
+_STEP_RE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([smh]?)\s*$")
+_STEP_UNITS = {"": 1, "s": 1, "m": 60, "h": 3600}
+
+
+def parse_step(step: Union[str, int, float]) -> float:
+    """Converts a step such as ``"5m"``, ``"1h"`` or a number of seconds to seconds."""
+    if isinstance(step, (int, float)):
+        seconds = float(step)
+    else:
+        match = _STEP_RE.match(step)
+        if not match:
+            raise ValueError(
+                f"Invalid step {step!r}, expected e.g. '30s', '5m' or '1h'"
+            )
+        seconds = float(match.group(1)) * _STEP_UNITS[match.group(2)]
+    if seconds <= 0:
+        raise ValueError("step must be positive")
+    return seconds
+
+
+def _format_step(seconds: float) -> str:
+    # The API accepts durations in hours or minutes only
+    if seconds % 60:
+        raise ValueError(
+            f"Metrics are served at steps of whole minutes, got {seconds:g}s"
+        )
+    if seconds % 3600 == 0:
+        return f"{int(seconds // 3600)}h"
+    return f"{int(seconds // 60)}m"
+
+
+def _parse_timestamp(value: Any) -> float:
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(value)
+    except ValueError:
+        return isoparse(value).timestamp()
+
+
+def _column(values=None):
+    return array("d", values or ())
+
+
+@dataclass
+class MetricSeries:
+    """One metric time series stored as two columns of epoch seconds and values."""
+
+    kind: str  # "service" or "instance"
+    target_id: str
+    name: str
+    labels: Dict[str, str] = field(default_factory=dict)
+    timestamps: Any = field(default_factory=_column)
+    values: Any = field(default_factory=_column)
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    @property
+    def key(self) -> SeriesKey:
+        return (self.kind, self.target_id, self.name)
+
+    def as_numpy(self) -> "MetricSeries":
+        """Returns a copy whose columns are NumPy float64 arrays."""
+        if np is None:
+            raise ImportError("numpy is required for as_numpy()")
+        return MetricSeries(
+            self.kind,
+            self.target_id,
+            self.name,
+            dict(self.labels),
+            np.asarray(self.timestamps, dtype=np.float64),
+            np.asarray(self.values, dtype=np.float64),
+        )
+
+
+def downsample(
+    series: MetricSeries, step: Union[str, int, float], how: str = "mean"
+) -> MetricSeries:
+    """Aggregates a series into buckets of ``step`` aligned on the epoch.
+
+    :param series: series to downsample, sorted by time.
+    :param step: bucket width, e.g. ``"5m"``.
+    :param how: ``"mean"``, ``"max"``, ``"min"`` or ``"last"``.
+    :return: MetricSeries with one point per non-empty bucket, stamped at the
+        bucket start.
+    """
+    if how not in ("mean", "max", "min", "last"):
+        raise ValueError(f"Unsupported aggregation {how!r}")
+    width = parse_step(step)
+    timestamps = _column()
+    values = _column()
+    bucket = None
+    acc = 0.0
+    count = 0
+    for t, v in zip(series.timestamps, series.values):
+        b = math.floor(t / width) * width
+        if b != bucket:
+            if bucket is not None:
+                timestamps.append(bucket)
+                values.append(acc / count if how == "mean" else acc)
+            bucket, acc, count = b, v, 1
+            continue
+        count += 1
+        if how == "mean":
+            acc += v
+        elif how == "max":
+            acc = max(acc, v)
+        elif how == "min":
+            acc = min(acc, v)
+        else:
+            acc = v
+    if bucket is not None:
+        timestamps.append(bucket)
+        values.append(acc / count if how == "mean" else acc)
+    result = MetricSeries(
+        series.kind,
+        series.target_id,
+        series.name,
+        dict(series.labels),
+        timestamps,
+        values,
+    )
+    return (
+        result.as_numpy()
+        if np is not None and not isinstance(series.values, array)
+        else result
+    )
+
+
+def align(
+    series: Sequence[MetricSeries],
+    step: Union[str, int, float],
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    how: str = "mean",
+):
+    """Resamples several series onto a common time grid.
+
+    :param series: series to align.
+    :param step: grid spacing, e.g. ``"5m"``.
+    :param start: first grid point, in epoch seconds. Defaults to the
+        earliest sample, rounded down to ``step``.
+    :param end: last grid point, in epoch seconds. Defaults to the latest
+        sample.
+    :param how: aggregation applied within each grid cell.
+    :return: ``(grid, rows)``: the grid timestamps and, for each series,
+        its values on the grid (NaN where the series has no sample). With
+        NumPy, ``rows`` is a 2-D array of shape (len(series), len(grid)).
+    """
+    width = parse_step(step)
+    populated = [s for s in series if len(s)]
+    if start is None:
+        start = min((s.timestamps[0] for s in populated), default=0.0)
+    if end is None:
+        end = max((s.timestamps[-1] for s in populated), default=start)
+    start = math.floor(start / width) * width
+    size = int(math.floor((end - start) / width)) + 1 if end >= start else 0
+    grid = _column(start + i * width for i in range(size))
+
+    rows = []
+    for s in series:
+        row = _column([math.nan]) * size
+        sampled = downsample(s, width, how)
+        for t, v in zip(sampled.timestamps, sampled.values):
+            index = int(round((t - start) / width))
+            if 0 <= index < size:
+                row[index] = v
+        rows.append(row)
+
+    if np is not None:
+        return np.asarray(grid, dtype=np.float64), np.asarray(
+            [list(r) for r in rows], dtype=np.float64
+        ).reshape(len(rows), size)
+    return grid, rows
+
+
+class MetricsClient:
+    """Concurrent, cached fetcher of metric series.
+
+    Requested ranges are cut into fixed ``window`` slices aligned on the
+    epoch. Each slice is fetched at most once: slices that are entirely in
+    the past are written to ``cache_dir`` and reused by later calls, so a
+    dashboard refreshing every minute only downloads the latest slice.
+
+    :param api_client: ApiClient to use. Defaults to ``ApiClient.get_default()``.
+    :param concurrency: maximum number of concurrent requests.
+    :param window: width of cached slices, in seconds.
+    :param cache_dir: directory of the on-disk cache. None disables it.
+    :param use_numpy: return NumPy arrays. Defaults to True when NumPy is
+        installed.
+    """
+
+    def __init__(
+        self,
+        api_client: Optional[ApiClient] = None,
+        concurrency: int = 8,
+        window: float = 3600.0,
+        cache_dir: Optional[str] = None,
+        use_numpy: Optional[bool] = None,
+    ) -> None:
+        if use_numpy and np is None:
+            raise ImportError("numpy is not installed")
+        self.metrics_api = MetricsApi(api_client or ApiClient.get_default())
+        self.concurrency = concurrency
+        self.window = window
+        self.cache_dir = os.path.expanduser(cache_dir) if cache_dir else None
+        self.use_numpy = np is not None if use_numpy is None else use_numpy
+        self.requests = 0
+        self.cache_hits = 0
+        self._lock = threading.Lock()
+
+    def fetch(
+        self,
+        name: Union[MetricName, str],
+        service_id: Optional[str] = None,
+        instance_id: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        step: Union[str, int, float] = "5m",
+    ) -> List[MetricSeries]:
+        """Fetches one metric for a service or an instance.
+
+        :return: one MetricSeries per label set returned by the API.
+        """
+        if instance_id is not None and service_id is None:
+            kind, target = "instance", instance_id
+        elif service_id is not None and instance_id is None:
+            kind, target = "service", service_id
+        else:
+            raise ValueError("Exactly one of service_id and instance_id must be set")
+        result = self.fetch_many(
+            [name],
+            service_ids=[target] if kind == "service" else (),
+            instance_ids=[target] if kind == "instance" else (),
+            start=start,
+            end=end,
+            step=step,
+        )
+        return result[(kind, target, MetricName(name).value)]
+
+    def fetch_many(
+        self,
+        names: Iterable[Union[MetricName, str]],
+        service_ids: Iterable[str] = (),
+        instance_ids: Iterable[str] = (),
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        step: Union[str, int, float] = "5m",
+    ) -> Dict[SeriesKey, List[MetricSeries]]:
+        """Fetches every (target x metric) combination concurrently.
+
+        :param names: metrics to fetch.
+        :param service_ids: services to fetch the metrics of.
+        :param instance_ids: instances to fetch the metrics of.
+        :param start: beginning of the range. Defaults to an hour before ``end``.
+        :param end: end of the range. Defaults to now.
+        :param step: resolution requested from the API, in whole minutes.
+        :return: mapping of (kind, id, metric name) to the series returned.
+        :raises ValueError: if ``step`` is not a whole number of minutes.
+        """
+        step_seconds = parse_step(step)
+        _format_step(step_seconds)  # Reject steps the API cannot serve up front
+        end_ts = (end or datetime.now(timezone.utc)).timestamp()
+        start_ts = start.timestamp() if start is not None else end_ts - 3600
+        names = [MetricName(n).value for n in names]
+        targets = [("service", s) for s in service_ids] + [
+            ("instance", i) for i in instance_ids
+        ]
+
+        slices = []
+        first = math.floor(start_ts / self.window) * self.window
+        t = first
+        while t < end_ts:
+            slices.append((max(t, start_ts), min(t + self.window, end_ts), t))
+            t += self.window
+
+        jobs = [
+            (kind, target, name, slice_)
+            for kind, target in targets
+            for name in names
+            for slice_ in slices
+        ]
+        with ThreadPoolExecutor(
+            max_workers=max(1, self.concurrency), thread_name_prefix="koyeb-metrics"
+        ) as pool:
+            parts = list(
+                pool.map(
+                    lambda job: self._fetch_slice(
+                        job[0], job[1], job[2], job[3], step_seconds
+                    ),
+                    jobs,
+                )
+            )
+
+        merged: Dict[SeriesKey, Dict[str, MetricSeries]] = {
+            (kind, target, name): {} for kind, target in targets for name in names
+        }
+        for (kind, target, name, _), part in zip(jobs, parts):
+            by_labels = merged[(kind, target, name)]
+            for labels, timestamps, values in part:
+                label_key = json.dumps(labels, sort_keys=True)
+                series = by_labels.get(label_key)
+                if series is None:
+                    series = MetricSeries(kind, target, name, labels)
+                    by_labels[label_key] = series
+                series.timestamps.extend(timestamps)
+                series.values.extend(values)
+
+        result: Dict[SeriesKey, List[MetricSeries]] = {}
+        for key, by_labels in merged.items():
+            result[key] = [
+                self._finish(s, start_ts, end_ts) for s in by_labels.values()
+            ]
+        return result
+
+    def clear_cache(self) -> None:
+        """Removes every cached window."""
+        if not self.cache_dir or not os.path.isdir(self.cache_dir):
+            return
+        for entry in os.listdir(self.cache_dir):
+            if entry.endswith(".json"):
+                os.remove(os.path.join(self.cache_dir, entry))
+
+    def _finish(
+        self, series: MetricSeries, start_ts: float, end_ts: float
+    ) -> MetricSeries:
+        # Slices overlap on their boundaries: sort, trim and drop duplicates
+        points = sorted(zip(series.timestamps, series.values))
+        timestamps = _column()
+        values = _column()
+        for t, v in points:
+            if t < start_ts or t > end_ts or (timestamps and timestamps[-1] == t):
+                continue
+            timestamps.append(t)
+            values.append(v)
+        series.timestamps, series.values = timestamps, values
+        return series.as_numpy() if self.use_numpy else series
+
+    def _cache_path(
+        self, kind, target, name, step_seconds, window_start
+    ) -> Optional[str]:
+        if not self.cache_dir:
+            return None
+        raw = f"{kind}|{target}|{name}|{step_seconds}|{self.window}|{window_start}"
+        digest = hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+        return os.path.join(self.cache_dir, f"{digest}.json")
+
+    def _fetch_slice(self, kind, target, name, slice_, step_seconds):
+        slice_start, slice_end, window_start = slice_
+        full = slice_end - slice_start >= self.window
+        # Only complete windows old enough to be final are cached
+        cacheable = full and slice_end < time.time() - step_seconds
+        path = self._cache_path(kind, target, name, step_seconds, window_start)
+        if cacheable and path and os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    cached = json.load(f)
+                with self._lock:
+                    self.cache_hits += 1
+                return [(c["labels"], c["t"], c["v"]) for c in cached]
+            except (OSError, ValueError, KeyError) as e:
+                logger.debug(f"Ignoring unreadable metrics cache {path}: {e}")
+
+        part = self._request(kind, target, name, slice_start, slice_end, step_seconds)
+
+        if cacheable and path and self.cache_dir:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(
+                        [{"labels": l, "t": list(t), "v": list(v)} for l, t, v in part],
+                        f,
+                    )
+                os.replace(tmp_path, path)
+            except OSError as e:
+                logger.debug(f"Could not write metrics cache {path}: {e}")
+        return part
+
+    def _request(self, kind, target, name, start_ts, end_ts, step_seconds):
+        with self._lock:
+            self.requests += 1
+        response = self.metrics_api.get_metrics_without_preload_content(
+            service_id=target if kind == "service" else None,
+            instance_id=target if kind == "instance" else None,
+            name=name,
+            start=datetime.fromtimestamp(start_ts, timezone.utc),
+            end=datetime.fromtimestamp(end_ts, timezone.utc),
+            step=_format_step(step_seconds),
+        )
+        data = response.read()
+        if not 200 <= response.status <= 299:
+            raise ApiException.from_response(
+                http_resp=response,
+                body=data.decode("utf-8", "replace") if data else None,
+                data=None,
+            )
+        # Parse the raw JSON rather than building one model per sample
+        payload = json.loads(data) if data else {}
+        part = []
+        for metric in payload.get("metrics") or []:
+            timestamps = _column()
+            values = _column()
+            for sample in metric.get("samples") or []:
+                ts = sample.get("timestamp")
+                value = sample.get("value")
+                if ts is None or value is None:
+                    continue
+                timestamps.append(_parse_timestamp(ts))
+                values.append(float(value))
+            part.append((dict(metric.get("labels") or {}), timestamps, values))
+        return part
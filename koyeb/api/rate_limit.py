@@ -0,0 +1,311 @@
+# coding: utf-8
+
+"""
+Koyeb Rest API - client-side rate limiting
+
+Token-bucket rate limiter shared per API host and token, with Retry-After
+aware, jittered exponential backoff. Enable it on a configuration before
+building the client::
+
+    configuration.rate_limiter = RateLimiter(rate=10, burst=20)
+    api_client = ApiClient(configuration)
+"""  # noqa: E501
+
+import email.utils
+import hashlib
+import logging
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, Mapping, Optional, Tuple
+from urllib.parse import urlsplit
+
+if TYPE_CHECKING:
+    from koyeb.api.rest import RESTResponse
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENT_METHODS = frozenset(["GET", "HEAD", "OPTIONS", "PUT", "DELETE"])
+RETRY_STATUSES = frozenset([429, 502, 503, 504])
+
+
+def parse_retry_after(headers: Optional[Mapping[str, str]]) -> Optional[float]:
+    """Returns the delay requested by a ``Retry-After`` header, in seconds.
+
+    :param headers: response headers.
+    :return: delay in seconds, or None if the header is absent or invalid.
+    """
+    if not headers:
+        return None
+    value = headers.get("Retry-After") or headers.get("retry-after")
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+def parse_rate_limit_reset(headers: Optional[Mapping[str, str]]) -> Optional[float]:
+    """Returns the seconds until quota resets when the rate-limit headers
+    report that no requests remain, None otherwise.
+
+    Understands both ``X-RateLimit-Remaining``/``X-RateLimit-Reset`` (reset as
+    a delay or an epoch timestamp) and ``RateLimit-Remaining``/``RateLimit-Reset``.
+
+    :param headers: response headers.
+    :return: delay in seconds, or None.
+    """
+    if not headers:
+        return None
+    for prefix in ("X-RateLimit-", "RateLimit-"):
+        remaining = headers.get(prefix + "Remaining")
+        reset = headers.get(prefix + "Reset")
+        if remaining is None or reset is None:
+            continue
+        try:
+            if int(float(remaining)) > 0:
+                return None
+            reset_value = float(reset)
+        except ValueError:
+            continue
+        # Values larger than a year are epoch timestamps rather than delays
+        if reset_value > 365 * 24 * 3600:
+            reset_value -= time.time()
+        return max(0.0, reset_value)
+    return None
+
+
+def compute_backoff(
+    attempt: int,
+    base: float,
+    cap: float,
+    retry_after: Optional[float] = None,
+) -> float:
+    """Returns a jittered exponential backoff delay.
+
+    Uses "equal jitter": half of ``base * 2**attempt`` (capped) plus a random
+    share of the other half, so that concurrent clients spread out while
+    still backing off. A server-provided ``retry_after`` is a lower bound.
+
+    :param attempt: zero-based retry attempt.
+    :param base: delay of the first attempt, in seconds.
+    :param cap: maximum delay, in seconds.
+    :param retry_after: delay requested by the server, if any.
+    :return: delay in seconds.
+    """
+    ceiling = min(cap, base * (2**attempt))
+    delay = ceiling / 2 + random.uniform(0, ceiling / 2)
+    if retry_after is not None:
+        delay = max(delay, retry_after + random.uniform(0, base / 2))
+    return delay
+
+
+@dataclass
+class RateLimiterStats:
+    """Counters describing how much a RateLimiter slowed requests down."""
+
+    requests: int = 0
+    throttled_requests: int = 0
+    throttled_seconds: float = 0.0
+    rate_limited_responses: int = 0
+    retries: int = 0
+    backoff_seconds: float = 0.0
+
+    @property
+    def total_delay_seconds(self) -> float:
+        """Time spent waiting for tokens plus time spent backing off."""
+        return self.throttled_seconds + self.backoff_seconds
+
+
+class TokenBucket:
+    """Thread-safe token bucket.
+
+    :param rate: tokens added per second.
+    :param burst: bucket capacity.
+    """
+
+    def __init__(self, rate: float, burst: int) -> None:
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        if burst < 1:
+            raise ValueError("burst must be at least 1")
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """Takes a token, returning how long the caller must wait for it."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            self._tokens -= 1
+            wait = 0.0
+            if self._tokens < 0:
+                wait = -self._tokens / self.rate
+            return max(wait, self._paused_until - now)
+
+    def acquire(self) -> float:
+        """Blocks until a token is available.
+
+        :return: seconds spent waiting.
+        """
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def pause(self, seconds: float) -> None:
+        """Holds back every caller for ``seconds``, e.g. after a 429."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+class RateLimiter:
+    """Client-side rate limiter with adaptive backoff.
+
+    One token bucket is kept per (API host, credentials) pair, so clients
+    sharing a limiter and a token share their budget. ``Retry-After`` and
+    exhausted rate-limit headers pause the matching bucket for every
+    thread. Responses with a status in ``retry_statuses`` are retried with
+    jittered exponential backoff: 429 for any method, since the request was
+    rejected before being processed, other statuses for idempotent methods
+    only.
+
+    :param rate: sustained requests per second per host and token.
+    :param burst: number of requests allowed in a burst.
+    :param max_retries: maximum number of retries of a single request.
+    :param backoff_base: delay of the first retry, in seconds.
+    :param backoff_max: maximum delay between retries, in seconds.
+    :param retry_statuses: HTTP statuses that trigger a retry.
+    """
+
+    def __init__(
+        self,
+        rate: float = 10.0,
+        burst: int = 20,
+        max_retries: int = 5,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30.0,
+        retry_statuses: Iterable[int] = RETRY_STATUSES,
+    ) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_statuses = frozenset(retry_statuses)
+        self.stats = RateLimiterStats()
+        self._buckets: Dict[Tuple[str, str], TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def __deepcopy__(self, memo):
+        # Limiters are meant to be shared, including by copied configurations
+        return self
+
+    def bucket(self, url: str, token: Optional[str] = None) -> TokenBucket:
+        """Returns the bucket shared by requests to ``url``'s host with ``token``."""
+        host = urlsplit(url).netloc
+        digest = hashlib.sha256((token or "").encode("utf-8")).hexdigest()[:16]
+        key = (host, digest)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = TokenBucket(self.rate, self.burst)
+                self._buckets[key] = bucket
+            return bucket
+
+    def acquire(self, url: str, token: Optional[str] = None) -> float:
+        """Waits for permission to send a request.
+
+        :return: seconds spent waiting.
+        """
+        waited = self.bucket(url, token).acquire()
+        with self._lock:
+            self.stats.requests += 1
+            if waited > 0:
+                self.stats.throttled_requests += 1
+                self.stats.throttled_seconds += waited
+        return waited
+
+    def observe(
+        self,
+        url: str,
+        token: Optional[str],
+        status: int,
+        headers: Optional[Mapping[str, str]],
+    ) -> None:
+        """Adapts the bucket of ``url`` to a response's status and headers."""
+        pause = parse_rate_limit_reset(headers)
+        if status == 429:
+            with self._lock:
+                self.stats.rate_limited_responses += 1
+            retry_after = parse_retry_after(headers)
+            if retry_after is not None:
+                pause = max(pause or 0.0, retry_after)
+        if pause:
+            self.bucket(url, token).pause(pause)
+
+    def should_retry(self, method: str, status: int, attempt: int) -> bool:
+        """Returns whether a response with ``status`` should be retried."""
+        if attempt >= self.max_retries or status not in self.retry_statuses:
+            return False
+        return status == 429 or method.upper() in IDEMPOTENT_METHODS
+
+    def retry_delay(self, attempt: int, headers: Optional[Mapping[str, str]]) -> float:
+        """Returns how long to wait before retry number ``attempt``."""
+        return compute_backoff(
+            attempt, self.backoff_base, self.backoff_max, parse_retry_after(headers)
+        )
+
+    def record_backoff(self, delay: float) -> None:
+        with self._lock:
+            self.stats.retries += 1
+            self.stats.backoff_seconds += delay
+
+    def execute(
+        self,
+        method: str,
+        url: str,
+        headers: Optional[Mapping[str, str]],
+        send: Callable[[], "RESTResponse"],
+    ) -> "RESTResponse":
+        """Sends a request through the limiter, retrying throttled responses.
+
+        :param method: HTTP method.
+        :param url: request url.
+        :param headers: request headers, used to find the credentials.
+        :param send: callable performing the request.
+        :return: the last response received.
+        """
+        token = (headers or {}).get("Authorization")
+        attempt = 0
+        while True:
+            self.acquire(url, token)
+            response = send()
+            self.observe(url, token, response.status, response.headers)
+            if not self.should_retry(method, response.status, attempt):
+                return response
+            delay = self.retry_delay(attempt, response.headers)
+            logger.debug(
+                f"Received {response.status} for {method} {url}, "
+                f"retrying in {delay:.2f}s (attempt {attempt + 1}/{self.max_retries})"
+            )
+            # Drain the body so the connection goes back to the pool
+            response.read()
+            self.record_backoff(delay)
+            time.sleep(delay)
+            attempt += 1
@@ -0,0 +1,311 @@
+# coding: utf-8
+
+"""
+Koyeb Rest API - response cache
+
+Opt-in, in-process cache for GET requests on rarely-changing endpoints such
+as the instance, region and datacenter catalogs. Enable it by passing a
+``ResponseCache`` to the ``ApiClient``::
+
+    cache = ResponseCache(persist_path="~/.cache/koyeb/api.json")
+    api_client = ApiClient(configuration, response_cache=cache)
+"""  # noqa: E501
+
+import base64
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Pattern, Tuple
+from urllib.parse import urlsplit
+
+import urllib3
+
+logger = logging.getLogger(__name__)
+
+# TTLs (in seconds) applied by default, keyed by a regular expression matched
+# against the request path. Requests to other paths are not cached.
+DEFAULT_CACHE_TTLS: Dict[str, float] = {
+    r"^/v1/catalog/regions(/[^/]+)?$": 3600,
+    r"^/v1/catalog/instances(/[^/]+)?$": 3600,
+    r"^/v1/catalog/datacenters$": 3600,
+}
+
+
+class CachedRESTResponse(io.IOBase):
+    """A fully buffered response, interchangeable with rest.RESTResponse."""
+
+    def __init__(self, status, reason, headers, data) -> None:
+        self.status = status
+        self.reason = reason
+        self._headers = urllib3.HTTPHeaderDict(headers or {})
+        self.data = data
+
+    @classmethod
+    def from_response(cls, response) -> "CachedRESTResponse":
+        """Buffer the body of a RESTResponse.
+
+        :param response: rest.RESTResponse (or compatible) to read.
+        :return: CachedRESTResponse
+        """
+        return cls(
+            status=response.status,
+            reason=response.reason,
+            headers=response.headers,
+            data=response.read(),
+        )
+
+    def read(self):
+        return self.data
+
+    @property
+    def headers(self):
+        """Returns a dictionary of response headers."""
+        return self._headers
+
+    def getheaders(self):
+        """Returns a dictionary of the response headers; use ``headers`` instead."""
+        return self._headers
+
+    def getheader(self, name, default=None):
+        """Returns a given response header; use ``headers.get()`` instead."""
+        return self._headers.get(name, default)
+
+
+class _CacheEntry:
+
+    __slots__ = ("status", "reason", "headers", "data", "stored_at", "expires_at")
+
+    def __init__(self, status, reason, headers, data, stored_at, expires_at) -> None:
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.data = data
+        self.stored_at = stored_at
+        self.expires_at = expires_at
+
+    @property
+    def etag(self) -> Optional[str]:
+        return self.headers.get("ETag") or self.headers.get("etag")
+
+    @property
+    def last_modified(self) -> Optional[str]:
+        return self.headers.get("Last-Modified") or self.headers.get("last-modified")
+
+    def to_response(self) -> CachedRESTResponse:
+        return CachedRESTResponse(self.status, self.reason, self.headers, self.data)
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "status": self.status,
+            "reason": self.reason,
+            "headers": self.headers,
+            "data": base64.b64encode(self.data).decode("ascii"),
+            "stored_at": self.stored_at,
+            "expires_at": self.expires_at,
+        }
+
+    @classmethod
+    def from_json(cls, obj: Dict[str, Any]) -> "_CacheEntry":
+        return cls(
+            status=obj["status"],
+            reason=obj.get("reason"),
+            headers=dict(obj.get("headers") or {}),
+            data=base64.b64decode(obj["data"]),
+            stored_at=obj["stored_at"],
+            expires_at=obj["expires_at"],
+        )
+
+
+class ResponseCache:
+    """Size-bounded LRU cache of GET responses with per-endpoint TTLs.
+
+    Entries are keyed on the full request URL and the credentials used to
+    issue it, so clients sharing a cache never see each other's data. When
+    an entry expires and the API returned an ``ETag`` or ``Last-Modified``
+    validator, the next lookup is sent as a conditional request and a
+    ``304 Not Modified`` answer refreshes the entry without a new body.
+
+    :param ttls: mapping of path regular expression -> TTL in seconds.
+        Defaults to ``DEFAULT_CACHE_TTLS``. The first matching pattern wins.
+    :param default_ttl: TTL for paths matching no pattern. ``None`` (the
+        default) leaves those requests uncached.
+    :param max_entries: maximum number of responses kept in memory; the
+        least recently used entry is evicted first.
+    :param persist_path: optional JSON file used to keep the cache across
+        process restarts. It is loaded on creation and rewritten on change.
+    """
+
+    def __init__(
+        self,
+        ttls: Optional[Dict[str, float]] = None,
+        default_ttl: Optional[float] = None,
+        max_entries: int = 256,
+        persist_path: Optional[str] = None,
+    ) -> None:
+        if max_entries <= 0:
+            raise ValueError("max_entries must be a positive integer")
+        self._ttls: List[Tuple[Pattern[str], float]] = [
+            (re.compile(pattern), ttl)
+            for pattern, ttl in (DEFAULT_CACHE_TTLS if ttls is None else ttls).items()
+        ]
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self.persist_path = (
+            os.path.expanduser(persist_path) if persist_path is not None else None
+        )
+        self._entries: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        if self.persist_path is not None:
+            self._load()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def ttl_for(self, url: str) -> Optional[float]:
+        """Returns the TTL configured for ``url``, or None if it is not cached."""
+        path = urlsplit(url).path
+        for pattern, ttl in self._ttls:
+            if pattern.search(path):
+                return ttl
+        return self.default_ttl
+
+    def request(
+        self,
+        url: str,
+        headers: Optional[Dict[str, str]],
+        send: Callable[[Dict[str, str]], object],
+    ):
+        """Serves a GET request from the cache, calling ``send`` on a miss.
+
+        :param url: full request url, including the query string.
+        :param headers: request headers.
+        :param send: callable performing the request with the given headers
+            and returning a rest.RESTResponse.
+        :return: rest.RESTResponse or CachedRESTResponse
+        """
+        headers = dict(headers or {})
+        ttl = self.ttl_for(url)
+        if not ttl or ttl <= 0:
+            return send(headers)
+
+        key = self._key(url, headers)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                if entry.expires_at > now:
+                    self.hits += 1
+                    return entry.to_response()
+            self.misses += 1
+
+        if entry is not None:
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+
+        response = CachedRESTResponse.from_response(send(headers))
+
+        if response.status == 304 and entry is not None:
+            with self._lock:
+                entry.stored_at = time.time()
+                entry.expires_at = entry.stored_at + ttl
+                self.revalidations += 1
+                self._save()
+            return entry.to_response()
+
+        if 200 <= response.status <= 299:
+            self._store(key, response, ttl)
+        return response
+
+    def invalidate(self, pattern: Optional[str] = None) -> int:
+        """Drops cached responses.
+
+        :param pattern: regular expression matched against the request url.
+            If None, the whole cache is cleared.
+        :return: number of entries removed.
+        """
+        with self._lock:
+            if pattern is None:
+                removed = len(self._entries)
+                self._entries.clear()
+            else:
+                regex = re.compile(pattern)
+                keys = [k for k in self._entries if regex.search(k.split(" ", 1)[1])]
+                for k in keys:
+                    del self._entries[k]
+                removed = len(keys)
+            if removed:
+                self._save()
+            return removed
+
+    def clear(self) -> None:
+        """Drops all cached responses."""
+        self.invalidate()
+
+    def _key(self, url: str, headers: Dict[str, str]) -> str:
+        auth = headers.get("Authorization") or headers.get("Cookie") or ""
+        digest = hashlib.sha256(auth.encode("utf-8")).hexdigest()[:16]
+        return f"{digest} {url}"
+
+    def _store(self, key: str, response: CachedRESTResponse, ttl: float) -> None:
+        now = time.time()
+        entry = _CacheEntry(
+            status=response.status,
+            reason=response.reason,
+            headers=dict(response.headers),
+            data=response.data,
+            stored_at=now,
+            expires_at=now + ttl,
+        )
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._save()
+
+    def _load(self) -> None:
+        if self.persist_path is None:
+            return
+        try:
+            with open(self.persist_path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+            for key, obj in raw.items():
+                self._entries[key] = _CacheEntry.from_json(obj)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(
+                f"Ignoring unreadable response cache {self.persist_path}: {e}"
+            )
+            self._entries.clear()
+            return
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _save(self) -> None:
+        if self.persist_path is None:
+            return
+        directory = os.path.dirname(self.persist_path) or "."
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({k: e.to_json() for k, e in self._entries.items()}, f)
+            os.replace(tmp_path, self.persist_path)
+        except OSError as e:
+            logger.warning(
+                f"Could not persist response cache to {self.persist_path}: {e}"
+            )
@@ -115,6 +115,8 @@ class RESTClientObject:
         else:
             self.pool_manager = urllib3.PoolManager(**pool_args)
 
+        self.rate_limiter = configuration.rate_limiter
+
     def request(
         self,
         method,
@@ -138,6 +140,33 @@ class RESTClientObject:
                                  timeout. It can also be a pair (tuple) of
                                  (connection, read) timeouts.
         """
+        if self.rate_limiter is not None:
+            return self.rate_limiter.execute(
+                method.upper(),
+                url,
+                headers,
+                # copy headers, a multipart request mutates them
+                lambda: self._request(
+                    method,
+                    url,
+                    dict(headers or {}),
+                    body,
+                    post_params,
+                    _request_timeout,
+                ),
+            )
+        return self._request(method, url, headers, body, post_params, _request_timeout)
+
+    def _request(
+        self,
+        method,
+        url,
+        headers=None,
+        body=None,
+        post_params=None,
+        _request_timeout=None,
+    ):
+        """Perform a single request, see ``request``."""
         method = method.upper()
         assert method in ["GET", "HEAD", "DELETE", "POST", "PUT", "PATCH", "OPTIONS"]
 
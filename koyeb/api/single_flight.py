@@ -0,0 +1,120 @@
+# coding: utf-8
+
+"""
+Koyeb Rest API - request coalescing
+
+Opt-in single-flight layer for idempotent requests: while a request is in
+flight, identical requests issued from other threads wait for it and share
+its response instead of hitting the API again. Enable it by passing a
+``SingleFlight`` to the ``ApiClient``::
+
+    api_client = ApiClient(configuration, single_flight=SingleFlight())
+"""  # noqa: E501
+
+import hashlib
+import threading
+from typing import Callable, Dict, Iterable, Optional
+
+from koyeb.api.response_cache import CachedRESTResponse
+
+
+class _Call:
+
+    __slots__ = ("done", "response", "error", "waiters")
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.response: Optional[CachedRESTResponse] = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Deduplicates identical in-flight requests.
+
+    Two requests are identical when they share the method, the full url and
+    the request headers (and therefore the credentials). The first caller
+    performs the request and buffers the body; callers arriving before it
+    completes block until then and receive their own copy of the same
+    response, or the same exception.
+
+    The async SDK classes run API calls in executor threads, so they are
+    coalesced by the same mechanism.
+
+    :param methods: HTTP methods eligible for coalescing. Only idempotent
+        methods without a request body should be listed.
+    """
+
+    def __init__(self, methods: Iterable[str] = ("GET", "HEAD")) -> None:
+        self.methods = frozenset(m.upper() for m in methods)
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.coalesced = 0
+
+    def accepts(self, method: str) -> bool:
+        """Returns whether requests with ``method`` are coalesced."""
+        return method.upper() in self.methods
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        headers: Optional[Dict[str, str]],
+        send: Callable[[Dict[str, str]], object],
+    ) -> CachedRESTResponse:
+        """Performs ``send(headers)`` once for all identical concurrent callers.
+
+        :param method: HTTP method.
+        :param url: full request url, including the query string.
+        :param headers: request headers.
+        :param send: callable performing the request with the given headers
+            and returning a rest.RESTResponse.
+        :return: CachedRESTResponse
+        """
+        headers = dict(headers or {})
+        key = self._key(method, url, headers)
+
+        with self._lock:
+            self.requests += 1
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.coalesced += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                leader = True
+
+        if leader:
+            try:
+                call.response = CachedRESTResponse.from_response(send(headers))
+            except BaseException as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+        else:
+            call.done.wait()
+
+        if call.error is not None:
+            raise call.error
+        response = call.response
+        if response is None:
+            raise RuntimeError("single-flight request completed without a response")
+        return CachedRESTResponse(
+            response.status, response.reason, response.headers, response.data
+        )
+
+    def in_flight(self) -> int:
+        """Returns the number of distinct requests currently in flight."""
+        with self._lock:
+            return len(self._calls)
+
+    def _key(self, method: str, url: str, headers: Dict[str, str]) -> str:
+        digest = hashlib.sha256()
+        for name, value in sorted(headers.items()):
+            digest.update(f"{name.lower()}:{value}\n".encode("utf-8"))
+        return f"{method.upper()} {url} {digest.hexdigest()[:16]}"
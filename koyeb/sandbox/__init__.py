@@ -8,6 +8,7 @@ __version__ = "1.2.2"
 
 from koyeb.api.models.instance_status import InstanceStatus as SandboxStatus
 
+from .cluster import AsyncSandboxCluster, MapResult, SandboxCluster
 from .exec import (
     AsyncSandboxExecutor,
     CommandResult,
@@ -16,7 +17,28 @@ from .exec import (
     SandboxExecutor,
 )
 from .filesystem import FileInfo, SandboxFilesystem
-from .sandbox import AsyncSandbox, ExposedPort, ProcessInfo, Sandbox
+from .forward import ForwardStats, PortForward
+from .interpreter import AsyncInterpreter, CellError, CellResult, Interpreter
+from .keepwarm import AsyncKeepWarm, KeepWarm
+from .layers import InstallResult, LayerCache
+from .metrics import (
+    InstanceTypeAdvisor,
+    Recommendation,
+    ResourceSample,
+    ResourceUsage,
+)
+from .processes import ProcessKillResult, ProcessOutput
+from .reaper import ReapReport, ReapTarget, SandboxReaper
+from .regions import RegionLatency, rank_regions
+from .result_cache import (
+    AsyncCachedExecutor,
+    CachedCommandResult,
+    CachedExecutor,
+    ResultCache,
+)
+from .sandbox import AsyncSandbox, ExposedPort, ProcessInfo, Sandbox, SandboxRoute
+from .shell import AsyncShell, Shell
+from .snapshots import SandboxSnapshot
 from .utils import SandboxError, SandboxTimeoutError
 
 __all__ = [
@@ -33,5 +55,37 @@ __all__ = [
     "CommandStatus",
     "SandboxCommandError",
     "ExposedPort",
+    "SandboxRoute",
     "ProcessInfo",
+    "ProcessOutput",
+    "ProcessKillResult",
+    "ResourceSample",
+    "ResourceUsage",
+    "InstanceTypeAdvisor",
+    "Recommendation",
+    "Interpreter",
+    "AsyncInterpreter",
+    "CellResult",
+    "CellError",
+    "SandboxReaper",
+    "ReapReport",
+    "ReapTarget",
+    "Shell",
+    "AsyncShell",
+    "SandboxSnapshot",
+    "LayerCache",
+    "InstallResult",
+    "RegionLatency",
+    "rank_regions",
+    "KeepWarm",
+    "AsyncKeepWarm",
+    "SandboxCluster",
+    "AsyncSandboxCluster",
+    "MapResult",
+    "ResultCache",
+    "CachedExecutor",
+    "AsyncCachedExecutor",
+    "CachedCommandResult",
+    "PortForward",
+    "ForwardStats",
 ]
@@ -0,0 +1,583 @@
+# coding: utf-8
+
+"""
+Fan-out of work across a fleet of Koyeb Sandbox instances
+"""
+
+from __future__ import annotations
+
+import functools
+import itertools
+import shlex
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Type,
+    cast,
+)
+
+from .exec import CommandResult, CommandStatus
+from .utils import SandboxError, logger
+
+if TYPE_CHECKING:
+    from .sandbox import Sandbox
+
+# Weight of the latest duration in the latency estimate of a sandbox
+_LATENCY_WEIGHT = 0.2
+# Consecutive failures after which a sandbox is checked, then replaced if down
+_SUSPECT_FAILURES = 2
+
+
+@dataclass
+class MapResult:
+    """Outcome of one item of SandboxCluster.map()."""
+
+    index: int  # Position of the item in the input
+    item: Any
+    result: Optional[CommandResult] = None
+    error: Optional[BaseException] = None  # Set when every attempt failed
+    sandbox_id: Optional[str] = None  # Sandbox of the last attempt
+    attempts: int = 0
+
+    @property
+    def success(self) -> bool:
+        """Check if the command ran and exited with code 0"""
+        return self.result is not None and self.result.success
+
+
+@dataclass
+class _Member:
+    sandbox: Sandbox
+    inflight: int = 0
+    latency: Optional[float] = None  # Moving average of task durations
+    failures: int = 0  # Consecutive failures
+    checking: bool = False
+
+    @property
+    def id(self) -> str:
+        return self.sandbox.service_id
+
+
+@dataclass
+class _Task:
+    fn: Callable[[Sandbox], Any]
+    future: Future[Any]
+    attempts: int = 0
+    excluded: Set[str] = field(default_factory=set)  # Sandboxes it failed on
+    sandbox_id: Optional[str] = None
+
+
+class SandboxCluster:
+    """
+    Dispatches work across many sandboxes.
+
+    Each sandbox runs at most concurrency tasks at once. A task goes to the
+    sandbox with a free slot that would finish it soonest, estimated from its
+    tasks in flight and its measured task latency, so faster sandboxes take
+    more of the work as soon as they free up. A task failing with one of the
+    retry_on exceptions is retried on another sandbox; a sandbox failing
+    repeatedly is health-checked and, if down, replaced using factory.
+
+    Example:
+        >>> with SandboxCluster.create(size=8, concurrency=4) as cluster:
+        ...     for r in cluster.map("python eval.py --case {}", cases):
+        ...         print(r.item, r.result.stdout)
+    """
+
+    def __init__(
+        self,
+        sandboxes: Iterable[Sandbox],
+        concurrency: int = 4,
+        max_attempts: int = 3,
+        factory: Optional[Callable[[], Sandbox]] = None,
+        retry_on: Tuple[Type[BaseException], ...] = (SandboxError, OSError),
+        health_timeout: float = 30.0,
+    ) -> None:
+        """
+        Args:
+            sandboxes: Sandboxes of the cluster
+            concurrency: Maximum number of tasks in flight per sandbox
+            max_attempts: Maximum number of attempts per task
+            factory: Creates a replacement for a sandbox that stopped responding
+                (None: unresponsive sandboxes are only removed)
+            retry_on: Exceptions retried on another sandbox; connection errors
+                are OSErrors
+            health_timeout: Seconds a suspect sandbox has to answer a health check
+        """
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.factory = factory
+        self.retry_on = retry_on
+        self.health_timeout = health_timeout
+        self._members: Dict[str, _Member] = {
+            sandbox.service_id: _Member(sandbox) for sandbox in sandboxes
+        }
+        self._pending: List[_Task] = []
+        self._running = 0
+        self._replacing = 0
+        self._closed = False
+        # Sandboxes are deleted on close() only if created by create()
+        self._owned = False
+        self._condition = threading.Condition()
+        # One thread per slot, plus health checks and replacements
+        self._pool = ThreadPoolExecutor(
+            max_workers=max(1, len(self._members)) * concurrency + 8,
+            thread_name_prefix="koyeb-cluster",
+        )
+        self._dispatcher = threading.Thread(
+            target=self._dispatch, name="koyeb-cluster-dispatch", daemon=True
+        )
+        self._dispatcher.start()
+
+    @classmethod
+    def create(
+        cls,
+        size: int,
+        concurrency: int = 4,
+        max_attempts: int = 3,
+        **kwargs: Any,
+    ) -> "SandboxCluster":
+        """
+        Create the sandboxes of a cluster in parallel.
+
+        Args:
+            size: Number of sandboxes
+            concurrency: Maximum number of tasks in flight per sandbox
+            max_attempts: Maximum number of attempts per task
+            **kwargs: Arguments of Sandbox.create, also used for replacements
+
+        Returns:
+            SandboxCluster: Cluster deleting its sandboxes on close()
+        """
+        from .sandbox import Sandbox
+
+        kwargs.setdefault("name", "cluster")
+
+        def factory() -> Sandbox:
+            return Sandbox.create(**kwargs)
+
+        with ThreadPoolExecutor(max_workers=min(size, 16) or 1) as pool:
+            futures = [pool.submit(factory) for _ in range(size)]
+        sandboxes = []
+        errors = []
+        for future in futures:
+            try:
+                sandboxes.append(future.result())
+            except Exception as e:
+                errors.append(e)
+        if errors:
+            for sandbox in sandboxes:
+                _delete(sandbox)
+            raise SandboxError(f"Failed to create cluster: {errors[0]}") from errors[0]
+        cluster = cls(
+            sandboxes,
+            concurrency=concurrency,
+            max_attempts=max_attempts,
+            factory=factory,
+        )
+        cluster._owned = True
+        return cluster
+
+    @property
+    def sandboxes(self) -> List[Sandbox]:
+        """Get the sandboxes currently in the cluster."""
+        with self._condition:
+            return [member.sandbox for member in self._members.values()]
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Get the tasks in flight and the measured latency of each sandbox."""
+        with self._condition:
+            return {
+                member.id: {"inflight": member.inflight, "latency": member.latency}
+                for member in self._members.values()
+            }
+
+    def submit(self, fn: Callable[[Sandbox], Any]) -> Future[Any]:
+        """
+        Run fn(sandbox) on a sandbox of the cluster.
+
+        fn is called from a worker thread, so the cluster should hold
+        synchronous Sandbox handles.
+
+        Args:
+            fn: Work to run, called with the chosen sandbox
+
+        Returns:
+            Future: Result of fn, or the exception of its last attempt
+
+        Raises:
+            SandboxError: If the cluster is closed
+        """
+        return self._submit(fn).future
+
+    def _submit(self, fn: Callable[[Sandbox], Any]) -> _Task:
+        task = _Task(fn=fn, future=Future())
+        with self._condition:
+            if self._closed:
+                raise SandboxError("Cluster is closed")
+            self._pending.append(task)
+            self._condition.notify_all()
+        return task
+
+    def map(
+        self,
+        command_template: str,
+        items: Iterable[Any],
+        timeout: float = 300.0,
+        cwd: Optional[str] = None,
+        env: Optional[Dict[str, str]] = None,
+    ) -> Iterator[MapResult]:
+        """
+        Run a command per item, yielding the results in completion order.
+
+        Placeholders of command_template are filled with shell-quoted values:
+        {} or {item} with the item, and {key} with the values of dict items.
+        Items are read lazily, so the input can be a large generator.
+
+        A command exiting with a non-zero code is a result, not a failure,
+        and is not retried.
+
+        Args:
+            command_template: Command with placeholders, e.g. "python run.py {}"
+            items: Work items
+            timeout: Command timeout in seconds
+            cwd: Working directory of the commands
+            env: Environment variables of the commands
+
+        Yields:
+            MapResult: Result of each item, in completion order
+        """
+        items = iter(enumerate(items))
+        inflight: Dict[Future[Any], Tuple[int, Any, _Task]] = {}
+
+        def fill() -> None:
+            for index, item in itertools.islice(
+                items, self._capacity() * 2 - len(inflight)
+            ):
+                command = _format_command(command_template, item)
+                task = self._submit(
+                    functools.partial(
+                        _run_command, command=command, timeout=timeout, cwd=cwd, env=env
+                    )
+                )
+                inflight[task.future] = (index, item, task)
+
+        fill()
+        while inflight:
+            done, _ = wait(list(inflight), return_when=FIRST_COMPLETED)
+            for future in done:
+                index, item, task = inflight.pop(future)
+                error = future.exception()
+                yield MapResult(
+                    index=index,
+                    item=item,
+                    result=None if error else future.result(),
+                    error=error,
+                    sandbox_id=task.sandbox_id,
+                    attempts=task.attempts,
+                )
+            fill()
+
+    def _capacity(self) -> int:
+        with self._condition:
+            return max(1, len(self._members)) * self.concurrency
+
+    def _pick(self, task: _Task) -> Optional[_Member]:
+        available = [
+            member
+            for member in self._members.values()
+            if member.inflight < self.concurrency and not member.checking
+        ]
+        # Avoid the sandboxes the task failed on, unless there is no other
+        preferred = [m for m in available if m.id not in task.excluded]
+        if not preferred and any(
+            m.id not in task.excluded for m in self._members.values()
+        ):
+            return None
+        candidates = preferred or available
+        if not candidates:
+            return None
+        known = [m.latency for m in self._members.values() if m.latency is not None]
+        default = sum(known) / len(known) if known else 1.0
+        # Expected time to finish this task on the sandbox
+        return min(
+            candidates,
+            key=lambda m: ((m.inflight + 1) * (m.latency or default), m.inflight),
+        )
+
+    def _dispatch(self) -> None:
+        with self._condition:
+            while True:
+                if self._closed and not self._pending and not self._running:
+                    return
+                if not self._members and not self._replacing and self._pending:
+                    for task in self._pending:
+                        task.future.set_exception(
+                            SandboxError("No sandbox left in the cluster")
+                        )
+                    self._pending.clear()
+                    continue
+                started = False
+                for task in list(self._pending):
+                    if task.future.cancelled():
+                        self._pending.remove(task)
+                        continue
+                    member = self._pick(task)
+                    if member is None:
+                        continue
+                    self._pending.remove(task)
+                    member.inflight += 1
+                    self._running += 1
+                    task.attempts += 1
+                    task.sandbox_id = member.id
+                    self._pool.submit(self._execute, task, member)
+                    started = True
+                if not started:
+                    self._condition.wait()
+
+    def _execute(self, task: _Task, member: _Member) -> None:
+        start_time = time.time()
+        try:
+            result = task.fn(member.sandbox)
+        except self.retry_on as e:
+            self._failed(task, member, e)
+            return
+        except BaseException as e:
+            self._finished(task, member, start_time)
+            self._resolve(task, error=e)
+            return
+        self._finished(task, member, start_time)
+        self._resolve(task, result=result)
+
+    def _finished(self, task: _Task, member: _Member, start_time: float) -> None:
+        duration = time.time() - start_time
+        with self._condition:
+            member.inflight -= 1
+            self._running -= 1
+            member.failures = 0
+            member.latency = (
+                duration
+                if member.latency is None
+                else (1 - _LATENCY_WEIGHT) * member.latency + _LATENCY_WEIGHT * duration
+            )
+            self._condition.notify_all()
+
+    def _failed(self, task: _Task, member: _Member, error: BaseException) -> None:
+        logger.debug(f"Task failed on sandbox {member.id}: {error}")
+        with self._condition:
+            member.inflight -= 1
+            self._running -= 1
+            member.failures += 1
+            task.excluded.add(member.id)
+            check = member.failures >= _SUSPECT_FAILURES and not member.checking
+            if check:
+                member.checking = True
+            retry = task.attempts < self.max_attempts
+            if retry:
+                # Retried first, ahead of the tasks not started yet
+                self._pending.insert(0, task)
+            self._condition.notify_all()
+        if not retry:
+            self._resolve(task, error=error)
+        if check:
+            self._pool.submit(self._check, member)
+
+    def _resolve(
+        self, task: _Task, result: Any = None, error: Optional[BaseException] = None
+    ) -> None:
+        if task.future.cancelled():
+            return
+        if error is not None:
+            task.future.set_exception(error)
+        else:
+            task.future.set_result(result)
+
+    def _check(self, member: _Member) -> None:
+        deadline = time.time() + self.health_timeout
+        alive = False
+        delay = 0.5
+        while time.time() < deadline:
+            try:
+                if member.sandbox._get_client().ping(timeout=5.0):
+                    alive = True
+                    break
+            except Exception:
+                pass
+            time.sleep(delay)
+            delay = min(delay * 2, 5.0)
+        with self._condition:
+            member.checking = False
+            if alive:
+                member.failures = 0
+                self._condition.notify_all()
+                return
+            logger.warning(f"Sandbox {member.id} stopped responding, removing it")
+            self._members.pop(member.id, None)
+            replace = self.factory is not None and not self._closed
+            if replace:
+                self._replacing += 1
+            self._condition.notify_all()
+        if self._owned:
+            _delete(member.sandbox)
+        if replace:
+            self._replace()
+
+    def _replace(self) -> None:
+        factory = self.factory
+        sandbox = None
+        if factory is not None:
+            try:
+                sandbox = factory()
+            except Exception as e:
+                logger.warning(f"Failed to replace sandbox: {e}")
+        with self._condition:
+            self._replacing -= 1
+            if sandbox is not None and not self._closed:
+                self._members[sandbox.service_id] = _Member(sandbox)
+            self._condition.notify_all()
+        if sandbox is not None and self._closed and self._owned:
+            _delete(sandbox)
+
+    def close(self, delete: Optional[bool] = None) -> None:
+        """
+        Stop the cluster once the submitted tasks are done.
+
+        Args:
+            delete: Delete the sandboxes (default: only if created by create())
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._dispatcher.join()
+        self._pool.shutdown(wait=True)
+        if delete if delete is not None else self._owned:
+            with ThreadPoolExecutor(max_workers=16) as pool:
+                list(pool.map(_delete, self.sandboxes))
+
+    def __enter__(self) -> "SandboxCluster":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+
+class AsyncSandboxCluster(SandboxCluster):
+    """
+    Cluster for async code.
+    Inherits from SandboxCluster; work still runs on synchronous handles.
+    """
+
+    @classmethod
+    async def create(  # type: ignore[override]
+        cls,
+        size: int,
+        concurrency: int = 4,
+        max_attempts: int = 3,
+        **kwargs: Any,
+    ) -> "AsyncSandboxCluster":
+        """
+        Create the sandboxes of a cluster in parallel, without blocking the event loop.
+
+        Args:
+            size: Number of sandboxes
+            concurrency: Maximum number of tasks in flight per sandbox
+            max_attempts: Maximum number of attempts per task
+            **kwargs: Arguments of Sandbox.create, also used for replacements
+
+        Returns:
+            AsyncSandboxCluster: Cluster deleting its sandboxes on close()
+        """
+        import asyncio
+
+        create = functools.partial(
+            super().create,
+            size,
+            concurrency=concurrency,
+            max_attempts=max_attempts,
+            **kwargs,
+        )
+        cluster = await asyncio.get_running_loop().run_in_executor(None, create)
+        return cast("AsyncSandboxCluster", cluster)
+
+    async def submit_async(self, fn: Callable[[Sandbox], Any]) -> Any:
+        """Run fn(sandbox) on a sandbox of the cluster and await its result."""
+        import asyncio
+
+        return await asyncio.wrap_future(self.submit(fn))
+
+    def map_async(
+        self,
+        command_template: str,
+        items: Iterable[Any],
+        timeout: float = 300.0,
+        cwd: Optional[str] = None,
+        env: Optional[Dict[str, str]] = None,
+    ) -> AsyncIterator[MapResult]:
+        """Run a command per item, yielding the results in completion order asynchronously."""
+        from koyeb.api.log_stream import iterate_in_thread
+
+        return iterate_in_thread(
+            lambda: self.map(
+                command_template, items, timeout=timeout, cwd=cwd, env=env
+            ),
+            lambda: None,
+        )
+
+    async def __aenter__(self) -> "AsyncSandboxCluster":
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        import asyncio
+
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+
+def _format_command(template: str, item: Any) -> str:
+    if isinstance(item, dict):
+        values = {key: shlex.quote(str(value)) for key, value in item.items()}
+        return template.format(**values)
+    quoted = shlex.quote(str(item))
+    return template.format(quoted, item=quoted)
+
+
+def _run_command(
+    sandbox: Sandbox,
+    command: str,
+    timeout: float,
+    cwd: Optional[str],
+    env: Optional[Dict[str, str]],
+) -> CommandResult:
+    # Unlike exec(), transport errors are raised so the command is retried
+    start_time = time.time()
+    response = sandbox._get_client().run(cmd=command, cwd=cwd, env=env, timeout=timeout)
+    exit_code = response.get("exit_code", 0)
+    return CommandResult(
+        stdout=response.get("stdout", ""),
+        stderr=response.get("stderr", ""),
+        exit_code=exit_code,
+        status=CommandStatus.FINISHED if exit_code == 0 else CommandStatus.FAILED,
+        duration=time.time() - start_time,
+        command=command,
+    )
+
+
+def _delete(sandbox: Sandbox) -> None:
+    from .sandbox import Sandbox
+
+    try:
+        Sandbox.delete(sandbox)
+    except Exception as e:
+        logger.warning(f"Failed to delete sandbox {sandbox.service_id}: {e}")
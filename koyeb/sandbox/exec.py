@@ -14,6 +14,7 @@ from enum import Enum
 from typing import TYPE_CHECKING, Any, AsyncIterator, Callable, Dict, List, Optional
 
 from .executor_client import SandboxClient
+from .stdin import StdinSource, wrap_stdin
 from .utils import SandboxError, create_sandbox_client
 
 if TYPE_CHECKING:
@@ -76,7 +77,11 @@ class SandboxExecutor:
         if self._client is None:
             sandbox_url = self.sandbox._get_sandbox_url()
             self._client = create_sandbox_client(
-                sandbox_url, self.sandbox.sandbox_secret
+                sandbox_url,
+                self.sandbox.sandbox_secret,
+                rate_limiter=self.sandbox.rate_limiter,
+                resolve_url=self.sandbox._resolve_url,
+                on_request=self.sandbox._record_use,
             )
         return self._client
 
@@ -88,6 +93,7 @@ class SandboxExecutor:
         timeout: int = 30,
         on_stdout: Optional[Callable[[str], None]] = None,
         on_stderr: Optional[Callable[[str], None]] = None,
+        stdin: Optional[StdinSource] = None,
     ) -> CommandResult:
         """
         Execute a command in a shell synchronously. Supports streaming output via callbacks.
@@ -99,6 +105,9 @@ class SandboxExecutor:
             timeout: Command timeout in seconds (enforced for HTTP requests)
             on_stdout: Optional callback for streaming stdout chunks
             on_stderr: Optional callback for streaming stderr chunks
+            stdin: Data for the command's stdin: bytes, str, a file object or an
+                iterator of chunks. Data and seekable files are uploaded with the
+                command, other sources are streamed while the command runs
 
         Returns:
             CommandResult: Result of the command execution
@@ -114,8 +123,46 @@ class SandboxExecutor:
                 on_stdout=lambda data: print(f"OUT: {data}"),
                 on_stderr=lambda data: print(f"ERR: {data}"),
             )
+
+            # Piping a large input file
+            with open("input.txt", "rb") as f:
+                result = sandbox.exec("sort | uniq -c", stdin=f)
             ```
         """
+        if stdin is None:
+            return self._execute(command, cwd, env, timeout, on_stdout, on_stderr)
+        try:
+            wrapped, writer = wrap_stdin(self.sandbox, command, stdin)
+        except SandboxError as e:
+            return CommandResult(
+                stderr=f"Command execution failed: {str(e)}",
+                exit_code=1,
+                status=CommandStatus.FAILED,
+                command=command,
+            )
+        if writer is None:
+            result = self._execute(wrapped, cwd, env, timeout, on_stdout, on_stderr)
+        else:
+            writer.start(stdin)
+            try:
+                result = self._execute(wrapped, cwd, env, timeout, on_stdout, on_stderr)
+            finally:
+                writer.stop()
+            if not result.success or not writer.closed:
+                # The feeder may not have started, or stopped before EOF
+                writer.discard()
+        result.command = command
+        return result
+
+    def _execute(
+        self,
+        command: str,
+        cwd: Optional[str],
+        env: Optional[Dict[str, str]],
+        timeout: int,
+        on_stdout: Optional[Callable[[str], None]],
+        on_stderr: Optional[Callable[[str], None]],
+    ) -> CommandResult:
         start_time = time.time()
 
         # Use streaming if callbacks are provided
@@ -222,6 +269,7 @@ class AsyncSandboxExecutor(SandboxExecutor):
         timeout: int = 30,
         on_stdout: Optional[Callable[[str], None]] = None,
         on_stderr: Optional[Callable[[str], None]] = None,
+        stdin: Optional[StdinSource] = None,
     ) -> CommandResult:
         """
         Execute a command in a shell asynchronously. Supports streaming output via callbacks.
@@ -233,6 +281,9 @@ class AsyncSandboxExecutor(SandboxExecutor):
             timeout: Command timeout in seconds (enforced for HTTP requests)
             on_stdout: Optional callback for streaming stdout chunks
             on_stderr: Optional callback for streaming stderr chunks
+            stdin: Data for the command's stdin: bytes, str, a file object or an
+                (async) iterator of chunks. Data and seekable files are uploaded
+                with the command, other sources are streamed while it runs
 
         Returns:
             CommandResult: Result of the command execution
@@ -250,6 +301,47 @@ class AsyncSandboxExecutor(SandboxExecutor):
             )
             ```
         """
+        if stdin is None:
+            return await self._execute(command, cwd, env, timeout, on_stdout, on_stderr)
+        loop = asyncio.get_running_loop()
+        try:
+            wrapped, writer = await loop.run_in_executor(
+                None, wrap_stdin, self.sandbox, command, stdin
+            )
+        except SandboxError as e:
+            return CommandResult(
+                stderr=f"Command execution failed: {str(e)}",
+                exit_code=1,
+                status=CommandStatus.FAILED,
+                command=command,
+            )
+        if writer is None:
+            result = await self._execute(
+                wrapped, cwd, env, timeout, on_stdout, on_stderr
+            )
+        else:
+            writer.feed_in_background(stdin)
+            try:
+                result = await self._execute(
+                    wrapped, cwd, env, timeout, on_stdout, on_stderr
+                )
+            finally:
+                writer.stop()
+            if not result.success or not writer.closed:
+                # The feeder may not have started, or stopped before EOF
+                await loop.run_in_executor(None, writer.discard)
+        result.command = command
+        return result
+
+    async def _execute(  # type: ignore[override]
+        self,
+        command: str,
+        cwd: Optional[str],
+        env: Optional[Dict[str, str]],
+        timeout: int,
+        on_stdout: Optional[Callable[[str], None]],
+        on_stderr: Optional[Callable[[str], None]],
+    ) -> CommandResult:
         start_time = time.time()
 
         # Use streaming if callbacks are provided
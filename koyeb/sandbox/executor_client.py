@@ -7,10 +7,17 @@ A simple Python client for interacting with the Sandbox Executor API.
 import json
 import logging
 import time
-from typing import Any, Dict, Iterator, Optional
+from typing import Any, Callable, Dict, Iterator, Optional
 
 import requests
 
+from koyeb.api.rate_limit import (
+    IDEMPOTENT_METHODS,
+    RateLimiter,
+    compute_backoff,
+    parse_retry_after,
+)
+
 from .utils import DEFAULT_HTTP_TIMEOUT
 
 logger = logging.getLogger(__name__)
@@ -20,7 +27,13 @@ class SandboxClient:
     """Client for the Sandbox Executor API."""
 
     def __init__(
-        self, base_url: str, secret: str, timeout: float = DEFAULT_HTTP_TIMEOUT
+        self,
+        base_url: str,
+        secret: str,
+        timeout: float = DEFAULT_HTTP_TIMEOUT,
+        rate_limiter: Optional[RateLimiter] = None,
+        resolve_url: Optional[Callable[[], Optional[str]]] = None,
+        on_request: Optional[Callable[[float], None]] = None,
     ):
         """
         Initialize the Sandbox Client.
@@ -29,10 +42,20 @@ class SandboxClient:
             base_url: The base URL of the sandbox server (e.g., 'http://localhost:8080')
             secret: The authentication secret/token
             timeout: Request timeout in seconds (default: 30)
+            rate_limiter: Optional RateLimiter shared with other clients to throttle
+                requests per sandbox host and secret, and to drive retry backoff
+            resolve_url: Optional callable looking up the base URL again. It is
+                called once per request that fails to connect or gets a 404 from
+                outside the executor, and the request is retried on the new URL
+            on_request: Optional callable given the time of each response, e.g.
+                to record the last use of the sandbox across its clients
         """
         self.base_url = base_url.rstrip("/")
         self.secret = secret
         self.timeout = timeout
+        self.rate_limiter = rate_limiter
+        self.resolve_url = resolve_url
+        self.on_request = on_request
         self.headers = {
             "Authorization": f"Bearer {secret}",
             "Content-Type": "application/json",
@@ -41,6 +64,13 @@ class SandboxClient:
         self._session = requests.Session()
         self._session.headers.update(self.headers)
         self._closed = False
+        # Time of the last response, which resets the sandbox's idle timer
+        self.last_request_at = 0.0
+
+    def _record_request(self) -> None:
+        self.last_request_at = time.time()
+        if self.on_request is not None:
+            self.on_request(self.last_request_at)
 
     def close(self) -> None:
         """Close the HTTP session and release resources."""
@@ -61,6 +91,29 @@ class SandboxClient:
         if not self._closed:
             self.close()
 
+    def _relocate(self, url: str) -> Optional[str]:
+        """Look up the base URL again, and return url on the new one if it moved."""
+        if self.resolve_url is None or not url.startswith(self.base_url):
+            return None
+        try:
+            base_url = self.resolve_url()
+        except Exception as e:
+            logger.debug(f"Could not look up the sandbox URL again: {e}")
+            return None
+        if not base_url or base_url.rstrip("/") == self.base_url:
+            return None
+        suffix = url[len(self.base_url) :]
+        self.base_url = base_url.rstrip("/")
+        logger.debug(f"Sandbox moved, retrying on {self.base_url}")
+        return self.base_url + suffix
+
+    @staticmethod
+    def _is_stale(response: requests.Response) -> bool:
+        """Check for a 404 from the edge rather than the executor (unknown domain)."""
+        return response.status_code == 404 and "json" not in response.headers.get(
+            "Content-Type", ""
+        )
+
     def _request_with_retry(
         self,
         method: str,
@@ -70,7 +123,14 @@ class SandboxClient:
         **kwargs,
     ) -> requests.Response:
         """
-        Make an HTTP request with retry logic for 503 errors.
+        Make an HTTP request with retry logic for throttled or unavailable servers.
+
+        503 (sandbox waking up) and 429 (throttled) responses are retried for every
+        method; 502 and 504 only for idempotent methods. Retries use jittered
+        exponential backoff and honor the Retry-After header. When a rate limiter is
+        configured, each attempt first waits for a token and the limiter's backoff
+        settings take precedence. Connection errors and 404s from the edge are
+        retried once on the URL returned by resolve_url, if it changed.
 
         Args:
             method: HTTP method (e.g., 'GET', 'POST')
@@ -85,54 +145,76 @@ class SandboxClient:
         Raises:
             requests.HTTPError: If the request fails after all retries
         """
-        backoff = initial_backoff
-        last_exception = None
-
         # Set default timeout if not provided
         if "timeout" not in kwargs:
             kwargs["timeout"] = self.timeout
 
-        for attempt in range(max_retries + 1):
+        limiter = self.rate_limiter
+        if limiter is not None:
+            max_retries = limiter.max_retries
+
+        attempt = 0
+        relocated = False
+        while True:
             try:
+                if limiter is not None:
+                    limiter.acquire(url, self.secret)
                 # Use session for connection pooling
                 response = self._session.request(method, url, **kwargs)
-
-                # If we get a 503, retry with backoff
-                if response.status_code == 503 and attempt < max_retries:
-                    logger.debug(
-                        f"Received 503 error, retrying... (attempt {attempt + 1}/{max_retries + 1})"
-                    )
-                    time.sleep(backoff)
-                    backoff *= 2  # Exponential backoff
-                    continue
-
-                response.raise_for_status()
-                return response
-
-            except requests.HTTPError as e:
-                if (
-                    e.response
-                    and e.response.status_code == 503
-                    and attempt < max_retries
-                ):
-                    logger.debug(
-                        f"Received 503 error, retrying... (attempt {attempt + 1}/{max_retries + 1})"
-                    )
-                    time.sleep(backoff)
-                    backoff *= 2
-                    last_exception = e
-                    continue
-                raise
             except requests.Timeout as e:
-                logger.warning(f"Request timeout after {self.timeout}s: {e}")
+                logger.warning(f"Request timeout after {kwargs['timeout']}s: {e}")
                 raise
+            except requests.ConnectionError as e:
+                new_url = None if relocated else self._relocate(url)
+                if new_url is None:
+                    logger.warning(f"Request failed: {e}")
+                    raise
+                url, relocated = new_url, True
+                continue
             except requests.RequestException as e:
                 logger.warning(f"Request failed: {e}")
                 raise
 
-        # If we exhausted all retries, raise the last exception
-        if last_exception:
-            raise last_exception
+            if not relocated and self._is_stale(response):
+                new_url = self._relocate(url)
+                if new_url is not None:
+                    response.close()
+                    url, relocated = new_url, True
+                    continue
+
+            status = response.status_code
+            self._record_request()
+            if limiter is not None:
+                limiter.observe(url, self.secret, status, response.headers)
+
+            if attempt < max_retries and self._is_retryable(method, status):
+                if limiter is not None:
+                    delay = limiter.retry_delay(attempt, response.headers)
+                    limiter.record_backoff(delay)
+                else:
+                    delay = compute_backoff(
+                        attempt,
+                        initial_backoff,
+                        initial_backoff * 2**max_retries,
+                        parse_retry_after(response.headers),
+                    )
+                logger.debug(
+                    f"Received {status} error, retrying in {delay:.2f}s... "
+                    f"(attempt {attempt + 1}/{max_retries + 1})"
+                )
+                response.close()
+                time.sleep(delay)
+                attempt += 1
+                continue
+
+            response.raise_for_status()
+            return response
+
+    def _is_retryable(self, method: str, status: int) -> bool:
+        """Check whether a response status should be retried for this method."""
+        if status in (429, 503):
+            return True
+        return status in (502, 504) and method.upper() in IDEMPOTENT_METHODS
 
     def health(self) -> Dict[str, str]:
         """
@@ -149,6 +231,30 @@ class SandboxClient:
         )
         return response.json()
 
+    def ping(self, timeout: float = 2.0) -> bool:
+        """
+        Check once whether the server is ready, without retrying.
+
+        Unlike health(), a sleeping sandbox's 503 is not retried with backoff,
+        so callers can poll at their own pace. The request still wakes the
+        sandbox up.
+
+        Args:
+            timeout: Request timeout in seconds
+
+        Returns:
+            bool: True if the server answered the health check
+        """
+        url = f"{self.base_url}/health"
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(url, self.secret)
+        try:
+            response = self._session.get(url, timeout=timeout)
+        except requests.RequestException:
+            return False
+        with response:
+            return response.status_code == 200
+
     def run(
         self,
         cmd: str,
@@ -230,13 +336,30 @@ class SandboxClient:
         if env is not None:
             payload["env"] = env
 
-        response = self._session.post(
-            f"{self.base_url}/run_streaming",
-            json=payload,
-            headers=self.headers,
-            stream=True,
-            timeout=timeout if timeout is not None else self.timeout,
-        )
+        url = f"{self.base_url}/run_streaming"
+        for last_try in (False, True):
+            try:
+                response = self._session.post(
+                    url,
+                    json=payload,
+                    headers=self.headers,
+                    stream=True,
+                    timeout=timeout if timeout is not None else self.timeout,
+                )
+            except requests.ConnectionError:
+                new_url = None if last_try else self._relocate(url)
+                if new_url is None:
+                    raise
+                url = new_url
+                continue
+            if not last_try and self._is_stale(response):
+                new_url = self._relocate(url)
+                if new_url is not None:
+                    response.close()
+                    url = new_url
+                    continue
+            break
+        self._record_request()
         response.raise_for_status()
 
         # Parse Server-Sent Events stream
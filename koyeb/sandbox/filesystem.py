@@ -64,7 +64,11 @@ class SandboxFilesystem:
         if self._client is None:
             sandbox_url = self.sandbox._get_sandbox_url()
             self._client = create_sandbox_client(
-                sandbox_url, self.sandbox.sandbox_secret
+                sandbox_url,
+                self.sandbox.sandbox_secret,
+                rate_limiter=self.sandbox.rate_limiter,
+                resolve_url=self.sandbox._resolve_url,
+                on_request=self.sandbox._record_use,
             )
         return self._client
 
@@ -0,0 +1,331 @@
+# coding: utf-8
+
+"""
+Local TCP port forwarding to Koyeb Sandbox instances
+"""
+
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+import errno
+import os
+import socket
+import threading
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Optional, Set, Tuple
+
+from .utils import SandboxError, logger, validate_port
+
+if TYPE_CHECKING:
+    from .sandbox import Sandbox
+
+_CHUNK = 64 * 1024  # Default pipe capacity on Linux
+_SPLICE = hasattr(os, "splice")
+
+
+@dataclass
+class ForwardStats:
+    """Counters of a port forward."""
+
+    connections: int = 0  # Accepted connections
+    active: int = 0  # Connections currently open
+    failed: int = 0  # Connections closed on an error
+    bytes_sent: int = 0  # From the local clients to the sandbox
+    bytes_received: int = 0  # From the sandbox to the local clients
+    rebinds: int = 0  # Times the remote port was bound again
+
+
+async def _wait_fd(loop: asyncio.AbstractEventLoop, fd: int, write: bool) -> None:
+    future = loop.create_future()
+
+    def ready() -> None:
+        if not future.done():
+            future.set_result(None)
+
+    if write:
+        loop.add_writer(fd, ready)
+    else:
+        loop.add_reader(fd, ready)
+    try:
+        await future
+    finally:
+        if write:
+            loop.remove_writer(fd)
+        else:
+            loop.remove_reader(fd)
+
+
+class PortForward:
+    """
+    Relays local TCP connections to a port of a sandbox through its TCP proxy.
+
+    The remote port is bound to the TCP proxy of the sandbox, which must be
+    created with enable_tcp_proxy=True. Connections are accepted on a local
+    port and relayed by an asyncio event loop running in a background
+    thread; on Linux the data is moved between the sockets with splice(2),
+    without being copied into Python.
+
+    The remote port is bound again when another port was exposed through
+    the same sandbox handle, and the proxy endpoint is looked up again when
+    connecting to it fails.
+
+    Example:
+        >>> with sandbox.forward(5432) as fwd:
+        ...     conn = psycopg.connect(host="127.0.0.1", port=fwd.local_port)
+        >>> fwd.stats().bytes_received
+        18734
+    """
+
+    def __init__(
+        self,
+        sandbox: Sandbox,
+        remote_port: int,
+        local_port: int = 0,
+        host: str = "127.0.0.1",
+        connect_timeout: float = 10.0,
+    ) -> None:
+        """
+        Args:
+            sandbox: Sandbox to forward to
+            remote_port: Port inside the sandbox
+            local_port: Local port to listen on (0: any free port)
+            host: Local address to listen on
+            connect_timeout: Timeout in seconds of each connection to the proxy
+
+        Raises:
+            SandboxError: If the TCP proxy is unavailable or the port cannot be bound
+            OSError: If the local port cannot be listened on
+        """
+        validate_port(remote_port)
+        self.sandbox = sandbox
+        self.remote_port = remote_port
+        self.connect_timeout = connect_timeout
+        self._stats = ForwardStats()
+        self._endpoint = self._bind(remote_port)
+        self._listener = socket.create_server((host, local_port))
+        self._listener.setblocking(False)
+        self._loop = asyncio.new_event_loop()
+        # Created in the loop thread, see _ensure_bound()
+        self._rebind_lock: Optional[asyncio.Lock] = None
+        self._tasks: Set[asyncio.Task[None]] = set()
+        self._started = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._run, name=f"koyeb-forward-{remote_port}", daemon=True
+        )
+        self._thread.start()
+        self._started.wait()
+
+    @property
+    def local_address(self) -> Tuple[str, int]:
+        """Local (host, port) the forward listens on."""
+        return self._listener.getsockname()[:2]
+
+    @property
+    def local_port(self) -> int:
+        """Local port the forward listens on."""
+        return self.local_address[1]
+
+    def stats(self) -> ForwardStats:
+        """Get a snapshot of the byte and connection counters."""
+        return dataclasses.replace(self._stats)
+
+    def _bind(self, port: int) -> Tuple[str, int]:
+        self.sandbox._bind_port(port)
+        endpoint = self.sandbox.get_tcp_proxy_info()
+        if endpoint is None:
+            raise SandboxError(
+                "TCP proxy not available, create the sandbox with enable_tcp_proxy=True"
+            )
+        return endpoint
+
+    def _refresh_endpoint(self) -> Tuple[str, int]:
+        self.sandbox.route.tcp_proxy_host = None
+        self.sandbox.route.tcp_proxy_port = None
+        endpoint = self.sandbox.get_tcp_proxy_info()
+        if endpoint is None:
+            raise SandboxError("TCP proxy not available")
+        self._endpoint = endpoint
+        return endpoint
+
+    def rebind(self, remote_port: Optional[int] = None) -> None:
+        """
+        Bind the remote port to the TCP proxy again, or switch to another one.
+
+        Open connections are kept; new connections go to the bound port.
+
+        Args:
+            remote_port: New port inside the sandbox (None: the current one)
+        """
+        port = self.remote_port if remote_port is None else remote_port
+        validate_port(port)
+        self._endpoint = self._bind(port)
+        self.remote_port = port
+        self._stats.rebinds += 1
+
+    def _run(self) -> None:
+        asyncio.set_event_loop(self._loop)
+        self._accept_task = self._loop.create_task(self._accept())
+        self._loop.call_soon(self._started.set)
+        self._loop.run_forever()
+
+    async def _accept(self) -> None:
+        while True:
+            conn, _ = await self._loop.sock_accept(self._listener)
+            task = self._loop.create_task(self._handle(conn))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _ensure_bound(self) -> None:
+        if self._rebind_lock is None:
+            self._rebind_lock = asyncio.Lock()
+        async with self._rebind_lock:
+            if self.sandbox._exposed_port != self.remote_port:
+                logger.debug(
+                    f"Port {self.sandbox._exposed_port} was exposed, "
+                    f"binding port {self.remote_port} again"
+                )
+                await self._loop.run_in_executor(None, self.rebind)
+
+    async def _open(self, endpoint: Tuple[str, int]) -> socket.socket:
+        infos = await self._loop.getaddrinfo(*endpoint, type=socket.SOCK_STREAM)
+        error: Optional[OSError] = None
+        for family, type_, proto, _, address in infos:
+            sock = socket.socket(family, type_, proto)
+            sock.setblocking(False)
+            try:
+                await asyncio.wait_for(
+                    self._loop.sock_connect(sock, address), self.connect_timeout
+                )
+                return sock
+            except (OSError, asyncio.TimeoutError) as e:
+                sock.close()
+                error = (
+                    e if isinstance(e, OSError) else OSError(errno.ETIMEDOUT, str(e))
+                )
+        raise error or OSError(f"Could not resolve {endpoint[0]}")
+
+    async def _connect(self) -> socket.socket:
+        await self._ensure_bound()
+        try:
+            return await self._open(self._endpoint)
+        except OSError as e:
+            # The proxy endpoint may have moved, e.g. after a redeployment
+            logger.debug(f"Connecting to {self._endpoint} failed, looking it up: {e}")
+            endpoint = await self._loop.run_in_executor(None, self._refresh_endpoint)
+            return await self._open(endpoint)
+
+    async def _handle(self, conn: socket.socket) -> None:
+        self._stats.connections += 1
+        self._stats.active += 1
+        remote = None
+        try:
+            remote = await self._connect()
+            for sock in (conn, remote):
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            pumps = [
+                self._loop.create_task(self._pump(conn, remote, "bytes_sent")),
+                self._loop.create_task(self._pump(remote, conn, "bytes_received")),
+            ]
+            try:
+                await asyncio.wait(pumps, return_when=asyncio.FIRST_EXCEPTION)
+            finally:
+                for pump in pumps:
+                    pump.cancel()
+                results = await asyncio.gather(*pumps, return_exceptions=True)
+            for result in results:
+                if isinstance(result, Exception):
+                    raise result
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._stats.failed += 1
+            logger.debug(f"Forwarded connection to port {self.remote_port} failed: {e}")
+        finally:
+            self._stats.active -= 1
+            conn.close()
+            if remote is not None:
+                remote.close()
+
+    async def _pump(self, src: socket.socket, dst: socket.socket, counter: str) -> None:
+        if _SPLICE:
+            try:
+                await self._splice(src, dst, counter)
+            except OSError as e:
+                # Not spliceable, e.g. unsupported socket type: copy instead
+                if e.errno not in (errno.EINVAL, errno.ENOSYS):
+                    raise
+                await self._copy(src, dst, counter)
+        else:
+            await self._copy(src, dst, counter)
+        try:
+            dst.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass
+
+    async def _splice(
+        self, src: socket.socket, dst: socket.socket, counter: str
+    ) -> None:
+        flags = os.SPLICE_F_MOVE | os.SPLICE_F_NONBLOCK
+        read_end, write_end = os.pipe()
+        try:
+            while True:
+                try:
+                    n = os.splice(src.fileno(), write_end, _CHUNK, flags=flags)
+                except BlockingIOError:
+                    await _wait_fd(self._loop, src.fileno(), write=False)
+                    continue
+                if n == 0:
+                    return
+                pending = n
+                while pending:
+                    try:
+                        pending -= os.splice(
+                            read_end, dst.fileno(), pending, flags=flags
+                        )
+                    except BlockingIOError:
+                        await _wait_fd(self._loop, dst.fileno(), write=True)
+                setattr(self._stats, counter, getattr(self._stats, counter) + n)
+        finally:
+            os.close(read_end)
+            os.close(write_end)
+
+    async def _copy(self, src: socket.socket, dst: socket.socket, counter: str) -> None:
+        buffer = bytearray(_CHUNK)
+        view = memoryview(buffer)
+        while True:
+            n = await self._loop.sock_recv_into(src, buffer)
+            if n == 0:
+                return
+            await self._loop.sock_sendall(dst, view[:n])
+            setattr(self._stats, counter, getattr(self._stats, counter) + n)
+
+    async def _shutdown(self) -> None:
+        self._accept_task.cancel()
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(self._accept_task, *self._tasks, return_exceptions=True)
+
+    def close(self) -> None:
+        """Stop listening and close the open connections."""
+        if self._closed:
+            return
+        self._closed = True
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._listener.close()
+
+    def __enter__(self) -> "PortForward":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    async def __aenter__(self) -> "PortForward":
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
@@ -0,0 +1,607 @@
+# coding: utf-8
+
+"""
+Persistent interpreter sessions for Koyeb Sandbox instances
+"""
+
+from __future__ import annotations
+
+import base64
+import json
+import secrets
+import shlex
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional
+
+from .utils import (
+    SandboxError,
+    SandboxTimeoutError,
+    async_wrapper,
+    logger,
+    run_sync_in_executor,
+)
+
+if TYPE_CHECKING:
+    from .sandbox import Sandbox
+
+# Kernel started once per session. It serves requests on a unix socket: an
+# "execute" request runs a cell in the main thread against a shared
+# namespace and streams JSON frames back, with a heartbeat every second so
+# silent cells are told apart from a lost connection; an "interrupt" request
+# raises KeyboardInterrupt in the running cell.
+_PYTHON_KERNEL = r"""
+import ast, base64, io, json, os, queue, signal, socket, sys, threading, traceback
+
+path = sys.argv[1]
+try:
+    os.unlink(path)
+except FileNotFoundError:
+    pass
+server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+server.bind(path)
+os.chmod(path, 0o600)
+server.listen(16)
+requests = queue.Queue()
+signal.signal(signal.SIGINT, signal.default_int_handler)
+namespace = {"__name__": "__main__"}
+busy = threading.Event()
+
+
+class Channel:
+    def __init__(self, conn):
+        self.conn = conn
+        self.lock = threading.Lock()
+
+    def send(self, frame):
+        data = (json.dumps(frame) + "\n").encode()
+        with self.lock:
+            try:
+                self.conn.sendall(data)
+            except OSError:
+                pass
+
+
+class Stream(io.TextIOBase):
+    def __init__(self, channel, name):
+        self.channel = channel
+        self.name = name
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        if text:
+            self.channel.send({"type": "stream", "name": self.name, "text": text})
+        return len(text)
+
+
+def bundle(value):
+    data = {"text/plain": repr(value)}
+    for method, mime, binary in (
+        ("_repr_html_", "text/html", False),
+        ("_repr_markdown_", "text/markdown", False),
+        ("_repr_svg_", "image/svg+xml", False),
+        ("_repr_png_", "image/png", True),
+        ("_repr_jpeg_", "image/jpeg", True),
+        ("_repr_json_", "application/json", False),
+    ):
+        try:
+            rendered = getattr(value, method)() if hasattr(value, method) else None
+        except Exception:
+            rendered = None
+        if rendered is None:
+            continue
+        if binary and isinstance(rendered, bytes):
+            rendered = base64.b64encode(rendered).decode()
+        elif not isinstance(rendered, str):
+            rendered = json.dumps(rendered, default=str)
+        data[mime] = rendered
+    return data
+
+
+def heartbeat(channel, stop):
+    while not stop.wait(1):
+        channel.send({"type": "heartbeat"})
+
+
+def execute(channel, code):
+    stdout, stderr = sys.stdout, sys.stderr
+    sys.stdout, sys.stderr = Stream(channel, "stdout"), Stream(channel, "stderr")
+    status = "ok"
+    stop = threading.Event()
+    threading.Thread(target=heartbeat, args=(channel, stop), daemon=True).start()
+    busy.set()
+    try:
+        tree = ast.parse(code, "<cell>", "exec")
+        last = None
+        if tree.body and isinstance(tree.body[-1], ast.Expr):
+            last = ast.Expression(tree.body.pop().value)
+        exec(compile(tree, "<cell>", "exec"), namespace)
+        if last is not None:
+            value = eval(compile(last, "<cell>", "eval"), namespace)
+            if value is not None:
+                namespace["_"] = value
+                channel.send({"type": "result", "data": bundle(value)})
+    except BaseException as e:
+        status = "error"
+        channel.send({
+            "type": "error",
+            "ename": type(e).__name__,
+            "evalue": str(e),
+            "traceback": traceback.format_exception(type(e), e, e.__traceback__),
+        })
+    finally:
+        busy.clear()
+        stop.set()
+        sys.stdout.flush()
+        sys.stdout, sys.stderr = stdout, stderr
+    channel.send({"type": "done", "status": status})
+
+
+def accept():
+    while True:
+        conn, _ = server.accept()
+        line = conn.makefile("rb").readline()
+        try:
+            request = json.loads(line)
+        except ValueError:
+            conn.close()
+            continue
+        op = request.get("op")
+        if op == "interrupt":
+            if busy.is_set():
+                os.kill(os.getpid(), signal.SIGINT)
+            conn.sendall(b'{"type": "done", "status": "ok"}\n')
+            conn.close()
+        elif op == "ping":
+            conn.sendall(b'{"type": "done", "status": "ok"}\n')
+            conn.close()
+        else:
+            requests.put((conn, request))
+
+
+threading.Thread(target=accept, daemon=True).start()
+while True:
+    try:
+        conn, request = requests.get()
+    except KeyboardInterrupt:
+        continue
+    channel = Channel(conn)
+    try:
+        execute(channel, request.get("code", ""))
+    except KeyboardInterrupt:
+        channel.send({"type": "done", "status": "error"})
+    finally:
+        conn.close()
+"""
+
+# Relay run through /run_streaming for each request: forwards one request to
+# the kernel socket and copies the reply frames to stdout as they arrive.
+_RELAY = (
+    "import socket,sys,base64;"
+    "s=socket.socket(socket.AF_UNIX);s.connect(sys.argv[1]);"
+    "s.sendall(base64.b64decode(sys.argv[2])+b'\\n');f=s.makefile('rb');"
+    "[(sys.stdout.buffer.write(l),sys.stdout.flush()) for l in f]"
+)
+
+SUPPORTED_LANGUAGES = ("python",)
+
+# Seconds without any frame (heartbeats included) after which the kernel is
+# considered unreachable
+_READ_TIMEOUT = 30.0
+
+
+@dataclass
+class CellError:
+    """Exception raised by a cell."""
+
+    name: str
+    value: str
+    traceback: List[str] = field(default_factory=list)
+
+    def __str__(self) -> str:
+        return f"{self.name}: {self.value}"
+
+
+@dataclass
+class CellResult:
+    """Result of a cell run in an interpreter session."""
+
+    stdout: str = ""
+    stderr: str = ""
+    # MIME bundles of the displayed values, e.g. {"text/plain": "42"}
+    results: List[Dict[str, str]] = field(default_factory=list)
+    error: Optional[CellError] = None
+    duration: float = 0.0
+
+    @property
+    def success(self) -> bool:
+        """Check if the cell ran without raising"""
+        return self.error is None
+
+    @property
+    def text(self) -> Optional[str]:
+        """Get the plain text representation of the cell's value"""
+        if not self.results:
+            return None
+        return self.results[-1].get("text/plain")
+
+
+class KernelSession:
+    """
+    Long-lived helper process inside a sandbox, reached over a unix socket.
+
+    The kernel is started with the executor's background processes API and
+    kept alive between requests. As the executor has no stdin channel for
+    background processes, each request is sent through a lightweight relay
+    run with /run_streaming, which also streams the kernel's replies back.
+    """
+
+    #: Source of the kernel, started as ``python <file> <socket> <args...>``
+    kernel_source = ""
+    #: Name used in temporary file names and error messages
+    kind = "kernel"
+
+    def __init__(
+        self,
+        sandbox: Sandbox,
+        python: str = "python3",
+        cwd: Optional[str] = None,
+        env: Optional[Dict[str, str]] = None,
+        startup_timeout: float = 30.0,
+    ) -> None:
+        self.sandbox = sandbox
+        self.python = python
+        self.cwd = cwd
+        self.env = env
+        self.startup_timeout = startup_timeout
+        self.process_id: Optional[str] = None
+        token = secrets.token_hex(8)
+        self._socket_path = f"/tmp/koyeb-{self.kind}-{token}.sock"
+        self._kernel_path = f"/tmp/koyeb-{self.kind}-{token}.py"
+
+    def _kernel_args(self) -> List[str]:
+        return []
+
+    def start(self) -> "KernelSession":
+        """
+        Start the kernel process if it is not running.
+
+        Returns:
+            self
+
+        Raises:
+            SandboxError: If the kernel does not start
+            SandboxTimeoutError: If it is not ready within startup_timeout
+        """
+        self._start()
+        return self
+
+    def _start(self) -> None:
+        if self.process_id is not None:
+            return
+        client = self.sandbox._get_client()
+        command = " ".join(
+            shlex.quote(arg)
+            for arg in [
+                self.python,
+                "-u",
+                self._kernel_path,
+                self._socket_path,
+                *self._kernel_args(),
+            ]
+        )
+        try:
+            response = client.write_file(self._kernel_path, self.kernel_source)
+            if response.get("error"):
+                raise SandboxError(response["error"])
+            response = client.start_process(command, self.cwd, self.env)
+        except Exception as e:
+            raise SandboxError(f"Failed to start {self.kind}: {str(e)}") from e
+        self.process_id = response.get("id")
+        if not self.process_id:
+            error_msg = response.get("error", response.get("message", "Unknown error"))
+            raise SandboxError(f"Failed to start {self.kind}: {error_msg}")
+
+        deadline = time.time() + self.startup_timeout
+        while True:
+            try:
+                for _ in self._request({"op": "ping"}, timeout=10):
+                    pass
+                return
+            except SandboxError as e:
+                if time.time() >= deadline:
+                    self._close()
+                    raise SandboxTimeoutError(
+                        f"{self.kind.capitalize()} did not start within "
+                        f"{self.startup_timeout} seconds: {e}"
+                    ) from e
+                time.sleep(0.2)
+
+    def interrupt(self) -> None:
+        """
+        Interrupt the running request.
+
+        Raises:
+            SandboxError: If the kernel cannot be reached
+        """
+        self._interrupt()
+
+    def _interrupt(self) -> None:
+        if self.process_id is None:
+            return
+        for _ in self._request({"op": "interrupt"}, timeout=10):
+            pass
+
+    def restart(self) -> None:
+        """Restart the kernel, discarding its state."""
+        self._close()
+        self._start()
+
+    def close(self) -> None:
+        """Stop the kernel process."""
+        self._close()
+
+    def _close(self) -> None:
+        if self.process_id is None:
+            return
+        process_id, self.process_id = self.process_id, None
+        client = self.sandbox._get_client()
+        try:
+            client.kill_process(process_id)
+            client.run(
+                f"rm -f {shlex.quote(self._socket_path)} {shlex.quote(self._kernel_path)}"
+            )
+        except Exception as e:
+            logger.debug(f"Could not clean up {self.kind} process {process_id}: {e}")
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def _execute(
+        self, request: Dict[str, Any], timeout: Optional[float]
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Send a request that runs user code and yield its reply frames.
+
+        Heartbeats are filtered out. When timeout passes before the "done"
+        frame, the request is interrupted and SandboxTimeoutError is raised.
+        """
+        self._start()
+        start_time = time.time()
+        done = False
+        try:
+            for frame in self._request(request, _READ_TIMEOUT):
+                if frame.get("type") == "done":
+                    done = True
+                if frame.get("type") != "heartbeat":
+                    yield frame
+                if timeout is not None and time.time() - start_time > timeout:
+                    break
+        except SandboxError:
+            if timeout is None or time.time() - start_time < timeout:
+                raise
+        if not done:
+            if timeout is None or time.time() - start_time < timeout:
+                raise SandboxError(
+                    f"{self.kind.capitalize()} stopped before completing"
+                )
+            self._interrupt()
+            raise SandboxTimeoutError(
+                f"{self.kind.capitalize()} request did not complete within "
+                f"{timeout} seconds and was interrupted"
+            )
+
+    def _request(
+        self, request: Dict[str, Any], timeout: float
+    ) -> Iterator[Dict[str, Any]]:
+        """Send one request to the kernel and yield its reply frames."""
+        payload = base64.b64encode(json.dumps(request).encode("utf-8")).decode("ascii")
+        command = (
+            f"{shlex.quote(self.python)} -S -c {shlex.quote(_RELAY)} "
+            f"{shlex.quote(self._socket_path)} {payload}"
+        )
+        client = self.sandbox._get_client()
+        buffer = ""
+        exit_code = 0
+        try:
+            events = client.run_streaming(cmd=command, timeout=timeout)
+            for event in events:
+                if "stream" in event:
+                    if event["stream"] == "stderr":
+                        logger.debug(f"{self.kind.capitalize()} relay: {event['data']}")
+                        continue
+                    buffer += event["data"]
+                    # Lines may arrive with or without their newline
+                    lines = buffer.split("\n")
+                    buffer = lines.pop()
+                    if buffer:
+                        try:
+                            lines.append(json.dumps(json.loads(buffer)))
+                            buffer = ""
+                        except ValueError:
+                            pass
+                    for line in lines:
+                        if line.strip():
+                            yield json.loads(line)
+                elif "code" in event:
+                    exit_code = event["code"]
+                elif "error" in event and isinstance(event["error"], str):
+                    raise SandboxError(
+                        f"{self.kind.capitalize()} request failed: {event['error']}"
+                    )
+        except SandboxError:
+            raise
+        except Exception as e:
+            raise SandboxError(
+                f"{self.kind.capitalize()} request failed: {str(e)}"
+            ) from e
+        if exit_code:
+            raise SandboxError(
+                f"{self.kind.capitalize()} is not reachable (relay exited with {exit_code})"
+            )
+
+
+class Interpreter(KernelSession):
+    """
+    Persistent interpreter session inside a sandbox.
+
+    One interpreter process is started and kept alive, so cells share state
+    and pay interpreter startup and imports only once. Output of each cell
+    is streamed back as it is produced.
+
+    Use it as a context manager, or call close() to stop the interpreter.
+    """
+
+    kernel_source = _PYTHON_KERNEL
+    kind = "interpreter"
+
+    def __init__(
+        self,
+        sandbox: Sandbox,
+        language: str = "python",
+        executable: str = "python3",
+        cwd: Optional[str] = None,
+        env: Optional[Dict[str, str]] = None,
+        startup_timeout: float = 30.0,
+    ) -> None:
+        if language not in SUPPORTED_LANGUAGES:
+            raise ValueError(
+                f"Unsupported language {language!r}, expected one of {SUPPORTED_LANGUAGES}"
+            )
+        super().__init__(
+            sandbox,
+            python=executable,
+            cwd=cwd,
+            env=env,
+            startup_timeout=startup_timeout,
+        )
+        self.language = language
+
+    def run(
+        self,
+        code: str,
+        timeout: Optional[float] = 60.0,
+        on_stdout: Optional[Callable[[str], None]] = None,
+        on_stderr: Optional[Callable[[str], None]] = None,
+        on_result: Optional[Callable[[Dict[str, str]], None]] = None,
+    ) -> CellResult:
+        """
+        Run a cell in the interpreter.
+
+        The value of a trailing expression is returned as a MIME bundle with
+        its plain text representation and, when the object provides them,
+        HTML, Markdown, SVG, PNG (base64), JPEG (base64) or JSON renderings.
+
+        Args:
+            code: Source code of the cell
+            timeout: Seconds after which the cell is interrupted (None: no limit)
+            on_stdout: Optional callback for streaming stdout chunks
+            on_stderr: Optional callback for streaming stderr chunks
+            on_result: Optional callback for each displayed value
+
+        Returns:
+            CellResult: Output, values and exception of the cell
+
+        Raises:
+            SandboxTimeoutError: If the cell was interrupted after timeout
+            SandboxError: If the interpreter cannot be reached
+
+        Example:
+            >>> with sandbox.interpreter() as py:
+            ...     py.run("import numpy as np; a = np.arange(10)")
+            ...     print(py.run("a.sum()").text)
+            45
+        """
+        start_time = time.time()
+        result = CellResult()
+        stdout: List[str] = []
+        stderr: List[str] = []
+        for frame in self._execute({"op": "execute", "code": code}, timeout):
+            kind = frame.get("type")
+            if kind == "stream":
+                text = frame.get("text", "")
+                if frame.get("name") == "stderr":
+                    stderr.append(text)
+                    if on_stderr:
+                        on_stderr(text)
+                else:
+                    stdout.append(text)
+                    if on_stdout:
+                        on_stdout(text)
+            elif kind == "result":
+                data = frame.get("data", {})
+                result.results.append(data)
+                if on_result:
+                    on_result(data)
+            elif kind == "error":
+                result.error = CellError(
+                    frame.get("ename", "Error"),
+                    frame.get("evalue", ""),
+                    frame.get("traceback", []),
+                )
+        result.stdout = "".join(stdout)
+        result.stderr = "".join(stderr)
+        result.duration = time.time() - start_time
+        return result
+
+    def interrupt(self) -> None:
+        """
+        Interrupt the running cell, which raises KeyboardInterrupt.
+
+        Raises:
+            SandboxError: If the interpreter cannot be reached
+        """
+        self._interrupt()
+
+
+class AsyncInterpreter(Interpreter):
+    """
+    Async persistent interpreter session inside a sandbox.
+    Inherits from Interpreter and provides async wrappers for all operations.
+    """
+
+    async def _run_sync(self, method, *args, **kwargs):
+        return await run_sync_in_executor(method, *args, **kwargs)
+
+    @async_wrapper("start")
+    async def start(self) -> "AsyncInterpreter":
+        """Start the interpreter process asynchronously."""
+        raise NotImplementedError  # Implemented by async_wrapper
+
+    @async_wrapper("run")
+    async def run(
+        self,
+        code: str,
+        timeout: Optional[float] = 60.0,
+        on_stdout: Optional[Callable[[str], None]] = None,
+        on_stderr: Optional[Callable[[str], None]] = None,
+        on_result: Optional[Callable[[Dict[str, str]], None]] = None,
+    ) -> CellResult:
+        """Run a cell in the interpreter asynchronously."""
+        raise NotImplementedError  # Implemented by async_wrapper
+
+    @async_wrapper("interrupt")
+    async def interrupt(self) -> None:
+        """Interrupt the running cell asynchronously."""
+        raise NotImplementedError  # Implemented by async_wrapper
+
+    @async_wrapper("restart")
+    async def restart(self) -> None:
+        """Restart the interpreter asynchronously."""
+        raise NotImplementedError  # Implemented by async_wrapper
+
+    @async_wrapper("close")
+    async def close(self) -> None:
+        """Stop the interpreter process asynchronously."""
+        raise NotImplementedError  # Implemented by async_wrapper
+
+    async def __aenter__(self) -> "AsyncInterpreter":
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self.close()
@@ -0,0 +1,334 @@
+# coding: utf-8
+
+"""
+Keep-warm manager for Koyeb Sandbox instances
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple
+
+from .utils import async_wrapper, create_sandbox_client, logger, run_sync_in_executor
+
+if TYPE_CHECKING:
+    from .executor_client import SandboxClient
+    from .sandbox import Sandbox
+
+# Weight of the latest gap in the estimate of the time between two uses
+_GAP_WEIGHT = 0.3
+
+
+@dataclass
+class _Tracked:
+    sandbox: Sandbox
+    idle_timeout: float
+    last_use: float  # Last request seen on the clients of the sandbox's handle
+    next_use: Optional[float] = None  # Expected time of the next use
+    last_ping: float = 0.0
+    gap: Optional[float] = None  # Estimated time between two uses
+    client: Optional[SandboxClient] = None
+
+    @property
+    def last_active(self) -> float:
+        return max(self.last_use, self.last_ping)
+
+
+class KeepWarm:
+    """
+    Keeps sandboxes awake ahead of their expected use.
+
+    Each tracked sandbox has an expected next use, given with expect() or
+    predicted from the gaps between its past uses. The sandboxes expected
+    within horizon seconds, up to budget of them and soonest first, get a
+    /health ping just before their idle_timeout expires; those already
+    asleep are woken wake_lead seconds before their expected use.
+
+    Call tick() periodically, or start() to run it in a background thread.
+
+    Example:
+        >>> with KeepWarm(budget=20).start() as warm:
+        ...     warm.track(sandbox, idle_timeout=300)
+        ...     warm.expect(sandbox, delay=600)  # Next job in 10 minutes
+        ...     warm.wake(batch)  # Work queued for these sandboxes now
+    """
+
+    def __init__(
+        self,
+        budget: int = 10,
+        margin: float = 30.0,
+        horizon: float = 900.0,
+        wake_lead: float = 15.0,
+        interval: float = 5.0,
+        concurrency: int = 16,
+        ping_timeout: float = 2.0,
+    ) -> None:
+        """
+        Args:
+            budget: Maximum number of sandboxes kept warm at once
+            margin: Seconds before idle_timeout expiry at which a sandbox is pinged
+            horizon: Only sandboxes expected within this many seconds are kept warm
+            wake_lead: Seconds before its expected use at which a sleeping sandbox is woken
+            interval: Seconds between two ticks of the background thread
+            concurrency: Maximum number of pings in flight
+            ping_timeout: Timeout of each ping in seconds
+        """
+        self.budget = budget
+        self.margin = margin
+        self.horizon = horizon
+        self.wake_lead = wake_lead
+        self.interval = interval
+        self.concurrency = concurrency
+        self.ping_timeout = ping_timeout
+        self._tracked: Dict[str, _Tracked] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def track(
+        self,
+        sandbox: Sandbox,
+        idle_timeout: float = 300.0,
+        next_use: Optional[float] = None,
+    ) -> None:
+        """
+        Start tracking a sandbox.
+
+        Args:
+            sandbox: Sandbox handle, whose requests are used to learn its usage
+            idle_timeout: Idle timeout the sandbox was created with
+            next_use: Expected time of the next use, in epoch seconds
+        """
+        last_use = max(sandbox._last_used_at, sandbox._created_at)
+        with self._lock:
+            self._tracked[sandbox.service_id] = _Tracked(
+                sandbox=sandbox,
+                idle_timeout=idle_timeout,
+                last_use=last_use,
+                next_use=next_use,
+            )
+
+    def untrack(self, sandbox: Sandbox) -> None:
+        """Stop tracking a sandbox."""
+        with self._lock:
+            self._tracked.pop(sandbox.service_id, None)
+
+    def expect(self, sandbox: Sandbox, delay: float = 0.0) -> None:
+        """
+        Set the expected next use of a sandbox, tracking it if needed.
+
+        Args:
+            sandbox: Sandbox handle
+            delay: Seconds from now until the sandbox is needed
+        """
+        if sandbox.service_id not in self._tracked:
+            self.track(sandbox)
+        with self._lock:
+            entry = self._tracked.get(sandbox.service_id)
+            if entry is not None:
+                entry.next_use = time.time() + delay
+
+    def warm(self) -> List[Sandbox]:
+        """Get the sandboxes currently selected to be kept warm."""
+        with self._lock:
+            return [entry.sandbox for _, entry in self._select(time.time())]
+
+    def _observe(self, entry: _Tracked, now: float) -> None:
+        last_request = entry.sandbox._last_used_at
+        if last_request > entry.last_use:
+            gap = last_request - entry.last_use
+            # Requests closer than the margin belong to the same use
+            if gap > self.margin:
+                entry.gap = (
+                    gap
+                    if entry.gap is None
+                    else (1 - _GAP_WEIGHT) * entry.gap + _GAP_WEIGHT * gap
+                )
+            entry.last_use = last_request
+        if entry.next_use is not None and entry.last_use >= entry.next_use:
+            # The expected use happened
+            entry.next_use = None
+        elif entry.next_use is not None and now > entry.next_use + entry.idle_timeout:
+            # The expected use did not happen, stop keeping the sandbox up for it
+            entry.next_use = None
+        if entry.next_use is None and entry.gap is not None:
+            entry.next_use = entry.last_use + entry.gap
+
+    def _select(self, now: float) -> List[Tuple[float, _Tracked]]:
+        # (next use, entry) of the entries expected within the horizon, soonest first
+        expected = [
+            (entry.next_use, entry)
+            for entry in self._tracked.values()
+            if entry.next_use is not None and entry.next_use - now <= self.horizon
+        ]
+        expected.sort(key=lambda item: item[0])
+        return expected[: self.budget]
+
+    def _get_client(self, entry: _Tracked) -> SandboxClient:
+        # Pings go through a client of their own, so they are not seen as uses
+        if entry.client is None:
+            entry.client = create_sandbox_client(
+                entry.sandbox._get_sandbox_url(),
+                entry.sandbox.sandbox_secret,
+                rate_limiter=entry.sandbox.rate_limiter,
+                resolve_url=entry.sandbox._resolve_url,
+            )
+        return entry.client
+
+    def _ping(self, entry: _Tracked) -> bool:
+        try:
+            ok = self._get_client(entry).ping(timeout=self.ping_timeout)
+        except Exception as e:
+            logger.debug(f"Failed to ping sandbox {entry.sandbox.service_id}: {e}")
+            return False
+        if ok:
+            entry.last_ping = time.time()
+        return ok
+
+    def tick(self) -> int:
+        """
+        Ping the sandboxes that are about to sleep or are needed soon.
+
+        Returns:
+            int: Number of sandboxes pinged
+        """
+        now = time.time()
+        due = []
+        with self._lock:
+            for entry in self._tracked.values():
+                self._observe(entry, now)
+            for next_use, entry in self._select(now):
+                asleep = now >= entry.last_active + entry.idle_timeout
+                if asleep:
+                    if next_use - now <= self.wake_lead:
+                        due.append(entry)
+                elif now >= entry.last_active + entry.idle_timeout - self.margin:
+                    due.append(entry)
+        if due:
+            with ThreadPoolExecutor(
+                max_workers=min(self.concurrency, len(due))
+            ) as pool:
+                list(pool.map(self._ping, due))
+        return len(due)
+
+    def _wake_one(self, entry: _Tracked, timeout: float) -> Optional[float]:
+        start_time = time.time()
+        delay = 0.1
+        while True:
+            if self._ping(entry):
+                return time.time() - start_time
+            remaining = timeout - (time.time() - start_time)
+            if remaining <= 0:
+                return None
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, 1.0)
+
+    def wake(
+        self, sandboxes: Iterable[Sandbox], timeout: float = 60.0
+    ) -> Dict[str, Optional[float]]:
+        """
+        Wake sandboxes in parallel and wait until they are ready.
+
+        Readiness is polled with single /health requests every 0.1s to 1s,
+        rather than through the retry backoff of the executor client.
+        Tracked sandboxes are also marked as needed now.
+
+        Args:
+            sandboxes: Sandboxes about to receive work
+            timeout: Maximum seconds to wait for each sandbox
+
+        Returns:
+            Dict[str, Optional[float]]: Seconds each sandbox took to be ready,
+                by service ID, None for those not ready within timeout
+        """
+        entries = []
+        untracked = []
+        now = time.time()
+        with self._lock:
+            for sandbox in sandboxes:
+                entry = self._tracked.get(sandbox.service_id)
+                if entry is None:
+                    entry = _Tracked(sandbox=sandbox, idle_timeout=0.0, last_use=0.0)
+                    untracked.append(entry)
+                else:
+                    entry.next_use = now
+                entries.append(entry)
+        if not entries:
+            return {}
+        try:
+            with ThreadPoolExecutor(
+                max_workers=min(self.concurrency, len(entries))
+            ) as pool:
+                durations = list(
+                    pool.map(lambda entry: self._wake_one(entry, timeout), entries)
+                )
+        finally:
+            # stop() only closes the clients of tracked sandboxes
+            for entry in untracked:
+                if entry.client is not None:
+                    entry.client.close()
+        return {
+            entry.sandbox.service_id: duration
+            for entry, duration in zip(entries, durations)
+        }
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.tick()
+            except Exception as e:
+                logger.warning(f"Keep-warm tick failed: {e}")
+
+    def start(self) -> "KeepWarm":
+        """Run tick() every interval seconds in a background thread."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="koyeb-keep-warm", daemon=True
+            )
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop the background thread and close the ping clients."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        with self._lock:
+            for entry in self._tracked.values():
+                if entry.client is not None:
+                    entry.client.close()
+                    entry.client = None
+
+    def __enter__(self) -> "KeepWarm":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.stop()
+
+
+class AsyncKeepWarm(KeepWarm):
+    """
+    Keep-warm manager for async code.
+    Inherits from KeepWarm and provides an async wrapper for wake().
+    """
+
+    async def _run_sync(self, method, *args, **kwargs):
+        return await run_sync_in_executor(method, *args, **kwargs)
+
+    @async_wrapper("wake")
+    async def wake(
+        self, sandboxes: Iterable[Sandbox], timeout: float = 60.0
+    ) -> Dict[str, Optional[float]]:
+        """Wake sandboxes in parallel and wait until they are ready asynchronously."""
+        raise NotImplementedError  # Implemented by async_wrapper
+
+    async def __aenter__(self) -> "AsyncKeepWarm":
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.stop()
@@ -0,0 +1,401 @@
+# coding: utf-8
+
+"""
+Dependency layer cache for Koyeb Sandbox instances
+
+Installed dependencies are archived once and stored, keyed by a hash of the
+dependency spec, in a long-lived cache sandbox. Other sandboxes then restore
+them by unpacking the archive instead of resolving and building them again.
+"""
+
+from __future__ import annotations
+
+import json
+import posixpath
+import shlex
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+from .utils import SandboxError, logger
+
+if TYPE_CHECKING:
+    from .sandbox import Sandbox
+
+DEFAULT_CACHE_DIRECTORY = "/var/cache/koyeb-layers"
+DEFAULT_CACHE_PORT = 8765
+DEFAULT_VENV = "/opt/koyeb/venv"
+
+_STORE_SCRIPT = "/tmp/koyeb-layer-store.py"
+
+# Commands installing from a lockfile, by lockfile name
+_LOCKFILE_INSTALLERS = {
+    "package-lock.json": ("npm ci", "node --version"),
+    "npm-shrinkwrap.json": ("npm ci", "node --version"),
+    "yarn.lock": ("yarn install --frozen-lockfile", "node --version && yarn --version"),
+    "pnpm-lock.yaml": (
+        "pnpm install --frozen-lockfile",
+        "node --version && pnpm --version",
+    ),
+}
+
+# Layer store served by the cache sandbox: GET, HEAD and PUT of archives
+# under /layers/, authenticated with the token kept next to them.
+_LAYER_STORE = r"""
+import hmac, http.server, os, re, shutil, sys, tempfile
+
+directory, port = sys.argv[1], int(sys.argv[2])
+with open(os.path.join(directory, ".token")) as f:
+    token = "Bearer " + f.read().strip()
+name_pattern = re.compile(r"^/layers/([a-z]+-[0-9a-f]{64}\.tar\.gz)$")
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    def layer(self):
+        if not hmac.compare_digest(self.headers.get("Authorization", ""), token):
+            self.send_error(401)
+            return None
+        match = name_pattern.match(self.path)
+        if not match:
+            self.send_error(404)
+            return None
+        return os.path.join(directory, match.group(1))
+
+    def send_layer(self, body):
+        path = self.layer()
+        if path is None:
+            return
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            self.send_error(404)
+            return
+        with f:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/gzip")
+            self.send_header("Content-Length", str(os.fstat(f.fileno()).st_size))
+            self.end_headers()
+            if body:
+                shutil.copyfileobj(f, self.wfile, 1 << 20)
+
+    def do_GET(self):
+        self.send_layer(True)
+
+    def do_HEAD(self):
+        self.send_layer(False)
+
+    def do_PUT(self):
+        path = self.layer()
+        if path is None:
+            return
+        remaining = int(self.headers.get("Content-Length", 0))
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                while remaining:
+                    data = self.rfile.read(min(remaining, 1 << 20))
+                    if not data:
+                        raise ConnectionError("truncated upload")
+                    f.write(data)
+                    remaining -= len(data)
+            # Concurrent publishers of a layer upload the same content
+            os.replace(tmp, path)
+        except Exception:
+            os.unlink(tmp)
+            raise
+        self.send_response(201)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+http.server.ThreadingHTTPServer(("", port), Handler).serve_forever()
+"""
+
+# Restores a layer from the cache, or installs it and publishes the result.
+# Prints a JSON report as the last line of stdout.
+_INSTALL = r"""
+import hashlib, json, os, platform, shutil, subprocess, sys, tarfile, tempfile, urllib.error, urllib.request
+
+spec = json.loads(sys.argv[1])
+target, command, url = spec["target"], spec["command"], spec["url"]
+probe = subprocess.run(spec["probe"], shell=True, cwd=spec["cwd"], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+digest = hashlib.sha256()
+digest.update(json.dumps([spec["kind"], target, command, platform.machine()]).encode())
+digest.update(probe.stdout)
+for path in spec["files"]:
+    with open(path, "rb") as f:
+        digest.update(hashlib.sha256(f.read()).digest())
+key = spec["kind"] + "-" + digest.hexdigest()
+report = {"key": key, "cached": False, "published": False, "exit_code": 0, "output": "", "cache_error": None}
+headers = {"Authorization": "Bearer " + spec["token"]} if url else {}
+layer_url = url + "/layers/" + key + ".tar.gz" if url else None
+trusted = {"filter": "fully_trusted"} if hasattr(tarfile, "fully_trusted_filter") else {}
+
+
+def restore():
+    request = urllib.request.Request(layer_url, headers=headers)
+    try:
+        response = urllib.request.urlopen(request, timeout=60)
+    except urllib.error.HTTPError as e:
+        if e.code == 404:
+            return False
+        raise
+    shutil.rmtree(target, ignore_errors=True)
+    with response, tarfile.open(fileobj=response, mode="r|gz") as archive:
+        archive.extractall("/", **trusted)
+    return True
+
+
+def publish():
+    fd, tmp = tempfile.mkstemp(suffix=".tar.gz")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            with tarfile.open(fileobj=f, mode="w:gz", compresslevel=1) as archive:
+                archive.add(target, arcname=target.lstrip("/"))
+        with open(tmp, "rb") as f:
+            request = urllib.request.Request(
+                layer_url,
+                data=f,
+                method="PUT",
+                headers=dict(headers, **{"Content-Length": str(os.path.getsize(tmp))}),
+            )
+            urllib.request.urlopen(request, timeout=600).close()
+    finally:
+        os.unlink(tmp)
+
+
+if url:
+    try:
+        report["cached"] = restore()
+    except Exception as e:
+        shutil.rmtree(target, ignore_errors=True)
+        report["cache_error"] = "restore failed: %s" % e
+if not report["cached"]:
+    proc = subprocess.run(command, shell=True, cwd=spec["cwd"], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    report["exit_code"] = proc.returncode
+    report["output"] = proc.stdout.decode("utf-8", "replace")[-65536:]
+    if proc.returncode == 0 and url and not report["cache_error"]:
+        try:
+            publish()
+            report["published"] = True
+        except Exception as e:
+            report["cache_error"] = "publish failed: %s" % e
+print(json.dumps(report))
+"""
+
+
+@dataclass
+class LayerCache:
+    """
+    Content-addressed store of dependency layers, served by a cache sandbox.
+
+    Only the URL and token are needed to use the cache, so it can be shared
+    with other processes, e.g. as LayerCache(**json.loads(config)).
+    """
+
+    url: str
+    token: str
+    sandbox: Optional[Sandbox] = field(default=None, repr=False, compare=False)
+
+    @classmethod
+    def serve(
+        cls,
+        sandbox: Sandbox,
+        directory: str = DEFAULT_CACHE_DIRECTORY,
+        port: int = DEFAULT_CACHE_PORT,
+        timeout: float = 60.0,
+    ) -> "LayerCache":
+        """
+        Serve a layer cache from an existing sandbox.
+
+        The sandbox's public port is bound to the layer store, and the layers
+        are kept in directory; mount a volume there so they survive restarts.
+        Serving again after a restart keeps the same token.
+
+        Args:
+            sandbox: Long-lived sandbox holding the layers
+            directory: Directory of the layers in the sandbox
+            port: Port of the layer store in the sandbox
+            timeout: Maximum seconds to wait for the layer store to start
+
+        Returns:
+            LayerCache: The cache, to pass to sandbox.install()
+
+        Raises:
+            SandboxError: If the layer store cannot be started or exposed
+        """
+        from .processes import wait_for_port
+
+        client = sandbox._get_client()
+        quoted = shlex.quote(directory)
+        response = client.run(
+            f"umask 077 && mkdir -p {quoted} && "
+            f"{{ test -s {quoted}/.token || "
+            f"python3 -c 'import secrets; print(secrets.token_hex(32))' > {quoted}/.token; }} && "
+            f"cat {quoted}/.token"
+        )
+        token = response.get("stdout", "").strip()
+        if response.get("exit_code", 0) != 0 or not token:
+            raise SandboxError(
+                f"Failed to prepare layer cache: {response.get('stderr', '').strip()}"
+            )
+
+        running = any(
+            process.status == "running" and _STORE_SCRIPT in (process.command or "")
+            for process in sandbox._list_processes()
+        )
+        if not running:
+            response = client.write_file(_STORE_SCRIPT, _LAYER_STORE)
+            if response.get("error"):
+                raise SandboxError(f"Failed to write layer store: {response['error']}")
+            response = client.start_process(
+                f"python3 {_STORE_SCRIPT} {quoted} {int(port)}"
+            )
+            sandbox._check_response_error(response, "start layer store")
+            wait_for_port(sandbox, port, timeout=timeout)
+
+        try:
+            sandbox._bind_port(port)
+        except SandboxError:
+            raise
+        except Exception as e:
+            raise SandboxError(f"Failed to expose layer cache: {str(e)}") from e
+        domain = sandbox.get_domain()
+        if not domain:
+            raise SandboxError("Domain not available for layer cache")
+        return cls(url=f"https://{domain}", token=token, sandbox=sandbox)
+
+    @classmethod
+    def create(
+        cls,
+        name: str = "layer-cache",
+        directory: str = DEFAULT_CACHE_DIRECTORY,
+        port: int = DEFAULT_CACHE_PORT,
+        **kwargs: Any,
+    ) -> "LayerCache":
+        """
+        Create an always-on cache sandbox with a volume for the layers.
+
+        Args:
+            name: Name of the cache sandbox
+            directory: Mount path of the layer volume
+            port: Port of the layer store in the sandbox
+            **kwargs: Other arguments of Sandbox.create (e.g. volume_size, region)
+
+        Returns:
+            LayerCache: The cache, with its sandbox in the sandbox attribute
+        """
+        from .sandbox import Sandbox
+
+        kwargs.setdefault("idle_timeout", 0)
+        sandbox = Sandbox.create(name=name, mount_path=directory, **kwargs)
+        return cls.serve(sandbox, directory=directory, port=port)
+
+    def to_dict(self) -> Dict[str, str]:
+        """Get the URL and token of the cache."""
+        return {"url": self.url, "token": self.token}
+
+
+@dataclass
+class InstallResult:
+    """Outcome of sandbox.install()."""
+
+    key: str  # Hash of the dependency spec
+    target: str  # Installed directory
+    cached: bool  # Restored from the cache instead of installed
+    published: bool  # Installed and added to the cache
+    duration: float
+    output: str = ""  # Installer output, empty on cache hits
+    cache_error: Optional[str] = None  # Cache failure the install recovered from
+
+
+def install_layer(
+    sandbox: Sandbox,
+    requirements: Optional[str] = None,
+    lockfile: Optional[str] = None,
+    cache: Optional[LayerCache] = None,
+    venv: str = DEFAULT_VENV,
+    python: str = "python3",
+    timeout: float = 1800.0,
+) -> InstallResult:
+    """
+    Install dependencies in a sandbox, going through the layer cache.
+
+    The spec is hashed inside the sandbox, together with the installed
+    directory, the installer command, the interpreter version and the
+    architecture, so a layer is only restored where it would work as is.
+    """
+    if (requirements is None) == (lockfile is None):
+        raise ValueError("Exactly one of requirements or lockfile is required")
+
+    if requirements is not None:
+        kind = "pip"
+        target = venv
+        cwd = posixpath.dirname(requirements) or "/"
+        files = [requirements]
+        command = (
+            f"{shlex.quote(python)} -m venv {shlex.quote(venv)} && "
+            f"{shlex.quote(posixpath.join(venv, 'bin', 'pip'))} install "
+            f"--disable-pip-version-check -r {shlex.quote(requirements)}"
+        )
+        probe = f"{shlex.quote(python)} --version"
+    elif lockfile is not None:
+        installer = _LOCKFILE_INSTALLERS.get(posixpath.basename(lockfile))
+        if installer is None:
+            supported = ", ".join(_LOCKFILE_INSTALLERS)
+            raise ValueError(
+                f"Unsupported lockfile {lockfile!r}, expected one of {supported}"
+            )
+        kind = "node"
+        cwd = posixpath.dirname(lockfile) or "/"
+        target = posixpath.join(cwd, "node_modules")
+        files = [posixpath.join(cwd, "package.json"), lockfile]
+        command, probe = installer
+
+    spec = {
+        "kind": kind,
+        "target": target,
+        "cwd": cwd,
+        "files": files,
+        "command": command,
+        "probe": probe,
+        "url": cache.url.rstrip("/") if cache else None,
+        "token": cache.token if cache else None,
+    }
+    command_line = " ".join(
+        shlex.quote(arg) for arg in ["python3", "-S", "-c", _INSTALL, json.dumps(spec)]
+    )
+    start_time = time.time()
+    try:
+        response = sandbox._get_client().run(cmd=command_line, timeout=timeout)
+    except Exception as e:
+        raise SandboxError(f"Failed to install dependencies: {str(e)}") from e
+    lines = response.get("stdout", "").strip().splitlines()
+    try:
+        report = json.loads(lines[-1])
+    except (IndexError, ValueError):
+        raise SandboxError(
+            f"Failed to install dependencies: {response.get('stderr', '').strip()}"
+        )
+
+    if report["cache_error"]:
+        logger.warning(
+            f"Layer cache unavailable for {report['key']}: {report['cache_error']}"
+        )
+    if report["exit_code"] != 0:
+        raise SandboxError(
+            f"Dependency install failed with exit code {report['exit_code']}:\n"
+            f"{report['output'][-4096:]}"
+        )
+    return InstallResult(
+        key=report["key"],
+        target=target,
+        cached=report["cached"],
+        published=report["published"],
+        duration=time.time() - start_time,
+        output=report["output"],
+        cache_error=report["cache_error"],
+    )
@@ -0,0 +1,512 @@
+# coding: utf-8
+
+"""
+Resource telemetry and instance type right-sizing for Koyeb Sandbox
+"""
+
+import json
+import math
+import os
+import re
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Tuple
+
+from koyeb.api.metrics_client import MetricsClient, align, parse_step
+from koyeb.api.models.metric_name import MetricName
+
+from .utils import SandboxError, get_api_client, logger
+
+if TYPE_CHECKING:
+    from .sandbox import Sandbox
+
+# Instance statuses whose metrics describe the current run of a sandbox
+_LIVE_STATUSES = ("HEALTHY", "STARTING", "UNHEALTHY", "SLEEPING")
+
+_SIZE_UNITS = {
+    "": 1,
+    "B": 1,
+    "KB": 1000,
+    "MB": 1000**2,
+    "GB": 1000**3,
+    "TB": 1000**4,
+    "KIB": 1024,
+    "MIB": 1024**2,
+    "GIB": 1024**3,
+    "TIB": 1024**4,
+}
+
+
+@dataclass
+class ResourceSample:
+    """CPU and memory usage of a sandbox at one point in time."""
+
+    timestamp: float  # Epoch seconds
+    cpu_percent: Optional[float] = None  # Percent of the instance's vCPU allocation
+    memory_bytes: Optional[float] = None  # Resident memory in bytes
+
+
+@dataclass
+class ResourceUsage:
+    """CPU and memory usage of a sandbox instance over a time range."""
+
+    instance_id: str
+    instance_type: Optional[str]
+    start: float  # Epoch seconds
+    end: float  # Epoch seconds
+    samples: List[ResourceSample] = field(default_factory=list)
+
+    def _values(self, attr: str) -> List[float]:
+        return [
+            v
+            for v in (getattr(s, attr) for s in self.samples)
+            if v is not None and not math.isnan(v)
+        ]
+
+    @property
+    def cpu_percent_avg(self) -> Optional[float]:
+        values = self._values("cpu_percent")
+        return sum(values) / len(values) if values else None
+
+    @property
+    def cpu_percent_peak(self) -> Optional[float]:
+        return max(self._values("cpu_percent"), default=None)
+
+    @property
+    def cpu_percent_p95(self) -> Optional[float]:
+        values = sorted(self._values("cpu_percent"))
+        if not values:
+            return None
+        return values[min(len(values) - 1, int(math.ceil(0.95 * len(values))) - 1)]
+
+    @property
+    def memory_bytes_avg(self) -> Optional[float]:
+        values = self._values("memory_bytes")
+        return sum(values) / len(values) if values else None
+
+    @property
+    def memory_bytes_peak(self) -> Optional[float]:
+        return max(self._values("memory_bytes"), default=None)
+
+
+def get_instance(sandbox: "Sandbox") -> Tuple[str, Optional[str]]:
+    """
+    Find the instance currently running a sandbox.
+
+    Args:
+        sandbox: Sandbox to look up
+
+    Returns:
+        Tuple of (instance ID, instance type)
+
+    Raises:
+        SandboxError: If the sandbox has no instance
+    """
+    _, _, instances_api, _, _ = get_api_client(
+        sandbox.api_token, rate_limiter=sandbox.rate_limiter
+    )
+    try:
+        response = instances_api.list_instances(
+            service_id=sandbox.service_id, limit="20", order="desc"
+        )
+    except Exception as e:
+        raise SandboxError(f"Failed to list sandbox instances: {str(e)}")
+    instances = [i for i in response.instances or [] if i.id]
+    if not instances:
+        raise SandboxError("Sandbox has no instance")
+    live = [i for i in instances if i.status and i.status.value in _LIVE_STATUSES]
+    instance = (live or instances)[0]
+    return str(instance.id), instance.type
+
+
+def fetch_usage(
+    sandbox: "Sandbox",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    step: str = "1m",
+) -> ResourceUsage:
+    """
+    Fetch the CPU and memory usage of a sandbox's instance.
+
+    Args:
+        sandbox: Sandbox to query
+        start: Beginning of the range (default: 15 minutes before end)
+        end: End of the range (default: now)
+        step: Resolution of the samples, in minutes ("5m") or hours ("1h")
+
+    Returns:
+        ResourceUsage: Usage samples aligned on a common time grid
+
+    Raises:
+        SandboxError: If the metrics cannot be retrieved
+    """
+    end = end or datetime.now(timezone.utc)
+    start = start or end - timedelta(minutes=15)
+    instance_id, instance_type = get_instance(sandbox)
+    apps_api, _, _, _, _ = get_api_client(
+        sandbox.api_token, rate_limiter=sandbox.rate_limiter
+    )
+    client = MetricsClient(apps_api.api_client, use_numpy=False)
+    try:
+        series = client.fetch_many(
+            [MetricName.CPU_TOTAL_PERCENT, MetricName.MEM_RSS],
+            instance_ids=[instance_id],
+            start=start,
+            end=end,
+            step=step,
+        )
+    except Exception as e:
+        raise SandboxError(f"Failed to fetch sandbox metrics: {str(e)}")
+
+    cpu = series[("instance", instance_id, MetricName.CPU_TOTAL_PERCENT.value)]
+    memory = series[("instance", instance_id, MetricName.MEM_RSS.value)]
+    usage = ResourceUsage(
+        instance_id=instance_id,
+        instance_type=instance_type,
+        start=start.timestamp(),
+        end=end.timestamp(),
+    )
+    if not cpu and not memory:
+        return usage
+
+    # An instance reports a single series per metric
+    grid, rows = align(cpu[:1] + memory[:1], step, start.timestamp(), end.timestamp())
+    cpu_row = list(rows[0]) if cpu else None
+    memory_row = list(rows[-1]) if memory else None
+    for index, timestamp in enumerate(grid):
+        cpu_value = cpu_row[index] if cpu_row else math.nan
+        memory_value = memory_row[index] if memory_row else math.nan
+        if math.isnan(cpu_value) and math.isnan(memory_value):
+            continue
+        usage.samples.append(
+            ResourceSample(
+                timestamp=timestamp,
+                cpu_percent=None if math.isnan(cpu_value) else cpu_value,
+                memory_bytes=None if math.isnan(memory_value) else memory_value,
+            )
+        )
+    return usage
+
+
+def watch_usage(
+    sandbox: "Sandbox",
+    interval: float = 30.0,
+    step: str = "1m",
+    stop: Optional[threading.Event] = None,
+) -> Iterator[ResourceSample]:
+    """
+    Yield new usage samples of a sandbox as they are reported.
+
+    Only samples of closed buckets are yielded: the bucket still being
+    filled is skipped until a poll after its end, so each sample is final.
+
+    Args:
+        sandbox: Sandbox to watch
+        interval: Seconds between two polls of the metrics API
+        step: Resolution of the samples
+        stop: Event ending the watch when set
+
+    Yields:
+        ResourceSample: Each new sample, in time order
+    """
+    stop = stop or threading.Event()
+    step_seconds = parse_step(step)
+    last = time.time() - 5 * step_seconds
+    while not stop.is_set():
+        now = time.time()
+        try:
+            usage = fetch_usage(
+                sandbox,
+                start=datetime.fromtimestamp(last, timezone.utc),
+                end=datetime.fromtimestamp(now, timezone.utc),
+                step=step,
+            )
+        except SandboxError as e:
+            logger.debug(f"Could not poll sandbox metrics: {e}")
+        else:
+            for sample in usage.samples:
+                # A sample covers the step starting at its timestamp
+                if sample.timestamp > last and sample.timestamp + step_seconds <= now:
+                    last = sample.timestamp
+                    yield sample
+        stop.wait(interval)
+
+
+def _parse_size(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    match = re.match(r"^\s*(\d+(?:\.\d+)?)\s*([KMGT]I?B?|B)?\s*$", value.upper())
+    if not match:
+        return None
+    unit = match.group(2) or ""
+    if unit and not unit.endswith("B"):
+        unit += "B"
+    return float(match.group(1)) * _SIZE_UNITS[unit]
+
+
+@dataclass
+class InstanceTypeSpec:
+    """Resources of a catalog instance type."""
+
+    id: str
+    vcpu_shares: float
+    memory_bytes: float
+    price_hourly: float
+
+
+@dataclass
+class Recommendation:
+    """Smallest instance type fitting the recorded usage of a workload."""
+
+    instance_type: str
+    vcpu_needed: float  # vCPUs used at the 95th percentile, before headroom
+    memory_bytes_needed: float  # Peak resident memory, before headroom
+    runs: int  # Number of recorded runs the recommendation is based on
+    fits: bool  # False when even the largest candidate is too small
+
+
+class InstanceTypeAdvisor:
+    """
+    Record sandbox usage per workload label and recommend instance types.
+
+    Each recorded run keeps the 95th percentile CPU (converted to vCPUs with
+    the run's instance type) and the peak resident memory. The recommended
+    instance type is the cheapest catalog type that keeps the largest of
+    the last ``history`` runs under ``1 - headroom`` of its resources. A run
+    that saturated its CPU allocation only proves a need for more, so it
+    requires a strictly larger type.
+
+    Args:
+        path: JSON file persisting the recorded runs (default: in memory only)
+        headroom: Fraction of the instance left unused, between 0 and 1
+        history: Number of most recent runs considered per label, at least 1
+        api_token: Koyeb API token used to read the instance catalog
+        candidates: Instance types allowed in recommendations (default: every
+            non-GPU catalog type)
+
+    Example:
+        >>> advisor = InstanceTypeAdvisor("~/.koyeb/sizing.json")
+        >>> sandbox = Sandbox.create(instance_type=advisor.instance_type_for("tests"))
+        >>> ...  # run the workload
+        >>> advisor.record_sandbox("tests", sandbox, start=started_at)
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        headroom: float = 0.3,
+        history: int = 20,
+        api_token: Optional[str] = None,
+        candidates: Optional[List[str]] = None,
+    ):
+        if not 0 <= headroom < 1:
+            raise ValueError("headroom must be between 0 and 1")
+        if history < 1:
+            raise ValueError("history must be at least 1")
+        self.path = os.path.expanduser(path) if path else None
+        self.headroom = headroom
+        self.history = history
+        self.api_token = api_token
+        self.candidates = candidates
+        self._catalog: Optional[Dict[str, InstanceTypeSpec]] = None
+        self._runs: Dict[str, List[Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+        if self.path and os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self._runs = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable sizing history {self.path}: {e}")
+
+    def catalog(self) -> Dict[str, InstanceTypeSpec]:
+        """
+        Get the instance types eligible for recommendations.
+
+        Returns:
+            Dict mapping instance type IDs to their resources
+        """
+        if self._catalog is not None:
+            return self._catalog
+        _, _, _, catalog_api, _ = get_api_client(self.api_token)
+        specs: Dict[str, InstanceTypeSpec] = {}
+        offset = 0
+        while True:
+            response = catalog_api.list_catalog_instances(
+                limit="100", offset=str(offset)
+            )
+            items = response.instances or []
+            for item in items:
+                if not item.id or (item.gpu and item.gpu.count):
+                    continue
+                if self.candidates is not None and item.id not in self.candidates:
+                    continue
+                vcpu = item.vcpu_shares if item.vcpu_shares is not None else item.vcpu
+                memory = _parse_size(item.memory)
+                if vcpu is None or memory is None:
+                    continue
+                try:
+                    price = float(item.price_hourly or 0)
+                except ValueError:
+                    price = 0.0
+                specs[item.id] = InstanceTypeSpec(item.id, float(vcpu), memory, price)
+            offset += len(items)
+            if not items or response.count is None or offset >= response.count:
+                break
+        self._catalog = specs
+        return specs
+
+    def record(
+        self, label: str, usage: ResourceUsage, instance_type: Optional[str] = None
+    ) -> None:
+        """
+        Record the usage of one run of a workload.
+
+        Args:
+            label: Workload label, e.g. "unit-tests"
+            usage: Usage of the run
+            instance_type: Instance type the run used (default: usage.instance_type)
+
+        Raises:
+            SandboxError: If the instance type is unknown or usage has no samples
+        """
+        instance_type = instance_type or usage.instance_type
+        spec = self.catalog().get(instance_type) if instance_type else None
+        if spec is None:
+            # Types outside the candidates still describe the run's capacity
+            spec = self._lookup(instance_type)
+        cpu = usage.cpu_percent_p95
+        memory = usage.memory_bytes_peak
+        if cpu is None and memory is None:
+            raise SandboxError("Usage has no samples to record")
+        run = {
+            "instance_type": instance_type,
+            "vcpu_shares": spec.vcpu_shares,
+            "vcpu_used": (cpu or 0.0) / 100 * spec.vcpu_shares,
+            "saturated": (usage.cpu_percent_peak or 0.0) >= 95.0,
+            "memory_bytes": memory or 0.0,
+            "recorded_at": usage.end,
+        }
+        with self._lock:
+            runs = self._runs.setdefault(label, [])
+            runs.append(run)
+            del runs[: -self.history]
+            self._save()
+
+    def record_sandbox(
+        self,
+        label: str,
+        sandbox: "Sandbox",
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        step: str = "1m",
+    ) -> ResourceUsage:
+        """
+        Fetch a sandbox's usage and record it as one run of a workload.
+
+        Args:
+            label: Workload label
+            sandbox: Sandbox that ran the workload
+            start: Beginning of the run (default: 15 minutes before end)
+            end: End of the run (default: now)
+            step: Resolution of the samples
+
+        Returns:
+            ResourceUsage: The recorded usage
+        """
+        usage = fetch_usage(sandbox, start=start, end=end, step=step)
+        self.record(label, usage)
+        return usage
+
+    def recommend(self, label: str) -> Optional[Recommendation]:
+        """
+        Recommend an instance type for a workload.
+
+        Args:
+            label: Workload label
+
+        Returns:
+            Optional[Recommendation]: None if no run was recorded for the label
+        """
+        with self._lock:
+            runs = list(self._runs.get(label, []))
+        if not runs:
+            return None
+        vcpu_needed = 0.0
+        min_vcpu = 0.0
+        memory_needed = 0.0
+        for run in runs:
+            vcpu_needed = max(vcpu_needed, run["vcpu_used"])
+            memory_needed = max(memory_needed, run["memory_bytes"])
+            if run.get("saturated"):
+                min_vcpu = max(min_vcpu, run["vcpu_shares"])
+
+        usable = 1 - self.headroom
+        specs = sorted(
+            self.catalog().values(),
+            key=lambda s: (s.price_hourly, s.vcpu_shares, s.memory_bytes),
+        )
+        if not specs:
+            raise SandboxError("No candidate instance type in the catalog")
+        for spec in specs:
+            if (
+                spec.vcpu_shares * usable >= vcpu_needed
+                and (min_vcpu == 0 or spec.vcpu_shares > min_vcpu)
+                and spec.memory_bytes * usable >= memory_needed
+            ):
+                return Recommendation(
+                    spec.id, vcpu_needed, memory_needed, len(runs), True
+                )
+        largest = max(specs, key=lambda s: (s.vcpu_shares, s.memory_bytes))
+        return Recommendation(largest.id, vcpu_needed, memory_needed, len(runs), False)
+
+    def instance_type_for(self, label: str, default: str = "micro") -> str:
+        """
+        Get the instance type to create a workload's next sandbox with.
+
+        Args:
+            label: Workload label
+            default: Instance type used until a run is recorded
+
+        Returns:
+            str: Recommended instance type, or default
+        """
+        try:
+            recommendation = self.recommend(label)
+        except Exception as e:
+            logger.warning(f"Could not compute instance type for {label}: {e}")
+            return default
+        return recommendation.instance_type if recommendation else default
+
+    def _lookup(self, instance_type: Optional[str]) -> InstanceTypeSpec:
+        if not instance_type:
+            raise SandboxError("Instance type of the run is unknown")
+        _, _, _, catalog_api, _ = get_api_client(self.api_token)
+        try:
+            item = catalog_api.get_catalog_instance(id=instance_type).instance
+        except Exception as e:
+            raise SandboxError(f"Unknown instance type {instance_type}: {str(e)}")
+        if item is None:
+            raise SandboxError(f"Unknown instance type {instance_type}")
+        vcpu = item.vcpu_shares if item.vcpu_shares is not None else item.vcpu
+        memory = _parse_size(item.memory)
+        if vcpu is None or memory is None:
+            raise SandboxError(f"Catalog has no resources for {instance_type}")
+        return InstanceTypeSpec(
+            instance_type, float(vcpu), memory, float(item.price_hourly or 0)
+        )
+
+    def _save(self) -> None:
+        if not self.path:
+            return
+        directory = os.path.dirname(self.path) or "."
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self._runs, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Could not save sizing history {self.path}: {e}")
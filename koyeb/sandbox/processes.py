@@ -0,0 +1,469 @@
+# coding: utf-8
+
+"""
+Background process output and lifecycle helpers for Koyeb Sandbox instances
+"""
+
+from __future__ import annotations
+
+import json
+import re
+import secrets
+import shlex
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Iterator, List, Optional, Union
+
+from .utils import SandboxError, SandboxTimeoutError, logger
+
+if TYPE_CHECKING:
+    from .sandbox import ProcessInfo, Sandbox
+
+# Processes launched with capture_output=True write their output to
+# /tmp/koyeb-process-<token>.stdout and .stderr; the token is recovered from
+# the command reported by list_processes.
+_LOG_PREFIX = "/tmp/koyeb-process-"
+_LOG_TOKEN = re.compile(re.escape(_LOG_PREFIX) + r"([0-9a-f]{16})\.stdout")
+
+# Reads both log files from the given offsets and prints JSON frames with
+# the new byte offsets. With follow, it keeps polling, backing off while
+# idle, until the process (given by pid) has exited and everything is read.
+# An incomplete UTF-8 sequence at the end of a read is left for the next one
+# while the process runs; invalid bytes are replaced.
+_FOLLOW = (
+    "import json,os,sys,time\n"
+    "paths=sys.argv[1:3];offsets=[int(sys.argv[3]),int(sys.argv[4])]\n"
+    "pid=int(sys.argv[5]);follow=sys.argv[6]=='1'\n"
+    "def alive():\n"
+    " try:\n"
+    "  with open('/proc/%d/stat'%pid) as f:return f.read().rsplit(')',1)[1].split()[0]!='Z'\n"
+    " except (OSError,IndexError):return False\n"
+    "def emit(frame):sys.stdout.write(json.dumps(frame)+'\\n');sys.stdout.flush()\n"
+    "def partial(data):\n"
+    " for k in range(1,min(3,len(data))+1):\n"
+    "  b=data[-k]\n"
+    "  if b&0xC0==0x80:continue\n"
+    "  if b<0xC0:return 0\n"
+    "  return k if (2 if b<0xE0 else 3 if b<0xF0 else 4)>k else 0\n"
+    " return 0\n"
+    "delay=0.05;idle=0.0\n"
+    "while True:\n"
+    " live=pid>0 and alive();running=follow and live;got=False\n"
+    " for i,name in enumerate(('stdout','stderr')):\n"
+    "  try:\n"
+    "   with open(paths[i],'rb') as f:f.seek(offsets[i]);data=f.read(65536)\n"
+    "  except OSError:continue\n"
+    "  tail=partial(data)\n"
+    "  if tail and (live or len(data)==65536):data=data[:-tail]\n"
+    "  text=data.decode('utf-8','replace')\n"
+    "  if data:got=True;offsets[i]+=len(data);emit({'stream':name,'offset':offsets[i],'data':text})\n"
+    " if got:delay=0.05;idle=0.0;continue\n"
+    " if not running:break\n"
+    " time.sleep(delay);idle+=delay;delay=min(delay*2,1.0)\n"
+    " if idle>=10:idle=0.0;emit({'heartbeat':True})\n"
+)
+
+# Blocks until the process (given by pid) has exited, for at most the given
+# number of seconds. Exits with 124 on timeout.
+_WAIT = (
+    "import sys,time\n"
+    "pid=int(sys.argv[1]);deadline=time.time()+float(sys.argv[2]);delay=0.02\n"
+    "def alive():\n"
+    " try:\n"
+    "  with open('/proc/%d/stat'%pid) as f:return f.read().rsplit(')',1)[1].split()[0]!='Z'\n"
+    " except (OSError,IndexError):return False\n"
+    "while alive():\n"
+    " if time.time()>=deadline:sys.exit(124)\n"
+    " time.sleep(delay);delay=min(delay*2,0.5)\n"
+)
+
+# Probes a local port until it accepts TCP connections, or answers an HTTP
+# GET with a 2xx/3xx status, for at most the given number of seconds; with a
+# pid, gives up as soon as that process has exited. Prints the time spent.
+# Exits with 124 on timeout and 3 when the process has exited.
+_PROBE = (
+    "import http.client,json,socket,sys,time\n"
+    "port=int(sys.argv[1]);protocol=sys.argv[2];path=sys.argv[3]\n"
+    "start=time.time();deadline=start+float(sys.argv[4]);pid=int(sys.argv[5]);delay=0.01\n"
+    "def alive():\n"
+    " try:\n"
+    "  with open('/proc/%d/stat'%pid) as f:return f.read().rsplit(')',1)[1].split()[0]!='Z'\n"
+    " except (OSError,IndexError):return False\n"
+    "def ready():\n"
+    " try:\n"
+    "  if protocol=='tcp':socket.create_connection(('127.0.0.1',port),1).close();return True\n"
+    "  c=http.client.HTTPConnection('127.0.0.1',port,timeout=2);c.request('GET',path)\n"
+    "  return 200<=c.getresponse().status<400\n"
+    " except (OSError,http.client.HTTPException):return False\n"
+    "while not ready():\n"
+    " if pid and not alive():sys.exit(3)\n"
+    " if time.time()>=deadline:sys.exit(124)\n"
+    " time.sleep(delay);delay=min(delay*1.5,0.5)\n"
+    "print(json.dumps(time.time()-start))\n"
+)
+
+# Sends a signal to each pid (to its whole group when it leads one), waits
+# up to the grace period for them to exit, then sends SIGKILL to the others.
+# Prints one result per pid.
+_KILL = (
+    "import json,os,signal,sys,time\n"
+    "name=sys.argv[1];sig=int(name) if name.isdigit() else getattr(signal,name)\n"
+    "deadline=time.time()+float(sys.argv[2]);pids=json.loads(sys.argv[3])\n"
+    "def alive(pid):\n"
+    " try:\n"
+    "  with open('/proc/%d/stat'%pid) as f:return f.read().rsplit(')',1)[1].split()[0]!='Z'\n"
+    " except (OSError,IndexError):return False\n"
+    "def send(pid,sig):\n"
+    " try:\n"
+    "  if os.getpgid(pid)==pid:os.killpg(pid,sig)\n"
+    "  else:os.kill(pid,sig)\n"
+    " except ProcessLookupError:pass\n"
+    "results={}\n"
+    "for pid in pids:\n"
+    " if not alive(pid):results[pid]={'killed':False,'error':'not running'};continue\n"
+    " try:send(pid,sig);results[pid]={'killed':True,'signal':signal.Signals(sig).name}\n"
+    " except OSError as e:results[pid]={'killed':False,'error':str(e)}\n"
+    "pending=[pid for pid in pids if results[pid]['killed']]\n"
+    "while pending and time.time()<deadline:\n"
+    " time.sleep(0.05);pending=[pid for pid in pending if alive(pid)]\n"
+    "for pid in pending:\n"
+    " try:send(pid,signal.SIGKILL);results[pid]['signal']='SIGKILL'\n"
+    " except OSError as e:results[pid]={'killed':False,'error':str(e)}\n"
+    "deadline=time.time()+2\n"
+    "while pending and time.time()<deadline:\n"
+    " time.sleep(0.05);pending=[pid for pid in pending if alive(pid)]\n"
+    "for pid in pending:results[pid]={'killed':False,'error':'still running after SIGKILL'}\n"
+    "print(json.dumps(results))\n"
+)
+
+# Longest server-side wait of a single request, kept below HTTP timeouts
+_MAX_WAIT = 25.0
+
+
+@dataclass
+class ProcessOutput:
+    """Chunk of output of a background process."""
+
+    stream: str  # "stdout" or "stderr"
+    data: str
+    offset: int  # Byte offset in the stream after this chunk
+
+
+@dataclass
+class ProcessKillResult:
+    """Result of killing one background process."""
+
+    process_id: str
+    command: str
+    killed: bool
+    signal: Optional[str] = None  # Signal that ended the process (e.g. "SIGKILL")
+    error: Optional[str] = None
+
+
+def wrap_command(cmd: str) -> tuple[str, str]:
+    """
+    Wrap a command so its output is written to log files in the sandbox.
+
+    Returns:
+        tuple[str, str]: The wrapped command and its log token
+    """
+    token = secrets.token_hex(8)
+    prefix = f"{_LOG_PREFIX}{token}"
+    wrapped = (
+        f"exec >>{shlex.quote(prefix + '.stdout')} "
+        f"2>>{shlex.quote(prefix + '.stderr')}\n{cmd}"
+    )
+    return wrapped, token
+
+
+def get_process(sandbox: Sandbox, process_id: str) -> ProcessInfo:
+    """Get a background process by id."""
+    for process in sandbox._list_processes():
+        if process.id == process_id:
+            return process
+    raise SandboxError(f"Process {process_id} not found")
+
+
+def _log_token(sandbox: Sandbox, process_id: str) -> str:
+    token = sandbox._process_logs.get(process_id)
+    if token is None:
+        match = _LOG_TOKEN.search(get_process(sandbox, process_id).command)
+        if match is None:
+            raise SandboxError(
+                f"Output of process {process_id} was not captured, "
+                "launch it with capture_output=True"
+            )
+        token = sandbox._process_logs[process_id] = match.group(1)
+    return token
+
+
+def follow_logs(
+    sandbox: Sandbox,
+    process_id: str,
+    follow: bool = True,
+    stdout_offset: int = 0,
+    stderr_offset: int = 0,
+) -> Iterator[ProcessOutput]:
+    """
+    Yield the output of a background process launched with capture_output.
+
+    The files are read by a small script running in the sandbox, which keeps
+    polling them while the process runs, so new output is streamed back over
+    a single request instead of one request per poll.
+    """
+    token = _log_token(sandbox, process_id)
+    pid = 0
+    if follow:
+        process = get_process(sandbox, process_id)
+        if process.status == "running" and process.pid:
+            pid = process.pid
+    prefix = f"{_LOG_PREFIX}{token}"
+    command = " ".join(
+        shlex.quote(str(arg))
+        for arg in [
+            "python3",
+            "-S",
+            "-c",
+            _FOLLOW,
+            prefix + ".stdout",
+            prefix + ".stderr",
+            stdout_offset,
+            stderr_offset,
+            pid,
+            int(follow),
+        ]
+    )
+    client = sandbox._get_client()
+    buffer = ""
+    try:
+        # The script sends a heartbeat at least every 10 seconds
+        for event in client.run_streaming(cmd=command, timeout=60.0):
+            if "stream" in event:
+                if event["stream"] == "stderr":
+                    logger.debug(f"Process log follower: {event['data']}")
+                    continue
+                buffer += event["data"]
+                # Lines may arrive with or without their newline
+                lines = buffer.split("\n")
+                buffer = lines.pop()
+                if buffer:
+                    try:
+                        lines.append(json.dumps(json.loads(buffer)))
+                        buffer = ""
+                    except ValueError:
+                        pass
+                for line in lines:
+                    if not line.strip():
+                        continue
+                    frame = json.loads(line)
+                    if "stream" in frame:
+                        yield ProcessOutput(
+                            frame["stream"], frame["data"], frame["offset"]
+                        )
+            elif "code" in event and event["code"]:
+                raise SandboxError(
+                    f"Failed to read logs of process {process_id} "
+                    f"(exit code {event['code']})"
+                )
+            elif "error" in event and isinstance(event["error"], str):
+                raise SandboxError(
+                    f"Failed to read logs of process {process_id}: {event['error']}"
+                )
+    except SandboxError:
+        raise
+    except Exception as e:
+        raise SandboxError(
+            f"Failed to read logs of process {process_id}: {str(e)}"
+        ) from e
+
+
+def wait_for_exit(
+    sandbox: Sandbox, process_id: str, timeout: Optional[float] = None
+) -> ProcessInfo:
+    """
+    Wait until a background process has exited.
+
+    The wait runs inside the sandbox as a long poll: each request blocks
+    server-side until the process exits or for at most _MAX_WAIT seconds.
+    """
+    start_time = time.time()
+    process = get_process(sandbox, process_id)
+    client = sandbox._get_client()
+    while process.status == "running":
+        remaining = _MAX_WAIT
+        if timeout is not None:
+            remaining = min(remaining, timeout - (time.time() - start_time))
+            if remaining <= 0:
+                raise SandboxTimeoutError(
+                    f"Process {process_id} did not exit within {timeout} seconds"
+                )
+        if process.pid:
+            command = " ".join(
+                shlex.quote(str(arg))
+                for arg in ["python3", "-S", "-c", _WAIT, process.pid, remaining]
+            )
+            try:
+                client.run(cmd=command, timeout=remaining + 10)
+            except Exception as e:
+                raise SandboxError(
+                    f"Failed to wait for process {process_id}: {str(e)}"
+                ) from e
+            process = get_process(sandbox, process_id)
+            if process.status == "running":
+                # Exited, but not recorded by the executor yet
+                time.sleep(0.2)
+        else:
+            time.sleep(min(remaining, 0.5))
+            process = get_process(sandbox, process_id)
+    return process
+
+
+def wait_for_port(
+    sandbox: Sandbox,
+    port: int,
+    timeout: float = 60.0,
+    protocol: str = "tcp",
+    path: str = "/",
+    process_id: Optional[str] = None,
+) -> float:
+    """
+    Wait until a port in the sandbox is ready, and return the time it took.
+
+    The probe loop runs inside the sandbox with a growing delay between
+    attempts, so it costs one request per _MAX_WAIT seconds of waiting
+    rather than one per attempt.
+    """
+    if protocol not in ("tcp", "http"):
+        raise ValueError(f"Unsupported protocol {protocol!r}, expected 'tcp' or 'http'")
+    pid = 0
+    if process_id is not None:
+        process = get_process(sandbox, process_id)
+        if process.status != "running":
+            raise SandboxError(
+                f"Process {process_id} exited with code {process.exit_code} "
+                f"before port {port} was ready"
+            )
+        pid = process.pid or 0
+    client = sandbox._get_client()
+    start_time = time.time()
+    waited = 0.0
+    while True:
+        remaining = min(_MAX_WAIT, timeout - (time.time() - start_time))
+        if remaining <= 0:
+            raise SandboxTimeoutError(
+                f"Port {port} was not ready within {timeout} seconds"
+            )
+        command = " ".join(
+            shlex.quote(str(arg))
+            for arg in [
+                "python3",
+                "-S",
+                "-c",
+                _PROBE,
+                port,
+                protocol,
+                path,
+                remaining,
+                pid,
+            ]
+        )
+        try:
+            response = client.run(cmd=command, timeout=remaining + 10)
+        except Exception as e:
+            raise SandboxError(f"Failed to probe port {port}: {str(e)}") from e
+        exit_code = response.get("exit_code", 0)
+        if exit_code == 0:
+            return waited + float(response.get("stdout", "").strip() or 0)
+        if exit_code == 3 and process_id is not None:
+            # Only reported when watching a process
+            process = get_process(sandbox, process_id)
+            raise SandboxError(
+                f"Process {process_id} exited with code {process.exit_code} "
+                f"before port {port} was ready"
+            )
+        if exit_code != 124:
+            raise SandboxError(
+                f"Failed to probe port {port}: {response.get('stderr', '').strip()}"
+            )
+        waited += remaining
+
+
+def kill_processes(
+    sandbox: Sandbox,
+    process_ids: Optional[List[str]] = None,
+    status: Optional[str] = "running",
+    command: Optional[str] = None,
+    signal: Union[str, int] = "SIGTERM",
+    grace_period: float = 5.0,
+) -> List[ProcessKillResult]:
+    """
+    Kill the background processes matching all the given filters.
+
+    The processes are listed once, then signalled by a single script running
+    in the sandbox, so the cost does not grow with the number of processes.
+    """
+    if isinstance(signal, int):
+        signal_name = str(signal)
+    else:
+        signal_name = signal.upper()
+        if not signal_name.startswith("SIG"):
+            signal_name = f"SIG{signal_name}"
+        if not signal_name[3:].isalnum():
+            raise ValueError(f"Invalid signal {signal!r}")
+    pattern = re.compile(command) if command is not None else None
+    wanted = set(process_ids) if process_ids is not None else None
+
+    results: List[ProcessKillResult] = []
+    targets = {}
+    seen = set()
+    for process in sandbox._list_processes():
+        seen.add(process.id)
+        if wanted is not None and process.id not in wanted:
+            continue
+        if pattern is not None and not pattern.search(process.command):
+            continue
+        if status is not None and process.status != status and wanted is None:
+            continue
+        if process.status == "running" and process.pid:
+            targets[process.pid] = process
+        else:
+            # Reported when requested by id, or when matching the status
+            results.append(
+                ProcessKillResult(
+                    process.id, process.command, killed=False, error="not running"
+                )
+            )
+    for process_id in process_ids or []:
+        if process_id not in seen:
+            results.append(
+                ProcessKillResult(process_id, "", killed=False, error="not found")
+            )
+    if not targets:
+        return results
+
+    script_args = [signal_name, grace_period, json.dumps(list(targets))]
+    command_line = " ".join(
+        shlex.quote(str(arg)) for arg in ["python3", "-S", "-c", _KILL, *script_args]
+    )
+    client = sandbox._get_client()
+    try:
+        response = client.run(cmd=command_line, timeout=grace_period + 30)
+    except Exception as e:
+        raise SandboxError(f"Failed to kill processes: {str(e)}") from e
+    if response.get("exit_code", 0) != 0:
+        raise SandboxError(
+            f"Failed to kill processes: {response.get('stderr', '').strip()}"
+        )
+    outcome = json.loads(response.get("stdout", "") or "{}")
+    for pid, process in targets.items():
+        entry = outcome.get(str(pid), {})
+        results.append(
+            ProcessKillResult(
+                process.id,
+                process.command,
+                killed=entry.get("killed", False),
+                signal=entry.get("signal"),
+                error=entry.get("error"),
+            )
+        )
+    return results
@@ -0,0 +1,403 @@
+# coding: utf-8
+
+"""
+Cleanup of leaked Koyeb Sandbox apps, services and volumes
+
+Usable as a library (SandboxReaper) or from the command line:
+
+    python -m koyeb.sandbox.reaper --older-than 2h --dry-run
+"""
+
+from __future__ import annotations
+
+import argparse
+import fnmatch
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional, Tuple
+
+from koyeb.api.api.persistent_volumes_api import PersistentVolumesApi
+from koyeb.api.exceptions import ApiException, NotFoundException
+from koyeb.api.models.persistent_volume_status import PersistentVolumeStatus
+from koyeb.api.rate_limit import RateLimiter
+
+from .utils import get_api_client, logger
+
+# Apps created by Sandbox.create are named sandbox-app-<name>-<timestamp>
+APP_PREFIX = "sandbox-app-"
+_APP_NAME = re.compile(r"^sandbox-app-(?P<name>.+)-(?P<timestamp>\d+)$")
+
+# Volumes created by Sandbox.create(mount_path=...) are named sandbox-<name>-<timestamp>
+VOLUME_PREFIX = "sandbox-"
+_VOLUME_NAME = re.compile(r"^sandbox-(?P<name>.+)-(?P<timestamp>\d+)$")
+
+# Already on their way out, never reaped again
+_GONE_STATUSES = ("DELETING", "DELETED")
+
+_DURATION = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([smhd]?)\s*$")
+_DURATION_UNITS = {"": 1, "s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+@dataclass
+class ReapTarget:
+    """App, service or volume selected for deletion."""
+
+    kind: str  # "app", "service" or "volume"
+    id: str
+    name: str
+    status: Optional[str] = None
+    created_at: Optional[datetime] = None
+
+    @property
+    def age(self) -> Optional[float]:
+        """Get the age in seconds"""
+        if self.created_at is None:
+            return None
+        return _age(self.created_at)
+
+
+@dataclass
+class ReapReport:
+    """Result of a reaper run."""
+
+    targets: List[ReapTarget] = field(default_factory=list)
+    deleted: List[ReapTarget] = field(default_factory=list)
+    failed: List[Tuple[ReapTarget, str]] = field(default_factory=list)
+    dry_run: bool = False
+    duration: float = 0.0
+
+    def summary(self) -> str:
+        """Get a one-line summary of the run"""
+        if self.dry_run:
+            return f"{len(self.targets)} sandbox resources would be deleted"
+        return (
+            f"Deleted {len(self.deleted)} of {len(self.targets)} sandbox resources "
+            f"in {self.duration:.1f}s ({len(self.failed)} failed)"
+        )
+
+
+def _age(created_at: datetime) -> float:
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return (datetime.now(timezone.utc) - created_at).total_seconds()
+
+
+def _parse_duration(value: str) -> float:
+    match = _DURATION.match(value)
+    if not match:
+        raise argparse.ArgumentTypeError(
+            f"invalid duration {value!r}, expected e.g. 3600, 30m, 2h or 1d"
+        )
+    return float(match.group(1)) * _DURATION_UNITS[match.group(2)]
+
+
+def _describe(e: Exception) -> str:
+    if isinstance(e, ApiException):
+        return f"{e.status} {e.reason or ''}".strip()
+    return str(e)
+
+
+class SandboxReaper:
+    """
+    Finds and deletes sandbox apps, services and volumes left behind by
+    crashed workers.
+
+    Apps are selected by name prefix, age, status and tag. Services are only
+    considered in the shared apps given with app_ids, for sandboxes created
+    with Sandbox.create(app_id=...). Volumes of sandboxes created with
+    Sandbox.create(mount_path=...) are selected by age and tag once detached
+    (status "DETACHED"): the volumes of the apps deleted by a run are only
+    detached when their services are gone, so the next run reaps them.
+    Deletions run concurrently, bounded by concurrency and by a client-side
+    rate limit on the API requests.
+
+    The API has no tags on apps, services or volumes, so the tag is a glob
+    matched against the sandbox name: the <name> part of
+    sandbox-app-<name>-<timestamp> for apps and of sandbox-<name>-<timestamp>
+    for volumes, and the service name for services in shared apps.
+    """
+
+    def __init__(
+        self,
+        api_token: Optional[str] = None,
+        prefix: str = APP_PREFIX,
+        older_than: float = 3600.0,
+        statuses: Optional[Iterable[str]] = None,
+        tag: Optional[str] = None,
+        app_ids: Optional[Iterable[str]] = None,
+        volumes: bool = True,
+        concurrency: int = 16,
+        rate: float = 10.0,
+        burst: int = 20,
+        host: Optional[str] = None,
+    ) -> None:
+        """
+        Args:
+            api_token: Koyeb API token (if None, will try to get from KOYEB_API_TOKEN env var)
+            prefix: Only apps whose name starts with this prefix
+            older_than: Only resources created at least this many seconds ago
+            statuses: Only resources with one of these statuses (e.g. "UNHEALTHY")
+            tag: Only sandboxes whose name matches this glob (e.g. "ci-*")
+            app_ids: Shared apps whose services are sandboxes to consider
+            volumes: Also consider the detached volumes of sandboxes
+            concurrency: Maximum number of deletions in flight
+            rate: Maximum API requests per second
+            burst: Number of API requests allowed in a burst
+            host: Koyeb API host URL
+        """
+        self.prefix = prefix
+        self.older_than = older_than
+        self.statuses = {s.upper() for s in statuses} if statuses else None
+        self.tag = tag
+        self.app_ids = list(app_ids or [])
+        self.volumes = volumes
+        self.concurrency = concurrency
+        self.apps_api, self.services_api, _, _, _ = get_api_client(
+            api_token, host=host, rate_limiter=RateLimiter(rate=rate, burst=burst)
+        )
+        self.volumes_api = PersistentVolumesApi(self.apps_api.api_client)
+
+    def _matches(self, sandbox_name: str, status, created_at) -> bool:
+        status = getattr(status, "value", status)
+        if status in _GONE_STATUSES:
+            return False
+        if self.statuses is not None and status not in self.statuses:
+            return False
+        if self.tag is not None and not fnmatch.fnmatchcase(sandbox_name, self.tag):
+            return False
+        if created_at is None:
+            return False
+        return _age(created_at) >= self.older_than
+
+    def find(self) -> List[ReapTarget]:
+        """
+        List the sandbox apps and services matching the filters.
+
+        Returns:
+            List[ReapTarget]: Apps, then services of the shared apps, then volumes
+        """
+        targets: List[ReapTarget] = []
+        offset = 0
+        while True:
+            # The name filter narrows the listing, the prefix is checked below
+            apps_reply = self.apps_api.list_apps(
+                limit="100", offset=str(offset), name=self.prefix
+            )
+            apps = apps_reply.apps or []
+            for app in apps:
+                if not app.id or not app.name or not app.name.startswith(self.prefix):
+                    continue
+                match = _APP_NAME.match(app.name)
+                sandbox_name = match.group("name") if match else app.name
+                created_at = app.created_at
+                if created_at is None and match:
+                    created_at = datetime.fromtimestamp(
+                        int(match.group("timestamp")), timezone.utc
+                    )
+                if self._matches(sandbox_name, app.status, created_at):
+                    targets.append(
+                        ReapTarget(
+                            "app",
+                            app.id,
+                            app.name,
+                            getattr(app.status, "value", app.status),
+                            created_at,
+                        )
+                    )
+            offset += len(apps)
+            if not apps or not apps_reply.has_next:
+                break
+
+        for app_id in self.app_ids:
+            offset = 0
+            while True:
+                services_reply = self.services_api.list_services(
+                    app_id=app_id, limit="100", offset=str(offset)
+                )
+                services = services_reply.services or []
+                for service in services:
+                    if not service.id or not service.name:
+                        continue
+                    if self._matches(service.name, service.status, service.created_at):
+                        targets.append(
+                            ReapTarget(
+                                "service",
+                                service.id,
+                                service.name,
+                                getattr(service.status, "value", service.status),
+                                service.created_at,
+                            )
+                        )
+                offset += len(services)
+                if not services or not services_reply.has_next:
+                    break
+
+        if self.volumes:
+            targets.extend(self._find_volumes())
+        return targets
+
+    def _find_volumes(self) -> List[ReapTarget]:
+        targets: List[ReapTarget] = []
+        offset = 0
+        while True:
+            volumes_reply = self.volumes_api.list_persistent_volumes(
+                limit="100", offset=str(offset), name=VOLUME_PREFIX
+            )
+            volumes = volumes_reply.volumes or []
+            for volume in volumes:
+                if not volume.id or not volume.name:
+                    continue
+                match = _VOLUME_NAME.match(volume.name)
+                # Attached volumes go away with their sandbox
+                if (
+                    match is None
+                    or volume.service_id
+                    or volume.status
+                    != PersistentVolumeStatus.PERSISTENT_VOLUME_STATUS_DETACHED
+                ):
+                    continue
+                created_at = volume.created_at or datetime.fromtimestamp(
+                    int(match.group("timestamp")), timezone.utc
+                )
+                if self._matches(match.group("name"), "DETACHED", created_at):
+                    targets.append(
+                        ReapTarget(
+                            "volume", volume.id, volume.name, "DETACHED", created_at
+                        )
+                    )
+            offset += len(volumes)
+            if not volumes or not volumes_reply.has_next:
+                break
+        return targets
+
+    def _delete(self, target: ReapTarget) -> Optional[str]:
+        try:
+            if target.kind == "app":
+                self.apps_api.delete_app(target.id)
+            elif target.kind == "volume":
+                self.volumes_api.delete_persistent_volume(target.id)
+            else:
+                self.services_api.delete_service(target.id)
+        except NotFoundException:
+            # Deleted in the meantime
+            pass
+        except Exception as e:
+            return _describe(e)
+        return None
+
+    def reap(
+        self,
+        dry_run: bool = False,
+        targets: Optional[List[ReapTarget]] = None,
+    ) -> ReapReport:
+        """
+        Delete the sandbox apps and services matching the filters.
+
+        Args:
+            dry_run: Only report what would be deleted
+            targets: Resources to delete (default: find())
+
+        Returns:
+            ReapReport: Selected, deleted and failed resources
+        """
+        start_time = time.time()
+        report = ReapReport(
+            targets=list(targets) if targets is not None else self.find(),
+            dry_run=dry_run,
+        )
+        if not dry_run and report.targets:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+                for target, error in zip(
+                    report.targets, pool.map(self._delete, report.targets)
+                ):
+                    if error is None:
+                        report.deleted.append(target)
+                    else:
+                        logger.warning(
+                            f"Failed to delete {target.kind} {target.name}: {error}"
+                        )
+                        report.failed.append((target, error))
+        report.duration = time.time() - start_time
+        return report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command line entry point, returns the exit status."""
+    parser = argparse.ArgumentParser(
+        prog="koyeb-sandbox-reaper",
+        description="Delete sandbox apps, services and volumes leaked by crashed workers.",
+    )
+    parser.add_argument(
+        "--api-token", help="Koyeb API token (default: $KOYEB_API_TOKEN)"
+    )
+    parser.add_argument(
+        "--prefix", default=APP_PREFIX, help=f"app name prefix (default: {APP_PREFIX})"
+    )
+    parser.add_argument(
+        "--older-than",
+        type=_parse_duration,
+        default="1h",
+        help="minimum age, in seconds or with a unit: 30m, 2h, 1d (default: 1h)",
+    )
+    parser.add_argument(
+        "--status",
+        action="append",
+        dest="statuses",
+        help="only resources with this status, repeatable (e.g. UNHEALTHY)",
+    )
+    parser.add_argument(
+        "--tag", help="glob matched against sandbox names (e.g. 'ci-*')"
+    )
+    parser.add_argument(
+        "--app-id",
+        action="append",
+        dest="app_ids",
+        help="shared app whose sandbox services are also reaped, repeatable",
+    )
+    parser.add_argument(
+        "--no-volumes",
+        action="store_false",
+        dest="volumes",
+        help="do not reap the detached volumes of sandboxes",
+    )
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument(
+        "--rate", type=float, default=10.0, help="API requests per second"
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true", help="only list what would be deleted"
+    )
+    args = parser.parse_args(argv)
+
+    try:
+        reaper = SandboxReaper(
+            api_token=args.api_token,
+            prefix=args.prefix,
+            older_than=args.older_than,
+            statuses=args.statuses,
+            tag=args.tag,
+            app_ids=args.app_ids,
+            volumes=args.volumes,
+            concurrency=args.concurrency,
+            rate=args.rate,
+        )
+        report = reaper.reap(dry_run=args.dry_run)
+    except (ValueError, ApiException) as e:
+        print(f"error: {_describe(e)}", file=sys.stderr)
+        return 2
+
+    for target in report.targets:
+        age = f"{target.age / 3600:.1f}h" if target.age is not None else "?"
+        print(f"{target.kind:8} {target.id}  {target.name}  {target.status}  {age}")
+    for target, error in report.failed:
+        print(f"failed: {target.kind} {target.name}: {error}", file=sys.stderr)
+    print(report.summary())
+    return 1 if report.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,190 @@
+# coding: utf-8
+
+"""
+Latency-based region selection for Koyeb Sandbox
+"""
+
+from __future__ import annotations
+
+import socket
+import ssl
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set, Tuple
+
+from koyeb.api.api.catalog_datacenters_api import CatalogDatacentersApi
+from koyeb.api.api.catalog_regions_api import CatalogRegionsApi
+
+from .utils import get_api_client, logger
+
+DEFAULT_REGION_TTL = 600.0
+
+# Ranking of the regions by instance type and volume support, with its expiry time
+_cache: Dict[Tuple[str, bool], Tuple[float, List["RegionLatency"]]] = {}
+_cache_lock = threading.Lock()
+
+
+@dataclass
+class RegionLatency:
+    """Measured round-trip time to a region."""
+
+    region: str
+    rtt: float  # Seconds for a TCP connect and TLS handshake
+    datacenter: str  # Domain of the fastest datacenter of the region
+
+
+def probe_rtt(
+    domain: str, port: int = 443, attempts: int = 3, timeout: float = 2.0
+) -> Optional[float]:
+    """
+    Measure the TCP connect and TLS handshake time to an endpoint.
+
+    Args:
+        domain: Host to connect to
+        port: TLS port
+        attempts: Number of handshakes, the fastest one is kept
+        timeout: Maximum seconds per handshake
+
+    Returns:
+        Optional[float]: Seconds of the fastest handshake, None if none succeeded
+    """
+    context = ssl.create_default_context()
+    best = None
+    for _ in range(attempts):
+        start = time.perf_counter()
+        try:
+            with socket.create_connection((domain, port), timeout=timeout) as sock:
+                with context.wrap_socket(sock, server_hostname=domain):
+                    pass
+        except (OSError, ssl.SSLError) as e:
+            logger.debug(f"Handshake with {domain} failed: {e}")
+            continue
+        rtt = time.perf_counter() - start
+        best = rtt if best is None else min(best, rtt)
+    return best
+
+
+def _candidate_regions(
+    api_token: Optional[str], instance_type: str, volumes: bool
+) -> Dict[str, Set[str]]:
+    """Get the datacenter domains of the regions offering instance_type."""
+    _, _, _, catalog_instances_api, _ = get_api_client(api_token)
+    api_client = catalog_instances_api.api_client
+
+    offered = None
+    instances = (
+        catalog_instances_api.list_catalog_instances(id=instance_type).instances or []
+    )
+    for instance in instances:
+        if instance_type == instance.id or instance_type in (instance.aliases or []):
+            offered = set(instance.regions or [])
+            break
+
+    datacenters = CatalogDatacentersApi(api_client).list_datacenters().datacenters or []
+    domains = {dc.id: dc.domain for dc in datacenters if dc.id and dc.domain}
+    members: Dict[str, Set[str]] = {}
+    for dc in datacenters:
+        if not dc.id:
+            continue
+        for region_id in dc.regions or []:
+            members.setdefault(region_id, set()).add(dc.id)
+
+    candidates: Dict[str, Set[str]] = {}
+    regions = CatalogRegionsApi(api_client).list_regions(limit="100").regions or []
+    for region in regions:
+        if not region.id or region.status not in (None, "AVAILABLE"):
+            continue
+        if volumes and region.volumes_enabled is False:
+            continue
+        if offered is not None:
+            if region.id not in offered:
+                continue
+        elif region.instances is not None and instance_type not in region.instances:
+            continue
+        dc_ids = set(region.datacenters or []) | members.get(region.id, set())
+        region_domains = {domains[dc] for dc in dc_ids if dc in domains}
+        if region_domains:
+            candidates[region.id] = region_domains
+    return candidates
+
+
+def rank_regions(
+    instance_type: str = "micro",
+    api_token: Optional[str] = None,
+    ttl: float = DEFAULT_REGION_TTL,
+    refresh: bool = False,
+    volumes: bool = False,
+) -> List[RegionLatency]:
+    """
+    Rank the regions offering an instance type by round-trip time.
+
+    The datacenters of all candidate regions are probed concurrently, and
+    the ranking is cached per instance type for ttl seconds.
+
+    Args:
+        instance_type: Instance type the regions must offer
+        api_token: Koyeb API token (if None, will try to get from KOYEB_API_TOKEN env var)
+        ttl: Seconds a ranking is reused for
+        refresh: Probe again even if a cached ranking is available
+        volumes: Only regions supporting persistent volumes
+
+    Returns:
+        List[RegionLatency]: Reachable regions, fastest first
+    """
+    now = time.time()
+    key = (instance_type, volumes)
+    with _cache_lock:
+        cached = _cache.get(key)
+    if cached and not refresh and cached[0] > now:
+        return list(cached[1])
+
+    candidates = _candidate_regions(api_token, instance_type, volumes)
+    domains = sorted(set().union(*candidates.values())) if candidates else []
+    with ThreadPoolExecutor(max_workers=max(1, min(16, len(domains)))) as pool:
+        rtts = dict(zip(domains, pool.map(probe_rtt, domains)))
+
+    ranking = []
+    for region, region_domains in candidates.items():
+        reachable: List[Tuple[float, str]] = []
+        for domain in region_domains:
+            domain_rtt = rtts[domain]
+            if domain_rtt is not None:
+                reachable.append((domain_rtt, domain))
+        if reachable:
+            rtt, domain = min(reachable)
+            ranking.append(RegionLatency(region=region, rtt=rtt, datacenter=domain))
+    ranking.sort(key=lambda latency: (latency.rtt, latency.region))
+
+    with _cache_lock:
+        _cache[key] = (time.time() + ttl, ranking)
+    return list(ranking)
+
+
+def select_region(
+    instance_type: str = "micro",
+    api_token: Optional[str] = None,
+    ttl: float = DEFAULT_REGION_TTL,
+    volumes: bool = False,
+) -> Optional[str]:
+    """
+    Get the lowest-latency region offering an instance type.
+
+    Returns:
+        Optional[str]: The region, None if the regions could not be listed or probed
+    """
+    try:
+        ranking = rank_regions(
+            instance_type, api_token=api_token, ttl=ttl, volumes=volumes
+        )
+    except Exception as e:
+        logger.warning(f"Could not rank regions, using the default region: {e}")
+        return None
+    if not ranking:
+        logger.warning("No region reachable, using the default region")
+        return None
+    logger.debug(
+        "Region RTTs: " + ", ".join(f"{r.region}={r.rtt * 1000:.0f}ms" for r in ranking)
+    )
+    return ranking[0].region
@@ -0,0 +1,486 @@
+# coding: utf-8
+
+"""
+Memoized command results for Koyeb Sandbox instances
+"""
+
+from __future__ import annotations
+
+import base64
+import hashlib
+import json
+import os
+import shlex
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from .exec import CommandResult, CommandStatus
+from .utils import SandboxError, async_wrapper, logger, run_sync_in_executor
+
+if TYPE_CHECKING:
+    from .sandbox import Sandbox
+
+# Prints the content hash of each path, walking directories in name order
+_HASH = r"""
+import hashlib, json, os, sys
+os.chdir(sys.argv[1])
+def digest(path):
+    h = hashlib.sha256()
+    if os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                full = os.path.join(root, name)
+                h.update(os.path.relpath(full, path).encode() + b"\0")
+                h.update(digest(full).encode())
+        return "dir:" + h.hexdigest()
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+    except FileNotFoundError:
+        return "missing"
+    return h.hexdigest()
+print(json.dumps({path: digest(path) for path in sys.argv[2:]}))
+"""
+
+# Prints the base64 content of each file, null for missing files
+_COLLECT = r"""
+import base64, json, os, sys
+os.chdir(sys.argv[1])
+out = {}
+for path in sys.argv[2:]:
+    try:
+        with open(path, "rb") as f:
+            out[path] = base64.b64encode(f.read()).decode()
+    except (FileNotFoundError, IsADirectoryError):
+        out[path] = None
+print(json.dumps(out))
+"""
+
+# Writes files from a JSON file of base64 contents, then removes it
+_RESTORE = r"""
+import base64, json, os, sys
+with open(sys.argv[1]) as f:
+    files = json.load(f)
+os.unlink(sys.argv[1])
+os.chdir(sys.argv[2])
+for path, data in files.items():
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(base64.b64decode(data))
+"""
+
+
+@dataclass
+class CachedCommandResult(CommandResult):
+    """Result of a command run through a CachedExecutor."""
+
+    cached: bool = False  # Replayed from the cache
+    key: str = ""
+    outputs: Dict[str, bytes] = field(default_factory=dict)  # Declared output files
+
+
+@dataclass
+class _Entry:
+    key: str
+    command: str
+    inputs: List[str]
+    result: Dict[str, Any]
+    outputs: Dict[str, bytes]
+
+    @property
+    def size(self) -> int:
+        return (
+            len(self.result.get("stdout", ""))
+            + len(self.result.get("stderr", ""))
+            + sum(len(data) for data in self.outputs.values())
+        )
+
+
+class ResultCache:
+    """
+    LRU store of command results, bounded in entries and bytes.
+
+    Entries are kept in memory, or as files in directory to persist across
+    processes. Either way the most recently used entries are kept.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        max_bytes: int = 256 * 1024 * 1024,
+        directory: Optional[str] = None,
+    ) -> None:
+        """
+        Args:
+            max_entries: Maximum number of results kept
+            max_bytes: Maximum total size of the outputs kept
+            directory: Directory to store the results in (None: in memory)
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # key -> entry in memory, or key -> (command, inputs, size) on disk
+        self._index: "OrderedDict[str, Any]" = OrderedDict()
+        self._bytes = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            self._load_index(directory)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def _path(self, key: str, suffix: str) -> str:
+        if self.directory is None:
+            raise ValueError("The cache is kept in memory only")
+        return os.path.join(self.directory, f"{key}.{suffix}")
+
+    def _load_index(self, directory: str) -> None:
+        metas = []
+        for name in os.listdir(directory):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(directory, name)
+            try:
+                with open(path) as f:
+                    meta = json.load(f)
+                metas.append((os.stat(path).st_mtime, meta))
+            except (OSError, ValueError):
+                continue
+        for _, meta in sorted(metas, key=lambda item: item[0]):
+            self._index[meta["key"]] = (meta["command"], meta["inputs"], meta["size"])
+            self._bytes += meta["size"]
+        self._evict()
+
+    def get(self, key: str) -> Optional[_Entry]:
+        """Get a stored entry, marking it as recently used."""
+        with self._lock:
+            if key not in self._index:
+                self.misses += 1
+                return None
+            self._index.move_to_end(key)
+            entry = self._index[key]
+            if self.directory is None:
+                self.hits += 1
+                return entry
+            command, inputs, _ = entry
+            try:
+                with open(self._path(key, "json")) as f:
+                    meta = json.load(f)
+                with open(self._path(key, "outputs")) as f:
+                    outputs = {
+                        path: base64.b64decode(data)
+                        for path, data in json.load(f).items()
+                    }
+                os.utime(self._path(key, "json"))
+            except (OSError, ValueError):
+                self._remove(key)
+                self.misses += 1
+                return None
+            self.hits += 1
+            return _Entry(key, command, inputs, meta["result"], outputs)
+
+    def put(self, entry: _Entry) -> None:
+        """Store an entry, evicting the least recently used ones over the bounds."""
+        size = entry.size
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if entry.key in self._index:
+                self._remove(entry.key)
+            if self.directory is None:
+                self._index[entry.key] = entry
+            else:
+                # Outputs first, so a readable metadata file means a complete entry
+                with open(self._path(entry.key, "outputs"), "w") as f:
+                    json.dump(
+                        {
+                            path: base64.b64encode(data).decode()
+                            for path, data in entry.outputs.items()
+                        },
+                        f,
+                    )
+                with open(self._path(entry.key, "json"), "w") as f:
+                    json.dump(
+                        {
+                            "key": entry.key,
+                            "command": entry.command,
+                            "inputs": entry.inputs,
+                            "size": size,
+                            "result": entry.result,
+                        },
+                        f,
+                    )
+                self._index[entry.key] = (entry.command, entry.inputs, size)
+            self._bytes += size
+            self._evict()
+
+    def _size(self, key: str) -> int:
+        value = self._index[key]
+        return value.size if isinstance(value, _Entry) else value[2]
+
+    def _remove(self, key: str) -> None:
+        self._bytes -= self._size(key)
+        del self._index[key]
+        if self.directory is not None:
+            for suffix in ("json", "outputs"):
+                try:
+                    os.unlink(self._path(key, suffix))
+                except FileNotFoundError:
+                    pass
+
+    def _evict(self) -> None:
+        while self._index and (
+            len(self._index) > self.max_entries or self._bytes > self.max_bytes
+        ):
+            self._remove(next(iter(self._index)))
+
+    def invalidate(
+        self,
+        key: Optional[str] = None,
+        command: Optional[str] = None,
+        path: Optional[str] = None,
+    ) -> int:
+        """
+        Remove the entries matching all the given criteria.
+
+        Args:
+            key: Cache key of a result
+            command: Command the results were produced by
+            path: Input path the results depend on
+
+        Returns:
+            int: Number of entries removed
+        """
+        if key is None and command is None and path is None:
+            raise ValueError("Pass key, command or path, or use clear()")
+        with self._lock:
+            matches = []
+            for entry_key, value in self._index.items():
+                entry_command, inputs = (
+                    (value.command, value.inputs)
+                    if isinstance(value, _Entry)
+                    else value[:2]
+                )
+                if key is not None and entry_key != key:
+                    continue
+                if command is not None and entry_command != command:
+                    continue
+                if path is not None and path not in inputs:
+                    continue
+                matches.append(entry_key)
+            for entry_key in matches:
+                self._remove(entry_key)
+            return len(matches)
+
+    def clear(self) -> None:
+        """Remove all the entries."""
+        with self._lock:
+            for key in list(self._index):
+                self._remove(key)
+
+
+class CachedExecutor:
+    """
+    Runs commands in a sandbox, replaying the stored results of identical runs.
+
+    A run is identified by its command, cwd, env, the content of its
+    declared inputs and the paths of its declared outputs. On a hit the
+    stored result and output files are returned without running anything;
+    the sandbox is only contacted to hash the inputs, if any are declared,
+    and to write the outputs back if restore_outputs is set.
+
+    Only use it for deterministic commands.
+
+    Example:
+        >>> cache = ResultCache(directory="/tmp/koyeb-results")
+        >>> run = CachedExecutor(sandbox, cache)
+        >>> result = run("gcc -O2 -o app main.c", cwd="/src",
+        ...              inputs=["main.c"], outputs=["app"])
+        >>> result.cached, len(result.outputs["app"])
+        (False, 16696)
+    """
+
+    def __init__(
+        self, sandbox: Sandbox, cache: ResultCache, namespace: str = ""
+    ) -> None:
+        """
+        Args:
+            sandbox: Sandbox running the commands
+            cache: Store of the results, can be shared by executors
+            namespace: Extra key component, e.g. the image the sandbox runs
+        """
+        self.sandbox = sandbox
+        self.cache = cache
+        self.namespace = namespace
+
+    def _script(self, script: str, args: List[str], timeout: float) -> Any:
+        command = " ".join(
+            shlex.quote(arg) for arg in ["python3", "-S", "-c", script, *args]
+        )
+        try:
+            response = self.sandbox._get_client().run(cmd=command, timeout=timeout)
+        except Exception as e:
+            raise SandboxError(f"Failed to run cache helper: {str(e)}") from e
+        if response.get("exit_code", 0) != 0:
+            raise SandboxError(
+                f"Failed to run cache helper: {response.get('stderr', '').strip()}"
+            )
+        return json.loads(response.get("stdout", "") or "null")
+
+    def key(
+        self,
+        command: str,
+        cwd: Optional[str] = None,
+        env: Optional[Dict[str, str]] = None,
+        inputs: Optional[List[str]] = None,
+        outputs: Optional[List[str]] = None,
+    ) -> str:
+        """
+        Compute the cache key of a run, hashing the inputs in the sandbox.
+
+        Returns:
+            str: Hex digest identifying the run
+        """
+        hashes = (
+            self._script(_HASH, [cwd or ".", *inputs], timeout=60) if inputs else {}
+        )
+        spec = [
+            self.namespace,
+            command,
+            cwd,
+            sorted((env or {}).items()),
+            sorted(hashes.items()),
+            sorted(outputs or []),
+        ]
+        return hashlib.sha256(json.dumps(spec).encode()).hexdigest()
+
+    def __call__(
+        self,
+        command: str,
+        cwd: Optional[str] = None,
+        env: Optional[Dict[str, str]] = None,
+        timeout: int = 30,
+        inputs: Optional[List[str]] = None,
+        outputs: Optional[List[str]] = None,
+        restore_outputs: bool = False,
+        cache_failures: bool = False,
+    ) -> CachedCommandResult:
+        """
+        Run a command, or replay its stored result.
+
+        Args:
+            command: Command to execute
+            cwd: Working directory for the command
+            env: Environment variables for the command
+            timeout: Command timeout in seconds
+            inputs: Files and directories the result depends on, relative to cwd
+            outputs: Files produced by the command to store, relative to cwd
+            restore_outputs: On a hit, also write the outputs into the sandbox
+            cache_failures: Also store results with a non-zero exit code
+
+        Returns:
+            CachedCommandResult: Result, with cached set on hits and the
+                content of the declared outputs
+
+        Raises:
+            SandboxError: If the command cannot be run or the inputs hashed
+        """
+        inputs = list(inputs or [])
+        outputs = list(outputs or [])
+        key = self.key(command, cwd=cwd, env=env, inputs=inputs, outputs=outputs)
+
+        entry = self.cache.get(key)
+        if entry is not None:
+            if restore_outputs and entry.outputs:
+                self._restore(entry.outputs, cwd)
+            stored = dict(entry.result, status=CommandStatus(entry.result["status"]))
+            return CachedCommandResult(
+                **stored, cached=True, key=key, outputs=dict(entry.outputs)
+            )
+
+        # Unlike exec(), transport errors are raised so they are never stored
+        start_time = time.time()
+        try:
+            response = self.sandbox._get_client().run(
+                cmd=command, cwd=cwd, env=env, timeout=float(timeout)
+            )
+        except Exception as e:
+            raise SandboxError(f"Command execution failed: {str(e)}") from e
+        exit_code = response.get("exit_code", 0)
+        result = CommandResult(
+            stdout=response.get("stdout", ""),
+            stderr=response.get("stderr", ""),
+            exit_code=exit_code,
+            status=CommandStatus.FINISHED if exit_code == 0 else CommandStatus.FAILED,
+            duration=time.time() - start_time,
+            command=command,
+        )
+
+        files: Dict[str, bytes] = {}
+        store = exit_code == 0 or cache_failures
+        if store and outputs:
+            collected = self._script(_COLLECT, [cwd or ".", *outputs], timeout=120)
+            missing = [path for path, data in collected.items() if data is None]
+            if missing:
+                logger.debug(f"Not caching {command!r}, missing outputs: {missing}")
+                store = False
+            else:
+                files = {
+                    path: base64.b64decode(data) for path, data in collected.items()
+                }
+        if store:
+            self.cache.put(_Entry(key, command, inputs, asdict(result), files))
+        return CachedCommandResult(**asdict(result), key=key, outputs=files)
+
+    def _restore(self, files: Dict[str, bytes], cwd: Optional[str]) -> None:
+        client = self.sandbox._get_client()
+        staging = f"/tmp/koyeb-restore-{os.urandom(8).hex()}.json"
+        payload = json.dumps(
+            {path: base64.b64encode(data).decode() for path, data in files.items()}
+        )
+        response = client.write_file(staging, payload)
+        if response.get("error"):
+            raise SandboxError(f"Failed to restore outputs: {response['error']}")
+        command = " ".join(
+            shlex.quote(arg)
+            for arg in ["python3", "-S", "-c", _RESTORE, staging, cwd or "."]
+        )
+        response = client.run(cmd=command, timeout=120)
+        if response.get("exit_code", 0) != 0:
+            raise SandboxError(
+                f"Failed to restore outputs: {response.get('stderr', '').strip()}"
+            )
+
+
+class AsyncCachedExecutor(CachedExecutor):
+    """
+    Async memoizing command executor.
+    Inherits from CachedExecutor and provides an async wrapper for running commands.
+    """
+
+    async def _run_sync(self, method, *args, **kwargs):
+        return await run_sync_in_executor(method, *args, **kwargs)
+
+    @async_wrapper("__call__")
+    async def __call__(
+        self,
+        command: str,
+        cwd: Optional[str] = None,
+        env: Optional[Dict[str, str]] = None,
+        timeout: int = 30,
+        inputs: Optional[List[str]] = None,
+        outputs: Optional[List[str]] = None,
+        restore_outputs: bool = False,
+        cache_failures: bool = False,
+    ) -> CachedCommandResult:
+        """Run a command, or replay its stored result, asynchronously."""
+        raise NotImplementedError  # Implemented by async_wrapper
@@ -9,16 +9,29 @@ from __future__ import annotations
 import asyncio
 import os
 import secrets
+import threading
 import time
-from dataclasses import dataclass
-from typing import TYPE_CHECKING, Dict, List, Optional
+from dataclasses import asdict, dataclass
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncIterator,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Union,
+)
 from datetime import datetime
 
 from koyeb.api.api.deployments_api import DeploymentsApi
 from koyeb.api.exceptions import ApiException, NotFoundException
 from koyeb.api.models.create_app import CreateApp, AppLifeCycle
 from koyeb.api.models.create_service import CreateService, ServiceLifeCycle
+from koyeb.api.models.deployment_volume import DeploymentVolume
 from koyeb.api.models.update_service import UpdateService
+from koyeb.api.rate_limit import RateLimiter
 
 from .utils import (
     DEFAULT_INSTANCE_WAIT_TIMEOUT,
@@ -41,6 +54,14 @@ if TYPE_CHECKING:
     from .exec import AsyncSandboxExecutor, SandboxExecutor
     from .executor_client import SandboxClient
     from .filesystem import AsyncSandboxFilesystem, SandboxFilesystem
+    from .forward import PortForward
+    from .interpreter import AsyncInterpreter, Interpreter
+    from .layers import InstallResult, LayerCache
+    from .metrics import ResourceSample, ResourceUsage
+    from .processes import ProcessKillResult, ProcessOutput
+    from .shell import AsyncShell, Shell
+    from .snapshots import SandboxSnapshot
+    from .stdin import StdinSource, StdinWriter
 
 
 @dataclass
@@ -69,6 +90,34 @@ class ExposedPort:
         return f"ExposedPort(port={self.port}, exposed_at='{self.exposed_at}')"
 
 
+@dataclass
+class SandboxRoute:
+    """Routing state of a sandbox, cached on its handle to avoid API lookups."""
+
+    domain: Optional[str] = None  # Public domain of the sandbox app
+    deployment_id: Optional[str] = None
+    instance_id: Optional[str] = None
+    tcp_proxy_host: Optional[str] = None
+    tcp_proxy_port: Optional[int] = None
+
+    @property
+    def url(self) -> Optional[str]:
+        """Get the executor URL of the sandbox"""
+        if not self.domain:
+            return None
+        return f"https://{self.domain}/koyeb-sandbox"
+
+
+def _set_tcp_proxy(route: SandboxRoute, proxy_ports) -> bool:
+    """Store the TCP proxy of the executor port (3031) in the route, if any."""
+    for proxy_port in proxy_ports or []:
+        if proxy_port.port == 3031 and proxy_port.host and proxy_port.public_port:
+            route.tcp_proxy_host = proxy_port.host
+            route.tcp_proxy_port = proxy_port.public_port
+            return True
+    return False
+
+
 class Sandbox:
     """
     Synchronous sandbox for running code on Koyeb infrastructure.
@@ -83,6 +132,8 @@ class Sandbox:
         name: Optional[str] = None,
         api_token: Optional[str] = None,
         sandbox_secret: Optional[str] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        route: Optional[SandboxRoute] = None,
     ):
         self.sandbox_id = sandbox_id
         self.app_id = app_id
@@ -90,9 +141,23 @@ class Sandbox:
         self.name = name
         self.api_token = api_token
         self.sandbox_secret = sandbox_secret
+        # Optional limiter shared by the API and executor clients of this handle
+        self.rate_limiter = rate_limiter
+        # Filled from the creation responses, then by lookups on cache misses
+        self.route = route or SandboxRoute()
         self._created_at = time.time()
-        self._sandbox_url = None
+        # Time of the last response from the sandbox to any client of this handle
+        self._last_used_at = 0.0
+        self._sandbox_url: Optional[str] = None
         self._client = None
+        # Log token of the processes launched with capture_output=True
+        self._process_logs: Dict[str, str] = {}
+        # Port bound to the TCP proxy through this handle
+        self._exposed_port: Optional[int] = None
+        # Stdin writers of the processes launched with stdin
+        self._process_stdin: Dict[str, "StdinWriter"] = {}
+        # Volume created for the sandbox with mount_path, deleted with it
+        self._volume_id: Optional[str] = None
 
     @property
     def id(self) -> str:
@@ -119,6 +184,10 @@ class Sandbox:
         delete_after_delay: int = 0,
         delete_after_inactivity_delay: int = 0,
         app_id: Optional[str] = None,
+        restore_from: Optional[Union[str, "SandboxSnapshot"]] = None,
+        mount_path: Optional[str] = None,
+        volume_size: int = 10,
+        rate_limiter: Optional[RateLimiter] = None,
     ) -> Sandbox:
         """
             Create a new sandbox instance.
@@ -132,7 +201,9 @@ class Sandbox:
                     If None, defaults to "http".
                     If provided, must be one of "http" or "http2".
                 env: Environment variables
-                region: Region to deploy to (default: "na")
+                region: Region to deploy to (default: "na"). "auto" picks the region offering
+                    instance_type with the lowest TCP/TLS handshake time from this host,
+                    probed once and cached for 10 minutes.
                 api_token: Koyeb API token (if None, will try to get from KOYEB_API_TOKEN env var)
                 timeout: Timeout for sandbox creation in seconds
                 idle_timeout: Sleep timeout in seconds. Behavior depends on _experimental_enable_light_sleep:
@@ -151,6 +222,15 @@ class Sandbox:
                 delete_after_sleep: If >0, automatically delete the sandbox if service sleeps due to inactivity
                     after this many seconds.
                 app_id: If provided, create the sandbox service in an existing app instead of creating a new one.
+                restore_from: Snapshot (or snapshot ID) whose content pre-populates the volume
+                    mounted at mount_path, see checkpoint(). The sandbox is created in the
+                    snapshot's region unless region is given.
+                mount_path: If provided, mount a persistent volume at this path, which
+                    checkpoint() can then snapshot. Defaults to the checkpointed path when
+                    restore_from is a SandboxSnapshot.
+                volume_size: Maximum size of the volume in GB (default: 10)
+                rate_limiter: Optional limiter shared by the API and executor clients
+                    of the sandbox
 
         Returns:
                 Sandbox: A new Sandbox instance
@@ -168,6 +248,10 @@ class Sandbox:
             ...     image="ghcr.io/myorg/myimage:latest",
             ...     registry_secret="my-ghcr-secret"
             ... )
+
+            >>> # Boot from the state of another sandbox
+            >>> snapshot = sandbox.checkpoint("/workspace")
+            >>> clone = Sandbox.create(restore_from=snapshot.id, mount_path="/workspace")
         """
         if api_token is None:
             api_token = os.getenv("KOYEB_API_TOKEN")
@@ -176,6 +260,11 @@ class Sandbox:
                     "API token is required. Set KOYEB_API_TOKEN environment variable or pass api_token parameter"
                 )
 
+        if mount_path is None and restore_from is not None:
+            mount_path = getattr(restore_from, "path", None)
+            if mount_path is None:
+                raise ValueError("mount_path is required to restore a snapshot")
+
         sandbox = cls._create_sync(
             name=name,
             image=image,
@@ -193,6 +282,10 @@ class Sandbox:
             delete_after_delay=delete_after_delay,
             delete_after_inactivity_delay=delete_after_inactivity_delay,
             app_id=app_id,
+            restore_from=restore_from,
+            mount_path=mount_path,
+            volume_size=volume_size,
+            rate_limiter=rate_limiter,
         )
 
         if wait_ready:
@@ -225,6 +318,10 @@ class Sandbox:
         delete_after_delay: int = 0,
         delete_after_inactivity_delay: int = 0,
         app_id: Optional[str] = None,
+        restore_from: Optional[Union[str, "SandboxSnapshot"]] = None,
+        mount_path: Optional[str] = None,
+        volume_size: int = 10,
+        rate_limiter: Optional[RateLimiter] = None,
     ) -> Sandbox:
         """
         Synchronous creation method that returns creation parameters.
@@ -232,7 +329,9 @@ class Sandbox:
         """
 
         start = time.time()
-        apps_api, services_api, _, _, _ = get_api_client(api_token)
+        apps_api, services_api, _, _, _ = get_api_client(
+            api_token, rate_limiter=rate_limiter
+        )
         print(datetime.now().strftime("%H:%M:%S.%f"), " -> get client time", time.time() - start)
 
         # Always create routes (ports are always exposed, default to "http")
@@ -246,95 +345,170 @@ class Sandbox:
             env = {}
         env["SANDBOX_SECRET"] = sandbox_secret
 
-        # Use provided app_id or create a new app
-        if app_id is None:
-            start = time.time()
-            app_name = f"sandbox-app-{name}-{int(time.time())}"
-            app_response = apps_api.create_app(
-                app=CreateApp(
-                    name=app_name, life_cycle=AppLifeCycle(delete_when_empty=True)
+        if region == "auto":
+            # A restored volume stays in the region of its snapshot
+            if restore_from is None:
+                from .regions import select_region
+
+                region = select_region(
+                    instance_type, api_token=api_token, volumes=mount_path is not None
                 )
+                logger.debug(f"Selected region {region}")
+            else:
+                region = None
+
+        # Create the volume first, its region pins the sandbox's
+        volumes = None
+        volume_id: Optional[str] = None
+        if mount_path is not None:
+            from .snapshots import SandboxSnapshot, create_volume
+
+            snapshot_id = (
+                restore_from.id
+                if isinstance(restore_from, SandboxSnapshot)
+                else restore_from
             )
-            app_id = app_response.app.id
-            print(datetime.now().strftime("%H:%M:%S.%f"),  "-> create app", time.time() - start)
-
-        env_vars = build_env_vars(env)
-        docker_source = create_docker_source(
-            image, [], privileged=privileged, image_registry_secret=registry_secret
-        )
+            volume_id, region = create_volume(
+                apps_api.api_client,
+                name=f"sandbox-{name}-{int(time.time())}",
+                region=region,
+                size=volume_size,
+                snapshot_id=snapshot_id,
+                timeout=timeout,
+            )
+            volumes = [DeploymentVolume(id=volume_id, path=mount_path)]
 
-        deployment_definition = create_deployment_definition(
-            name=name,
-            docker_source=docker_source,
-            env_vars=env_vars,
-            instance_type=instance_type,
-            exposed_port_protocol=exposed_port_protocol,
-            region=region,
-            routes=routes,
-            idle_timeout=idle_timeout,
-            enable_tcp_proxy=enable_tcp_proxy,
-            _experimental_enable_light_sleep=_experimental_enable_light_sleep,
-        )
+        service_id = None
+        try:
+            # Use provided app_id or create a new app
+            domain = None
+            if app_id is None:
+                start = time.time()
+                app_name = f"sandbox-app-{name}-{int(time.time())}"
+                app_response = apps_api.create_app(
+                    app=CreateApp(
+                        name=app_name, life_cycle=AppLifeCycle(delete_when_empty=True)
+                    )
+                )
+                app_id = app_response.app.id
+                if app_response.app and app_response.app.domains:
+                    domain = app_response.app.domains[0].name
+                print(datetime.now().strftime("%H:%M:%S.%f"),  "-> create app", time.time() - start)
+
+            env_vars = build_env_vars(env)
+            docker_source = create_docker_source(
+                image, [], privileged=privileged, image_registry_secret=registry_secret
+            )
 
-        service_life_cycle = ServiceLifeCycle(
-            delete_after_create=delete_after_delay,
-            delete_after_sleep=delete_after_inactivity_delay,
-        )
-        create_service = CreateService(
-            app_id=app_id,
-            definition=deployment_definition,
-            life_cycle=service_life_cycle,
-        )
-        start = time.time()
-        service_response = services_api.create_service(service=create_service)
-        print(datetime.now().strftime("%H:%M:%S.%f"), " -> create service", time.time() - start)
-        service_id = service_response.service.id
-        deployment_id = service_response.service.latest_deployment_id
+            deployment_definition = create_deployment_definition(
+                name=name,
+                docker_source=docker_source,
+                env_vars=env_vars,
+                instance_type=instance_type,
+                exposed_port_protocol=exposed_port_protocol,
+                region=region,
+                routes=routes,
+                idle_timeout=idle_timeout,
+                enable_tcp_proxy=enable_tcp_proxy,
+                _experimental_enable_light_sleep=_experimental_enable_light_sleep,
+                volumes=volumes,
+            )
 
-        deployments_api = DeploymentsApi(services_api.api_client)
+            service_life_cycle = ServiceLifeCycle(
+                delete_after_create=delete_after_delay,
+                delete_after_sleep=delete_after_inactivity_delay,
+            )
+            create_service = CreateService(
+                app_id=app_id,
+                definition=deployment_definition,
+                life_cycle=service_life_cycle,
+            )
+            start = time.time()
+            service_response = services_api.create_service(service=create_service)
+            print(datetime.now().strftime("%H:%M:%S.%f"), " -> create service", time.time() - start)
+            service_id = service_response.service.id
+            deployment_id = service_response.service.latest_deployment_id
 
-        max_wait = min(timeout // 2, 60) if timeout > 60 else timeout
-        wait_interval = 0.5
-        start_time = time.time()
+            deployments_api = DeploymentsApi(services_api.api_client)
 
-        start = time.time()
-        while time.time() - start_time < max_wait:
-            try:
-                scaling_response = deployments_api.get_deployment_scaling(
-                    id=deployment_id
-                )
+            max_wait = min(timeout // 2, 60) if timeout > 60 else timeout
+            wait_interval = 0.5
+            start_time = time.time()
 
-                if scaling_response.replicas and scaling_response.replicas[0].instances:
-                    instance_id = scaling_response.replicas[0].instances[0].id
-                    break
-                else:
-                    logger.debug(
-                        f"Waiting for instances to be created... (elapsed: {time.time() - start_time:.1f}s)"
+            start = time.time()
+            while time.time() - start_time < max_wait:
+                try:
+                    scaling_response = deployments_api.get_deployment_scaling(
+                        id=deployment_id
                     )
+
+                    if (
+                        scaling_response.replicas
+                        and scaling_response.replicas[0].instances
+                    ):
+                        instance_id = scaling_response.replicas[0].instances[0].id
+                        break
+                    else:
+                        logger.debug(
+                            f"Waiting for instances to be created... (elapsed: {time.time() - start_time:.1f}s)"
+                        )
+                        time.sleep(wait_interval)
+                except Exception as e:
+                    logger.warning(f"Error getting deployment scaling: {e}")
                     time.sleep(wait_interval)
-            except Exception as e:
-                logger.warning(f"Error getting deployment scaling: {e}")
-                time.sleep(wait_interval)
-        else:
-            raise SandboxError(
-                f"No instances found in deployment after {max_wait} seconds"
+            else:
+                raise SandboxError(
+                    f"No instances found in deployment after {max_wait} seconds"
+                )
+            print(datetime.now().strftime("%H:%M:%S.%f"), " -> get instance id", time.time() - start)
+
+            sandbox = cls(
+                sandbox_id=name,
+                app_id=app_id,
+                service_id=service_id,
+                name=name,
+                api_token=api_token,
+                sandbox_secret=sandbox_secret,
+                rate_limiter=rate_limiter,
+                route=SandboxRoute(
+                    domain=domain,
+                    deployment_id=deployment_id,
+                    instance_id=instance_id,
+                ),
             )
-        print(datetime.now().strftime("%H:%M:%S.%f"), " -> get instance id", time.time() - start)
+            sandbox._volume_id = volume_id
+            return sandbox
+        except Exception:
+            # Don't leak the volume if the sandbox could not be created
+            if volume_id is not None:
+                cls._cleanup_volume(apps_api, services_api, volume_id, service_id)
+            raise
+
+    @staticmethod
+    def _cleanup_volume(
+        apps_api: Any,
+        services_api: Any,
+        volume_id: str,
+        service_id: Optional[str],
+    ) -> None:
+        """Delete the volume of a sandbox that failed to be created, and its service."""
+        from .snapshots import delete_service_volume, delete_volume
 
-        return cls(
-            sandbox_id=name,
-            app_id=app_id,
-            service_id=service_id,
-            name=name,
-            api_token=api_token,
-            sandbox_secret=sandbox_secret,
-        )
+        if service_id is None:
+            delete_volume(apps_api.api_client, volume_id)
+            return
+        try:
+            services_api.delete_service(id=service_id)
+        except Exception as e:
+            logger.warning(f"Failed to delete service {service_id}: {e}")
+        delete_service_volume(apps_api.api_client, volume_id, service_id)
 
     @classmethod
     def get_from_id(
         cls,
         id: str,
         api_token: Optional[str] = None,
+        rate_limiter: Optional[RateLimiter] = None,
     ) -> "Sandbox":
         """
         Get a sandbox by service ID.
@@ -342,6 +516,7 @@ class Sandbox:
         Args:
             id: Service ID of the sandbox
             api_token: Koyeb API token (if None, will try to get from KOYEB_API_TOKEN env var)
+            rate_limiter: Optional limiter shared by the API and executor clients of the sandbox
 
         Returns:
             Sandbox: The Sandbox instance
@@ -360,7 +535,7 @@ class Sandbox:
         if not id:
             raise ValueError("id is required")
 
-        _, services_api, _, _, _ = get_api_client(api_token)
+        _, services_api, _, _, _ = get_api_client(api_token, rate_limiter=rate_limiter)
         deployments_api = DeploymentsApi(services_api.api_client)
 
         # Get service by ID
@@ -380,20 +555,20 @@ class Sandbox:
         # Get deployment to extract sandbox_secret from env vars
         deployment_id = service.active_deployment_id or service.latest_deployment_id
         sandbox_secret = None
+        route = SandboxRoute(deployment_id=deployment_id)
 
         if deployment_id:
             try:
                 deployment_response = deployments_api.get_deployment(id=deployment_id)
-                if (
-                    deployment_response.deployment
-                    and deployment_response.deployment.definition
-                    and deployment_response.deployment.definition.env
-                ):
+                deployment = deployment_response.deployment
+                if deployment and deployment.definition and deployment.definition.env:
                     # Find SANDBOX_SECRET in env vars
-                    for env_var in deployment_response.deployment.definition.env:
+                    for env_var in deployment.definition.env:
                         if env_var.key == "SANDBOX_SECRET":
                             sandbox_secret = env_var.value
                             break
+                if deployment and deployment.metadata:
+                    _set_tcp_proxy(route, deployment.metadata.proxy_ports)
             except Exception as e:
                 logger.debug(f"Could not get deployment {deployment_id}: {e}")
 
@@ -404,8 +579,69 @@ class Sandbox:
             name=sandbox_name,
             api_token=api_token,
             sandbox_secret=sandbox_secret,
+            rate_limiter=rate_limiter,
+            route=route,
         )
 
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Serialize the handle, including its cached routing state.
+
+        The result contains the sandbox secret, which grants access to the
+        sandbox, but not the API token.
+
+        Returns:
+            Dict[str, Any]: JSON-serializable state, see from_dict()
+        """
+        return {
+            "sandbox_id": self.sandbox_id,
+            "app_id": self.app_id,
+            "service_id": self.service_id,
+            "name": self.name,
+            "sandbox_secret": self.sandbox_secret,
+            "created_at": self._created_at,
+            "route": asdict(self.route),
+            "volume_id": self._volume_id,
+        }
+
+    @classmethod
+    def from_dict(
+        cls,
+        data: Dict[str, Any],
+        api_token: Optional[str] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+    ) -> "Sandbox":
+        """
+        Rehydrate a handle serialized with to_dict(), without any API call.
+
+        Args:
+            data: State returned by to_dict()
+            api_token: Koyeb API token (if None, will try to get from KOYEB_API_TOKEN env var)
+            rate_limiter: Optional limiter shared by the API and executor clients of the handle
+
+        Returns:
+            Sandbox: The Sandbox instance
+
+        Example:
+            >>> state = json.dumps(sandbox.to_dict())
+            >>> # In another process
+            >>> sandbox = Sandbox.from_dict(json.loads(state))
+            >>> sandbox.exec("echo hello")
+        """
+        sandbox = cls(
+            sandbox_id=data["sandbox_id"],
+            app_id=data["app_id"],
+            service_id=data["service_id"],
+            name=data.get("name"),
+            api_token=api_token or os.getenv("KOYEB_API_TOKEN"),
+            sandbox_secret=data.get("sandbox_secret"),
+            rate_limiter=rate_limiter,
+            route=SandboxRoute(**data.get("route", {})),
+        )
+        sandbox._created_at = data.get("created_at", sandbox._created_at)
+        sandbox._volume_id = data.get("volume_id")
+        return sandbox
+
     def wait_ready(
         self,
         timeout: int = DEFAULT_INSTANCE_WAIT_TIMEOUT,
@@ -475,9 +711,21 @@ class Sandbox:
         return False
 
     def delete(self) -> None:
-        """Delete the sandbox instance."""
-        apps_api, _, _, _, _ = get_api_client(self.api_token)
+        """
+        Delete the sandbox instance.
+
+        The volume of a sandbox created with mount_path is deleted too, which
+        waits for the service to be gone first.
+        """
+        apps_api, _, _, _, _ = get_api_client(
+            self.api_token, rate_limiter=self.rate_limiter
+        )
         apps_api.delete_app(self.app_id)
+        if self._volume_id is not None:
+            from .snapshots import delete_service_volume
+
+            delete_service_volume(apps_api.api_client, self._volume_id, self.service_id)
+            self._volume_id = None
 
     def get_domain(self) -> Optional[str]:
         """
@@ -489,21 +737,26 @@ class Sandbox:
         Returns:
             Optional[str]: The domain name or None if unavailable
         """
+        if self.route.domain:
+            return self.route.domain
         try:
             from koyeb.api.exceptions import ApiException, NotFoundException
 
             from .utils import get_api_client
 
-            apps_api, services_api, _, _, _ = get_api_client(self.api_token)
+            apps_api, services_api, _, _, _ = get_api_client(
+                self.api_token, rate_limiter=self.rate_limiter
+            )
             service_response = services_api.get_service(self.service_id)
             service = service_response.service
 
             if service.app_id:
                 app_response = apps_api.get_app(service.app_id)
                 app = app_response.app
-                if hasattr(app, "domains") and app.domains:
+                if app is not None and app.domains:
                     # Use the first public domain
-                    return app.domains[0].name
+                    self.route.domain = app.domains[0].name
+                    return self.route.domain
             return None
         except (NotFoundException, ApiException, Exception):
             return None
@@ -518,16 +771,20 @@ class Sandbox:
         Returns:
             Optional[tuple[str, int]]: A tuple of (host, port) or None if unavailable
         """
+        if self.route.tcp_proxy_host and self.route.tcp_proxy_port:
+            return (self.route.tcp_proxy_host, self.route.tcp_proxy_port)
         try:
             from koyeb.api.exceptions import ApiException, NotFoundException
 
             from .utils import get_api_client
 
-            _, services_api, _, _, _ = get_api_client(self.api_token)
+            _, services_api, _, _, _ = get_api_client(
+                self.api_token, rate_limiter=self.rate_limiter
+            )
             service_response = services_api.get_service(self.service_id)
             service = service_response.service
 
-            if not service.active_deployment_id:
+            if service is None or not service.active_deployment_id:
                 return None
 
             # Get the active deployment
@@ -537,23 +794,44 @@ class Sandbox:
                 service.active_deployment_id
             )
             deployment = deployment_response.deployment
+            self.route.deployment_id = service.active_deployment_id
 
-            if not deployment.metadata or not deployment.metadata.proxy_ports:
+            if (
+                deployment is None
+                or not deployment.metadata
+                or not deployment.metadata.proxy_ports
+            ):
                 return None
 
-            # Find the proxy port for port 3031
-            for proxy_port in deployment.metadata.proxy_ports:
-                if (
-                    proxy_port.port == 3031
-                    and proxy_port.host
-                    and proxy_port.public_port
-                ):
-                    return (proxy_port.host, proxy_port.public_port)
-
+            _set_tcp_proxy(self.route, deployment.metadata.proxy_ports)
+            if self.route.tcp_proxy_host and self.route.tcp_proxy_port:
+                return (self.route.tcp_proxy_host, self.route.tcp_proxy_port)
             return None
         except (NotFoundException, ApiException, Exception):
             return None
 
+    def refresh_route(self) -> SandboxRoute:
+        """
+        Look up the routing state of the sandbox again.
+
+        The cached routing state is only looked up when missing. Requests that
+        fail to connect or get a 404 from the edge look it up again once on their
+        own; call this after a redeployment to switch every client right away.
+
+        Returns:
+            SandboxRoute: The refreshed routing state
+        """
+        previous_url = self.route.url
+        self.route = SandboxRoute()
+        self.get_domain()
+        self.get_tcp_proxy_info()
+        if self.route.url != previous_url:
+            self._sandbox_url = None
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+        return self.route
+
     def _get_sandbox_url(self) -> Optional[str]:
         """
         Internal method to get the sandbox URL for health checks and client initialization.
@@ -563,11 +841,31 @@ class Sandbox:
             Optional[str]: The sandbox URL or None if unavailable
         """
         if self._sandbox_url is None:
-            domain = self.get_domain()
-            if domain:
-                self._sandbox_url = f"https://{domain}/koyeb-sandbox"
+            if self.get_domain():
+                self._sandbox_url = self.route.url
         return self._sandbox_url
 
+    def _resolve_url(self) -> Optional[str]:
+        """
+        Internal method to look up the sandbox URL again after requests to the
+        cached one failed. Passed to the clients as their resolve_url callback.
+
+        Returns:
+            Optional[str]: The sandbox URL or None if unavailable
+        """
+        logger.debug(f"Looking up the route of sandbox {self.name} again")
+        self.route = SandboxRoute()
+        self._sandbox_url = None
+        return self._get_sandbox_url()
+
+    def _record_use(self, at: float) -> None:
+        """
+        Internal method recording a response from the sandbox. Passed to the
+        clients built for this handle as their on_request callback.
+        """
+        if at > self._last_used_at:
+            self._last_used_at = at
+
     def _get_client(self) -> "SandboxClient":  # type: ignore[name-defined]
         """
         Get or create SandboxClient instance with validation.
@@ -580,7 +878,13 @@ class Sandbox:
         """
         if self._client is None:
             sandbox_url = self._get_sandbox_url()
-            self._client = create_sandbox_client(sandbox_url, self.sandbox_secret)
+            self._client = create_sandbox_client(
+                sandbox_url,
+                self.sandbox_secret,
+                rate_limiter=self.rate_limiter,
+                resolve_url=self._resolve_url,
+                on_request=self._record_use,
+            )
         return self._client
 
     def _check_response_error(self, response: Dict, operation: str) -> None:
@@ -610,7 +914,9 @@ class Sandbox:
         try:
             from .executor_client import SandboxClient
 
-            client = SandboxClient(sandbox_url, self.sandbox_secret)
+            client = SandboxClient(
+                sandbox_url, self.sandbox_secret, rate_limiter=self.rate_limiter
+            )
             health_response = client.health()
             if isinstance(health_response, dict):
                 status = health_response.get("status", "").lower()
@@ -667,19 +973,8 @@ class Sandbox:
             'https://app-name-org.koyeb.app'
         """
         validate_port(port)
-        client = self._get_client()
         try:
-            # Always unbind any existing port first
-            try:
-                client.unbind_port()
-            except Exception as e:
-                # Ignore errors when unbinding - it's okay if no port was bound
-                logger.debug(f"Error unbinding existing port (this is okay): {e}")
-                pass
-
-            # Now bind the new port
-            response = client.bind_port(port)
-            self._check_response_error(response, f"expose port {port}")
+            response = self._bind_port(port)
 
             # Get domain for exposed_at
             domain = self.get_domain()
@@ -695,6 +990,23 @@ class Sandbox:
                 raise
             raise SandboxError(f"Failed to expose port {port}: {str(e)}") from e
 
+    def _bind_port(self, port: int) -> Dict[str, Any]:
+        """Bind a port to the TCP proxy, replacing any existing binding."""
+        client = self._get_client()
+        # Always unbind any existing port first
+        try:
+            client.unbind_port()
+        except Exception as e:
+            # Ignore errors when unbinding - it's okay if no port was bound
+            logger.debug(f"Error unbinding existing port (this is okay): {e}")
+            pass
+
+        # Now bind the new port
+        response = client.bind_port(port)
+        self._check_response_error(response, f"expose port {port}")
+        self._exposed_port = port
+        return response
+
     def unexpose_port(self) -> None:
         """
         Unexpose a port from external connections.
@@ -713,13 +1025,51 @@ class Sandbox:
         try:
             response = client.unbind_port()
             self._check_response_error(response, "unexpose port")
+            self._exposed_port = None
         except Exception as e:
             if isinstance(e, SandboxError):
                 raise
             raise SandboxError(f"Failed to unexpose port: {str(e)}") from e
 
+    def forward(
+        self, remote_port: int, local_port: int = 0, host: str = "127.0.0.1"
+    ) -> "PortForward":
+        """
+        Forward a local TCP port to a port inside the sandbox.
+
+        Binds remote_port to the TCP proxy, replacing any exposed port, and
+        relays the connections accepted on the local port to it. The sandbox
+        must be created with enable_tcp_proxy=True.
+
+        Args:
+            remote_port: Port inside the sandbox
+            local_port: Local port to listen on (0: any free port)
+            host: Local address to listen on
+
+        Returns:
+            PortForward: Running forward, with local_port, stats() and close()
+
+        Raises:
+            SandboxError: If the TCP proxy is unavailable or the port cannot be bound
+
+        Example:
+            >>> with sandbox.forward(6379) as fwd:
+            ...     redis.Redis(port=fwd.local_port).ping()
+            True
+        """
+        from .forward import PortForward
+
+        return PortForward(self, remote_port, local_port=local_port, host=host)
+
     def launch_process(
-        self, cmd: str, cwd: Optional[str] = None, env: Optional[Dict[str, str]] = None
+        self,
+        cmd: str,
+        cwd: Optional[str] = None,
+        env: Optional[Dict[str, str]] = None,
+        capture_output: bool = False,
+        ready_port: Optional[int] = None,
+        ready_timeout: float = 60.0,
+        stdin: Optional[Union["StdinSource", bool]] = None,
     ) -> str:
         """
         Launch a background process in the sandbox.
@@ -731,31 +1081,143 @@ class Sandbox:
             cmd: The shell command to execute as a background process
             cwd: Optional working directory for the process
             env: Optional environment variables to set/override for the process
+            capture_output: Write the process output to log files in the sandbox,
+                so it can be read with process_logs()
+            ready_port: Wait until the process accepts TCP connections on this port
+            ready_timeout: Maximum seconds to wait for ready_port
+            stdin: Data for the process's stdin (bytes, str, a file object or an
+                iterator of chunks), streamed from a background thread and closed
+                at the end; or True to write it with write_stdin()
 
         Returns:
             str: The unique process ID (UUID string) that can be used to manage the process
 
         Raises:
-            SandboxError: If the process launch fails
+            SandboxError: If the process launch fails, or it exits before ready_port
+                is ready
+            SandboxTimeoutError: If ready_port is not ready within ready_timeout
 
         Example:
             >>> process_id = sandbox.launch_process("python -u server.py")
             >>> print(f"Started process: {process_id}")
+
+            >>> # Return once the server accepts connections
+            >>> sandbox.launch_process("python -u server.py", ready_port=8080)
+
+            >>> # Feed a worker through its stdin
+            >>> process_id = sandbox.launch_process("python -u worker.py", stdin=True)
+            >>> sandbox.write_stdin(process_id, b"job 1\n")
+            >>> sandbox.close_stdin(process_id)
         """
+        writer = None
+        if stdin is not None and stdin is not False:
+            from .stdin import wrap_stdin
+
+            cmd, writer = wrap_stdin(self, cmd, stdin)
+        token = None
+        if capture_output:
+            from .processes import wrap_command
+
+            cmd, token = wrap_command(cmd)
         client = self._get_client()
         try:
             response = client.start_process(cmd, cwd, env)
             # Check for process ID - if it exists, the process was launched successfully
             process_id = response.get("id")
-            if process_id:
-                return process_id
-            # If no ID, check for explicit error
-            error_msg = response.get("error", response.get("message", "Unknown error"))
-            raise SandboxError(f"Failed to launch process: {error_msg}")
+            if not process_id:
+                # If no ID, check for explicit error
+                error_msg = response.get(
+                    "error", response.get("message", "Unknown error")
+                )
+                raise SandboxError(f"Failed to launch process: {error_msg}")
         except Exception as e:
+            if writer is not None:
+                writer.discard()
             if isinstance(e, SandboxError):
                 raise
             raise SandboxError(f"Failed to launch process: {str(e)}") from e
+        if token:
+            self._process_logs[process_id] = token
+        if writer is not None:
+            self._process_stdin[process_id] = writer
+            if stdin is not True:
+                writer.start(stdin)
+        if ready_port is not None:
+            from .processes import wait_for_port
+
+            wait_for_port(self, ready_port, ready_timeout, process_id=process_id)
+        return process_id
+
+    def _get_stdin(self, process_id: str) -> "StdinWriter":
+        writer = self._process_stdin.get(process_id)
+        if writer is None:
+            raise SandboxError(
+                f"Stdin of process {process_id} is not open, "
+                "launch it with stdin=True"
+            )
+        return writer
+
+    def write_stdin(self, process_id: str, data: Union[bytes, str]) -> None:
+        """
+        Write data to the stdin of a background process.
+
+        Blocks while the process has not read most of the data written so far.
+
+        Args:
+            process_id: ID of a process launched with stdin=True
+            data: Data to write, str is encoded as UTF-8
+
+        Raises:
+            SandboxError: If stdin is not open, was closed, or the write fails
+        """
+        self._get_stdin(process_id).write(data)
+
+    def close_stdin(self, process_id: str) -> None:
+        """
+        Close the stdin of a background process.
+
+        The process reads EOF once it has read all the data written.
+
+        Args:
+            process_id: ID of a process launched with stdin
+        """
+        self._get_stdin(process_id).close()
+
+    def wait_for_port(
+        self,
+        port: int,
+        timeout: float = 60.0,
+        protocol: str = "tcp",
+        path: str = "/",
+    ) -> float:
+        """
+        Wait until a server in the sandbox is ready on a port.
+
+        The port is probed from inside the sandbox, with a growing delay
+        between attempts, so waiting does not cost one request per attempt.
+
+        Args:
+            port: Port to probe
+            timeout: Maximum seconds to wait
+            protocol: "tcp" to wait for connections to be accepted, or "http"
+                to wait for a 2xx or 3xx response to a GET request
+            path: Path requested with the "http" protocol
+
+        Returns:
+            float: Seconds it took for the port to be ready
+
+        Raises:
+            SandboxTimeoutError: If the port is not ready within timeout
+            SandboxError: If probing fails
+
+        Example:
+            >>> sandbox.launch_process("python -u server.py")
+            >>> sandbox.wait_for_port(8080, protocol="http", path="/health")
+            1.27
+        """
+        from .processes import wait_for_port
+
+        return wait_for_port(self, port, timeout=timeout, protocol=protocol, path=path)
 
     def kill_process(self, process_id: str) -> None:
         """
@@ -782,15 +1244,41 @@ class Sandbox:
             if isinstance(e, SandboxError):
                 raise
             raise SandboxError(f"Failed to kill process {process_id}: {str(e)}") from e
-
-    def list_processes(self) -> List[ProcessInfo]:
+        self._drop_stdin([process_id])
+
+    def _drop_stdin(self, process_ids: Iterable[str]) -> None:
+        """Drop the stdin writers of processes that exited or were killed."""
+        for process_id in process_ids:
+            writer = self._process_stdin.pop(process_id, None)
+            if writer is None:
+                continue
+            if writer.closed:
+                # The feeder removed the spool when the process exited
+                writer.stop()
+            else:
+                # An upload may be in flight, remove the spool once it is done
+                threading.Thread(
+                    target=writer.discard, name="koyeb-stdin-discard", daemon=True
+                ).start()
+
+    def list_processes(
+        self,
+        status: Optional[str] = None,
+        limit: Optional[int] = None,
+        offset: int = 0,
+    ) -> List[ProcessInfo]:
         """
-        List all background processes.
+        List background processes.
 
         Returns information about all currently running and recently completed background
         processes. This includes both active processes and processes that have completed
         (which remain in memory until server restart).
 
+        Args:
+            status: Only return processes with this status (e.g., "running")
+            limit: Maximum number of processes to return
+            offset: Number of matching processes to skip
+
         Returns:
             List[ProcessInfo]: List of process objects, each containing:
                 - id: Process ID (UUID string)
@@ -808,23 +1296,152 @@ class Sandbox:
             >>> processes = sandbox.list_processes()
             >>> for process in processes:
             ...     print(f"{process.id}: {process.command} - {process.status}")
+
+            >>> running = sandbox.list_processes(status="running", limit=10)
         """
+        processes = self._list_processes()
+        if status is not None:
+            processes = [process for process in processes if process.status == status]
+        end = offset + limit if limit is not None else None
+        return processes[offset:end]
+
+    def _list_processes(self) -> List[ProcessInfo]:
         client = self._get_client()
         try:
             response = client.list_processes()
             processes_data = response.get("processes", [])
-            return [ProcessInfo(**process) for process in processes_data]
+            processes = [ProcessInfo(**process) for process in processes_data]
         except Exception as e:
             if isinstance(e, SandboxError):
                 raise
             raise SandboxError(f"Failed to list processes: {str(e)}") from e
+        if self._process_stdin:
+            running = {p.id for p in processes if p.status == "running"}
+            self._drop_stdin([id for id in self._process_stdin if id not in running])
+        return processes
+
+    def process_logs(
+        self,
+        process_id: str,
+        follow: bool = True,
+        stdout_offset: int = 0,
+        stderr_offset: int = 0,
+    ) -> Iterator["ProcessOutput"]:
+        """
+        Stream the output of a background process.
+
+        Only available for processes launched with capture_output=True. The
+        output is read from byte offsets, so an interrupted stream can be
+        resumed from the offset of the last chunk received.
+
+        Args:
+            process_id: The unique process ID (UUID string)
+            follow: Keep streaming new output until the process exits
+            stdout_offset: Byte offset in stdout to start from
+            stderr_offset: Byte offset in stderr to start from
+
+        Yields:
+            ProcessOutput: Chunks of output, with their stream and end offset
+
+        Raises:
+            SandboxError: If the process is unknown or its output was not captured
+
+        Example:
+            >>> pid = sandbox.launch_process("python -u train.py", capture_output=True)
+            >>> for chunk in sandbox.process_logs(pid):
+            ...     print(chunk.data, end="")
+        """
+        from .processes import follow_logs
+
+        return follow_logs(
+            self,
+            process_id,
+            follow=follow,
+            stdout_offset=stdout_offset,
+            stderr_offset=stderr_offset,
+        )
+
+    def wait_process(
+        self, process_id: str, timeout: Optional[float] = None
+    ) -> ProcessInfo:
+        """
+        Wait for a background process to exit.
+
+        The wait is a long poll running inside the sandbox, so it does not
+        repeatedly list every process.
+
+        Args:
+            process_id: The unique process ID (UUID string)
+            timeout: Maximum seconds to wait (None: no limit)
+
+        Returns:
+            ProcessInfo: The process, with its exit code
+
+        Raises:
+            SandboxTimeoutError: If the process is still running after timeout
+            SandboxError: If the process is unknown
+
+        Example:
+            >>> pid = sandbox.launch_process("make build")
+            >>> print(sandbox.wait_process(pid, timeout=600).exit_code)
+        """
+        from .processes import wait_for_exit
+
+        return wait_for_exit(self, process_id, timeout=timeout)
+
+    def kill_processes(
+        self,
+        process_ids: Optional[List[str]] = None,
+        status: Optional[str] = "running",
+        command: Optional[str] = None,
+        signal: Union[str, int] = "SIGTERM",
+        grace_period: float = 5.0,
+    ) -> List["ProcessKillResult"]:
+        """
+        Kill the background processes matching all the given filters.
+
+        The processes are signalled together by a single request to the sandbox,
+        instead of one request per process. Those still running after the grace
+        period are killed with SIGKILL.
+
+        Args:
+            process_ids: Only kill these processes (default: any)
+            status: Only consider processes with this status (None: any); processes
+                listed in process_ids are always reported
+            command: Only kill processes whose command matches this regex
+            signal: Signal to send first, by name or number
+            grace_period: Seconds to wait before sending SIGKILL
+
+        Returns:
+            List[ProcessKillResult]: One result per matching process, and per id of
+                process_ids that is unknown or not running
+
+        Raises:
+            SandboxError: If listing or killing processes fails
+
+        Example:
+            >>> results = sandbox.kill_processes(command=r"celery worker", signal="INT")
+            >>> print(sum(result.killed for result in results))
+        """
+        from .processes import kill_processes
+
+        results = kill_processes(
+            self,
+            process_ids=process_ids,
+            status=status,
+            command=command,
+            signal=signal,
+            grace_period=grace_period,
+        )
+        self._drop_stdin([result.process_id for result in results if result.killed])
+        return results
 
     def kill_all_processes(self) -> int:
         """
         Kill all running background processes.
 
-        Convenience method that lists all processes and kills them all. This is useful
-        for cleanup operations.
+        Convenience method that kills every running process in a single request
+        with kill_processes(). This is useful for cleanup operations.
 
         Returns:
             int: The number of processes that were killed
@@ -836,20 +1453,7 @@ class Sandbox:
             >>> count = sandbox.kill_all_processes()
             >>> print(f"Killed {count} processes")
         """
-        processes = self.list_processes()
-        killed_count = 0
-        for process in processes:
-            process_id = process.id
-            status = process.status
-            # Only kill running processes
-            if process_id and status == "running":
-                try:
-                    self.kill_process(process_id)
-                    killed_count += 1
-                except SandboxError:
-                    # Continue killing other processes even if one fails
-                    pass
-        return killed_count
+        return sum(result.killed for result in self.kill_processes())
 
     def update_lifecycle(
         self,
@@ -872,7 +1476,9 @@ class Sandbox:
             >>> sandbox.update_life_cycle(delete_after_delay=600, delete_after_inactivity=300)
         """
         try:
-            _, services_api, _, _, deployments_api = get_api_client(self.api_token)
+            _, services_api, _, _, deployments_api = get_api_client(
+                self.api_token, rate_limiter=self.rate_limiter
+            )
             service_response = services_api.get_service(self.service_id)
             service = service_response.service
 
@@ -904,6 +1510,203 @@ class Sandbox:
                 raise
             raise SandboxError(f"Failed to update life cycle: {str(e)}")
 
+    def metrics(
+        self,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        step: str = "1m",
+    ) -> "ResourceUsage":
+        """
+        Get the CPU and memory usage of the sandbox.
+
+        Args:
+            start: Beginning of the range (default: 15 minutes before end)
+            end: End of the range (default: now)
+            step: Resolution of the samples, in minutes ("5m") or hours ("1h")
+
+        Returns:
+            ResourceUsage: CPU (percent of the instance's vCPU allocation) and
+                resident memory samples of the sandbox's instance
+
+        Raises:
+            SandboxError: If the metrics cannot be retrieved
+
+        Example:
+            >>> usage = sandbox.metrics()
+            >>> print(usage.cpu_percent_peak, usage.memory_bytes_peak)
+        """
+        from .metrics import fetch_usage
+
+        return fetch_usage(self, start=start, end=end, step=step)
+
+    def watch_metrics(
+        self,
+        interval: float = 30.0,
+        step: str = "1m",
+        stop: Optional[threading.Event] = None,
+    ) -> Iterator["ResourceSample"]:
+        """
+        Yield the CPU and memory usage of the sandbox as it is reported.
+
+        Args:
+            interval: Seconds between two polls of the metrics API
+            step: Resolution of the samples
+            stop: Event ending the watch when set (default: watch forever)
+
+        Yields:
+            ResourceSample: Each new sample, in time order
+        """
+        from .metrics import watch_usage
+
+        return watch_usage(self, interval=interval, step=step, stop=stop)
+
+    def install(
+        self,
+        requirements: Optional[str] = None,
+        lockfile: Optional[str] = None,
+        cache: Optional["LayerCache"] = None,
+        venv: str = "/opt/koyeb/venv",
+        python: str = "python3",
+        timeout: float = 1800.0,
+    ) -> "InstallResult":
+        """
+        Install dependencies, restoring them from a layer cache when possible.
+
+        The dependency spec is hashed in the sandbox. On a cache hit the
+        installed directory is unpacked from the cached archive; on a miss
+        the dependencies are installed, then archived and published to the
+        cache for the next sandboxes.
+
+        Args:
+            requirements: Path of a requirements.txt in the sandbox, installed
+                with pip into the virtual environment at venv
+            lockfile: Path of a package-lock.json, npm-shrinkwrap.json, yarn.lock
+                or pnpm-lock.yaml in the sandbox, installed into the
+                node_modules directory next to it
+            cache: Layer cache to restore from and publish to (None: install only)
+            venv: Virtual environment for requirements
+            python: Python interpreter creating the virtual environment
+            timeout: Maximum seconds for the install
+
+        Returns:
+            InstallResult: Cache key, installed directory and whether it was restored
+
+        Raises:
+            ValueError: If not exactly one of requirements or lockfile is given
+            SandboxError: If the install fails
+
+        Example:
+            >>> cache = LayerCache.create()  # Once, then shared with cache.to_dict()
+            >>> sandbox.filesystem.write_file("/app/requirements.txt", "requests==2.32.3\n")
+            >>> sandbox.install(requirements="/app/requirements.txt", cache=cache).cached
+            False
+            >>> other.install(requirements="/app/requirements.txt", cache=cache).cached
+            True
+            >>> other.exec("/opt/koyeb/venv/bin/python -c 'import requests'")
+        """
+        from .layers import install_layer
+
+        return install_layer(
+            self,
+            requirements=requirements,
+            lockfile=lockfile,
+            cache=cache,
+            venv=venv,
+            python=python,
+            timeout=timeout,
+        )
+
+    def checkpoint(
+        self,
+        path: Optional[str] = None,
+        name: Optional[str] = None,
+        timeout: float = 600.0,
+    ) -> "SandboxSnapshot":
+        """
+        Snapshot the volume-backed working directory of the sandbox.
+
+        The whole volume holding path is snapshotted, the sandbox keeps
+        running. Pass the result to Sandbox.create(restore_from=...) to boot
+        new sandboxes with the same content.
+
+        Args:
+            path: Directory on a volume mounted with Sandbox.create(mount_path=...)
+                (default: the sandbox's only volume)
+            name: Name of the snapshot (default: generated from the sandbox name)
+            timeout: Maximum seconds to wait for the snapshot to be available
+
+        Returns:
+            SandboxSnapshot: The available snapshot
+
+        Raises:
+            SandboxError: If path is not on a volume or the snapshot failed
+            SandboxTimeoutError: If the snapshot is not available within timeout
+
+        Example:
+            >>> sandbox = Sandbox.create(mount_path="/workspace")
+            >>> sandbox.exec("git clone https://github.com/org/repo /workspace/repo")
+            >>> snapshot = sandbox.checkpoint("/workspace")
+            >>> clone = Sandbox.create(restore_from=snapshot)
+        """
+        from .snapshots import create_checkpoint
+
+        return create_checkpoint(self, path=path, name=name, timeout=timeout)
+
+    def interpreter(self, language: str = "python", **kwargs) -> "Interpreter":
+        """
+        Create a persistent interpreter session in the sandbox.
+
+        Unlike exec(), state (variables, imports, loaded data) is kept between
+        the cells run in the session.
+
+        Args:
+            language: Interpreter language (only "python" is supported)
+            **kwargs: executable, cwd, env and startup_timeout of the session
+
+        Returns:
+            Interpreter: Session, started on first use or when entered
+
+        Example:
+            >>> with sandbox.interpreter() as py:
+            ...     py.run("x = 21")
+            ...     py.run("x * 2").text
+            '42'
+        """
+        from .interpreter import Interpreter
+
+        return Interpreter(self, language=language, **kwargs)
+
+    def shell(
+        self,
+        cwd: Optional[str] = None,
+        env: Optional[Dict[str, str]] = None,
+        **kwargs,
+    ) -> "Shell":
+        """
+        Create a persistent shell session in the sandbox.
+
+        Unlike exec(), the working directory, exported variables and shell
+        functions are kept between the commands run in the session, and cwd
+        and env are sent once instead of with every command.
+
+        Args:
+            cwd: Initial working directory
+            env: Initial environment variables
+            **kwargs: shell, python and startup_timeout of the session
+
+        Returns:
+            Shell: Session, started on first use or when entered
+
+        Example:
+            >>> with sandbox.shell(cwd="/app") as sh:
+            ...     sh.run("cd src && export DEBUG=1")
+            ...     sh.run("pwd").stdout
+            '/app/src\\n'
+        """
+        from .shell import Shell
+
+        return Shell(self, cwd=cwd, env=env, **kwargs)
+
     def __enter__(self) -> "Sandbox":
         """Context manager entry - returns self."""
         return self
@@ -944,6 +1747,7 @@ class AsyncSandbox(Sandbox):
         cls,
         id: str,
         api_token: Optional[str] = None,
+        rate_limiter: Optional[RateLimiter] = None,
     ) -> "AsyncSandbox":
         """
         Get a sandbox by service ID asynchronously.
@@ -951,6 +1755,7 @@ class AsyncSandbox(Sandbox):
         Args:
             id: Service ID of the sandbox
             api_token: Koyeb API token (if None, will try to get from KOYEB_API_TOKEN env var)
+            rate_limiter: Optional limiter shared by the API and executor clients of the sandbox
 
         Returns:
             AsyncSandbox: The AsyncSandbox instance
@@ -960,7 +1765,7 @@ class AsyncSandbox(Sandbox):
             SandboxError: If sandbox is not found or retrieval fails
         """
         sync_sandbox = await run_sync_in_executor(
-            Sandbox.get_from_id, id=id, api_token=api_token
+            Sandbox.get_from_id, id=id, api_token=api_token, rate_limiter=rate_limiter
         )
 
         # Convert Sandbox instance to AsyncSandbox instance
@@ -971,6 +1776,8 @@ class AsyncSandbox(Sandbox):
             name=sync_sandbox.name,
             api_token=sync_sandbox.api_token,
             sandbox_secret=sync_sandbox.sandbox_secret,
+            rate_limiter=sync_sandbox.rate_limiter,
+            route=sync_sandbox.route,
         )
         async_sandbox._created_at = sync_sandbox._created_at
 
@@ -996,6 +1803,10 @@ class AsyncSandbox(Sandbox):
         delete_after_delay: int = 0,
         delete_after_inactivity_delay: int = 0,
         app_id: Optional[str] = None,
+        restore_from: Optional[Union[str, "SandboxSnapshot"]] = None,
+        mount_path: Optional[str] = None,
+        volume_size: int = 10,
+        rate_limiter: Optional[RateLimiter] = None,
     ) -> AsyncSandbox:
         """
             Create a new sandbox instance with async support.
@@ -1009,7 +1820,9 @@ class AsyncSandbox(Sandbox):
                     If None, defaults to "http".
                     If provided, must be one of "http" or "http2".
                 env: Environment variables
-                region: Region to deploy to (default: "na")
+                region: Region to deploy to (default: "na"). "auto" picks the region offering
+                    instance_type with the lowest TCP/TLS handshake time from this host,
+                    probed once and cached for 10 minutes.
                 api_token: Koyeb API token (if None, will try to get from KOYEB_API_TOKEN env var)
                 timeout: Timeout for sandbox creation in seconds
                 idle_timeout: Sleep timeout in seconds. Behavior depends on _experimental_enable_light_sleep:
@@ -1028,6 +1841,15 @@ class AsyncSandbox(Sandbox):
                 delete_after_inactivity_delay: If >0, automatically delete the sandbox if service sleeps due to inactivity
                     after this many seconds.
                 app_id: If provided, create the sandbox service in an existing app instead of creating a new one.
+                restore_from: Snapshot (or snapshot ID) whose content pre-populates the volume
+                    mounted at mount_path, see checkpoint(). The sandbox is created in the
+                    snapshot's region unless region is given.
+                mount_path: If provided, mount a persistent volume at this path, which
+                    checkpoint() can then snapshot. Defaults to the checkpointed path when
+                    restore_from is a SandboxSnapshot.
+                volume_size: Maximum size of the volume in GB (default: 10)
+                rate_limiter: Optional limiter shared by the API and executor clients
+                    of the sandbox
 
         Returns:
                 AsyncSandbox: A new AsyncSandbox instance
@@ -1043,6 +1865,11 @@ class AsyncSandbox(Sandbox):
                     "API token is required. Set KOYEB_API_TOKEN environment variable or pass api_token parameter"
                 )
 
+        if mount_path is None and restore_from is not None:
+            mount_path = getattr(restore_from, "path", None)
+            if mount_path is None:
+                raise ValueError("mount_path is required to restore a snapshot")
+
         loop = asyncio.get_running_loop()
         sync_result = await loop.run_in_executor(
             None,
@@ -1063,6 +1890,10 @@ class AsyncSandbox(Sandbox):
                 delete_after_delay=delete_after_delay,
                 delete_after_inactivity_delay=delete_after_inactivity_delay,
                 app_id=app_id,
+                restore_from=restore_from,
+                mount_path=mount_path,
+                volume_size=volume_size,
+                rate_limiter=rate_limiter,
             ),
         )
 
@@ -1074,6 +1905,8 @@ class AsyncSandbox(Sandbox):
             name=sync_result.name,
             api_token=sync_result.api_token,
             sandbox_secret=sync_result.sandbox_secret,
+            rate_limiter=sync_result.rate_limiter,
+            route=sync_result.route,
         )
         sandbox._created_at = sync_result._created_at
 
@@ -1157,6 +1990,11 @@ class AsyncSandbox(Sandbox):
         """Delete the sandbox instance asynchronously."""
         pass
 
+    @async_wrapper("refresh_route")
+    async def refresh_route(self) -> SandboxRoute:
+        """Look up the routing state of the sandbox again asynchronously."""
+        raise NotImplementedError  # Implemented by async_wrapper
+
     @async_wrapper("is_healthy")
     async def is_healthy(self) -> bool:
         """Check if sandbox is healthy and ready for operations asynchronously"""
@@ -1186,39 +2024,139 @@ class AsyncSandbox(Sandbox):
         """Unexpose a port from external connections asynchronously."""
         pass
 
-    @async_wrapper("launch_process")
-    async def launch_process(
-        self, cmd: str, cwd: Optional[str] = None, env: Optional[Dict[str, str]] = None
+    @async_wrapper("forward")
+    async def forward(
+        self, remote_port: int, local_port: int = 0, host: str = "127.0.0.1"
+    ) -> "PortForward":
+        """Forward a local TCP port to a port inside the sandbox asynchronously."""
+        raise NotImplementedError  # Implemented by async_wrapper
+
+    async def launch_process(  # type: ignore[override]
+        self,
+        cmd: str,
+        cwd: Optional[str] = None,
+        env: Optional[Dict[str, str]] = None,
+        capture_output: bool = False,
+        ready_port: Optional[int] = None,
+        ready_timeout: float = 60.0,
+        stdin: Optional[Union["StdinSource", bool]] = None,
     ) -> str:
-        """Launch a background process in the sandbox asynchronously."""
+        """
+        Launch a background process in the sandbox asynchronously.
+
+        stdin may also be an async iterator, consumed by a task of the running loop.
+        """
+        if not hasattr(stdin, "__aiter__"):
+            return await self._run_sync(
+                super().launch_process,
+                cmd,
+                cwd,
+                env,
+                capture_output,
+                ready_port,
+                ready_timeout,
+                stdin,
+            )
+        process_id = await self._run_sync(
+            super().launch_process,
+            cmd,
+            cwd,
+            env,
+            capture_output,
+            None,
+            ready_timeout,
+            True,
+        )
+        self._process_stdin[process_id].feed_in_background(stdin)
+        if ready_port is not None:
+            from .processes import wait_for_port
+
+            await self._run_sync(
+                wait_for_port, self, ready_port, ready_timeout, process_id=process_id
+            )
+        return process_id
+
+    @async_wrapper("write_stdin")
+    async def write_stdin(self, process_id: str, data: Union[bytes, str]) -> None:
+        """Write data to the stdin of a background process asynchronously."""
         pass
 
+    @async_wrapper("close_stdin")
+    async def close_stdin(self, process_id: str) -> None:
+        """Close the stdin of a background process asynchronously."""
+        pass
+
+    @async_wrapper("wait_for_port")
+    async def wait_for_port(
+        self,
+        port: int,
+        timeout: float = 60.0,
+        protocol: str = "tcp",
+        path: str = "/",
+    ) -> float:
+        """Wait until a server in the sandbox is ready on a port asynchronously."""
+        raise NotImplementedError  # Implemented by async_wrapper
+
     @async_wrapper("kill_process")
     async def kill_process(self, process_id: str) -> None:
         """Kill a background process by its ID asynchronously."""
         pass
 
     @async_wrapper("list_processes")
-    async def list_processes(self) -> List[ProcessInfo]:
-        """List all background processes asynchronously."""
-        pass
+    async def list_processes(
+        self,
+        status: Optional[str] = None,
+        limit: Optional[int] = None,
+        offset: int = 0,
+    ) -> List[ProcessInfo]:
+        """List background processes asynchronously."""
+        raise NotImplementedError  # Implemented by async_wrapper
+
+    def process_logs(  # type: ignore[override]
+        self,
+        process_id: str,
+        follow: bool = True,
+        stdout_offset: int = 0,
+        stderr_offset: int = 0,
+    ) -> AsyncIterator["ProcessOutput"]:
+        """Stream the output of a background process asynchronously."""
+        from koyeb.api.log_stream import iterate_in_thread
+
+        from .processes import follow_logs
+
+        return iterate_in_thread(
+            lambda: follow_logs(
+                self,
+                process_id,
+                follow=follow,
+                stdout_offset=stdout_offset,
+                stderr_offset=stderr_offset,
+            ),
+            lambda: None,
+        )
+
+    @async_wrapper("wait_process")
+    async def wait_process(
+        self, process_id: str, timeout: Optional[float] = None
+    ) -> ProcessInfo:
+        """Wait for a background process to exit asynchronously."""
+        raise NotImplementedError  # Implemented by async_wrapper
+
+    @async_wrapper("kill_processes")
+    async def kill_processes(
+        self,
+        process_ids: Optional[List[str]] = None,
+        status: Optional[str] = "running",
+        command: Optional[str] = None,
+        signal: Union[str, int] = "SIGTERM",
+        grace_period: float = 5.0,
+    ) -> List["ProcessKillResult"]:
+        """Kill the background processes matching the filters asynchronously."""
+        raise NotImplementedError  # Implemented by async_wrapper
 
     async def kill_all_processes(self) -> int:
         """Kill all running background processes asynchronously."""
-        processes = await self.list_processes()
-        killed_count = 0
-        for process in processes:
-            process_id = process.id
-            status = process.status
-            # Only kill running processes
-            if process_id and status == "running":
-                try:
-                    await self.kill_process(process_id)
-                    killed_count += 1
-                except SandboxError:
-                    # Continue killing other processes even if one fails
-                    pass
-        return killed_count
+        return sum(result.killed for result in await self.kill_processes())
 
     @async_wrapper("update_lifecycle")
     async def update_lifecycle(
@@ -1229,6 +2167,73 @@ class AsyncSandbox(Sandbox):
         """Update the sandbox's life cycle settings asynchronously."""
         pass
 
+    @async_wrapper("metrics")
+    async def metrics(
+        self,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        step: str = "1m",
+    ) -> "ResourceUsage":
+        """Get the CPU and memory usage of the sandbox asynchronously."""
+        raise NotImplementedError  # Implemented by async_wrapper
+
+    def watch_metrics(  # type: ignore[override]
+        self,
+        interval: float = 30.0,
+        step: str = "1m",
+        stop: Optional[threading.Event] = None,
+    ) -> AsyncIterator["ResourceSample"]:
+        """Yield the CPU and memory usage of the sandbox asynchronously."""
+        from koyeb.api.log_stream import iterate_in_thread
+
+        from .metrics import watch_usage
+
+        stop = stop or threading.Event()
+        return iterate_in_thread(
+            lambda: watch_usage(self, interval=interval, step=step, stop=stop),
+            stop.set,
+        )
+
+    @async_wrapper("install")
+    async def install(
+        self,
+        requirements: Optional[str] = None,
+        lockfile: Optional[str] = None,
+        cache: Optional["LayerCache"] = None,
+        venv: str = "/opt/koyeb/venv",
+        python: str = "python3",
+        timeout: float = 1800.0,
+    ) -> "InstallResult":
+        """Install dependencies through a layer cache asynchronously."""
+        raise NotImplementedError  # Implemented by async_wrapper
+
+    @async_wrapper("checkpoint")
+    async def checkpoint(
+        self,
+        path: Optional[str] = None,
+        name: Optional[str] = None,
+        timeout: float = 600.0,
+    ) -> "SandboxSnapshot":
+        """Snapshot the volume-backed working directory of the sandbox asynchronously."""
+        raise NotImplementedError  # Implemented by async_wrapper
+
+    def interpreter(self, language: str = "python", **kwargs) -> "AsyncInterpreter":
+        """Create a persistent interpreter session with async methods."""
+        from .interpreter import AsyncInterpreter
+
+        return AsyncInterpreter(self, language=language, **kwargs)
+
+    def shell(
+        self,
+        cwd: Optional[str] = None,
+        env: Optional[Dict[str, str]] = None,
+        **kwargs,
+    ) -> "AsyncShell":
+        """Create a persistent shell session with async methods."""
+        from .shell import AsyncShell
+
+        return AsyncShell(self, cwd=cwd, env=env, **kwargs)
+
     async def __aenter__(self) -> "AsyncSandbox":
         """Async context manager entry - returns self."""
         return self
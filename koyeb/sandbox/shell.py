@@ -0,0 +1,359 @@
+# coding: utf-8
+
+"""
+Persistent shell sessions for Koyeb Sandbox instances
+"""
+
+from __future__ import annotations
+
+import shlex
+import time
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional
+
+from .exec import CommandResult, CommandStatus
+from .interpreter import KernelSession
+from .utils import SandboxError, async_wrapper, run_sync_in_executor
+
+if TYPE_CHECKING:
+    from .sandbox import Sandbox
+
+# Kernel hosting one shell process for the whole session. Each command is
+# evaluated by that shell, followed by a random marker on stdout (carrying
+# the exit code) and on stderr, which delimit the command's output.
+_SHELL_KERNEL = r"""
+import codecs, json, os, queue, shlex, signal, socket, subprocess, sys, threading
+
+path, shell = sys.argv[1], sys.argv[2]
+try:
+    os.unlink(path)
+except FileNotFoundError:
+    pass
+server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+server.bind(path)
+os.chmod(path, 0o600)
+server.listen(16)
+requests = queue.Queue()
+output = queue.Queue()
+busy = threading.Event()
+
+# The shell gets its own process group so an interrupt reaches the running
+# command; the INT trap keeps the shell itself alive.
+proc = subprocess.Popen(
+    [shell],
+    stdin=subprocess.PIPE,
+    stdout=subprocess.PIPE,
+    stderr=subprocess.PIPE,
+    start_new_session=True,
+)
+proc.stdin.write(b"trap : INT\n")
+proc.stdin.flush()
+
+
+def read(name, stream):
+    while True:
+        data = os.read(stream.fileno(), 65536)
+        output.put((name, data))
+        if not data:
+            return
+
+
+threading.Thread(target=read, args=("stdout", proc.stdout), daemon=True).start()
+threading.Thread(target=read, args=("stderr", proc.stderr), daemon=True).start()
+
+
+def send(conn, frame):
+    try:
+        conn.sendall((json.dumps(frame) + "\n").encode())
+    except OSError:
+        pass
+
+
+def execute(conn, command):
+    marker = ("__koyeb_" + os.urandom(8).hex() + "__").encode()
+    proc.stdin.write(
+        (
+            "eval %s </dev/null; printf '%%s%%d\\n' %s \"$?\"; printf '%%s\\n' %s >&2\n"
+            % (shlex.quote(command), marker.decode(), marker.decode())
+        ).encode()
+    )
+    proc.stdin.flush()
+    pending = {"stdout": b"", "stderr": b""}
+    decoders = {
+        name: codecs.getincrementaldecoder("utf-8")("replace") for name in pending
+    }
+    remaining = set(pending)
+    exit_code = None
+    while remaining:
+        try:
+            name, data = output.get(timeout=1)
+        except queue.Empty:
+            send(conn, {"type": "heartbeat"})
+            continue
+        if not data:
+            # The shell exited, e.g. after an `exit` command
+            for name in remaining:
+                text = decoders[name].decode(pending[name], True)
+                if text:
+                    send(conn, {"type": "stream", "name": name, "text": text})
+            send(conn, {"type": "done", "exit_code": proc.wait(), "exited": True})
+            return False
+        pending[name] += data
+        index = pending[name].find(marker)
+        if index >= 0:
+            chunk, rest = pending[name][:index], pending[name][index + len(marker):]
+            remaining.discard(name)
+            if name == "stdout":
+                exit_code = int(rest.split(b"\n", 1)[0] or 0)
+        else:
+            # Hold back what could be the beginning of the marker
+            keep = min(len(marker) - 1, len(pending[name]))
+            while keep and not marker.startswith(pending[name][-keep:]):
+                keep -= 1
+            split = len(pending[name]) - keep
+            chunk, pending[name] = pending[name][:split], pending[name][split:]
+        text = decoders[name].decode(chunk, index >= 0)
+        if text:
+            send(conn, {"type": "stream", "name": name, "text": text})
+    send(conn, {"type": "done", "exit_code": exit_code})
+    return True
+
+
+def accept():
+    while True:
+        conn, _ = server.accept()
+        line = conn.makefile("rb").readline()
+        try:
+            request = json.loads(line)
+        except ValueError:
+            conn.close()
+            continue
+        op = request.get("op")
+        if op == "interrupt":
+            if busy.is_set():
+                try:
+                    os.killpg(proc.pid, signal.SIGINT)
+                except OSError:
+                    pass
+            conn.sendall(b'{"type": "done", "status": "ok"}\n')
+            conn.close()
+        elif op == "ping":
+            conn.sendall(b'{"type": "done", "status": "ok"}\n')
+            conn.close()
+        else:
+            requests.put((conn, request))
+
+
+threading.Thread(target=accept, daemon=True).start()
+alive = True
+while alive:
+    conn, request = requests.get()
+    busy.set()
+    try:
+        alive = execute(conn, request.get("command", ""))
+    finally:
+        busy.clear()
+        conn.close()
+"""
+
+
+class Shell(KernelSession):
+    """
+    Persistent shell session inside a sandbox.
+
+    Commands run one after the other in the same shell process, so the
+    working directory, exported variables and shell functions carry over
+    from one command to the next, and the context is sent only once when
+    the session starts instead of with every command.
+
+    Each command's stdin is /dev/null. Running ``exit`` ends the session;
+    the next command then starts a fresh one.
+
+    Use it as a context manager, or call close() to stop the shell.
+    """
+
+    kernel_source = _SHELL_KERNEL
+    kind = "shell"
+
+    def __init__(
+        self,
+        sandbox: Sandbox,
+        shell: str = "bash",
+        cwd: Optional[str] = None,
+        env: Optional[Dict[str, str]] = None,
+        python: str = "python3",
+        startup_timeout: float = 30.0,
+    ) -> None:
+        super().__init__(
+            sandbox,
+            python=python,
+            cwd=cwd,
+            env=env,
+            startup_timeout=startup_timeout,
+        )
+        self.shell = shell
+
+    def _kernel_args(self) -> List[str]:
+        return [self.shell]
+
+    def run(
+        self,
+        command: str,
+        timeout: Optional[float] = 30.0,
+        on_stdout: Optional[Callable[[str], None]] = None,
+        on_stderr: Optional[Callable[[str], None]] = None,
+    ) -> CommandResult:
+        """
+        Run a command in the session.
+
+        Args:
+            command: Shell command to run
+            timeout: Seconds after which the command is interrupted (None: no limit)
+            on_stdout: Optional callback for streaming stdout chunks
+            on_stderr: Optional callback for streaming stderr chunks
+
+        Returns:
+            CommandResult: Output and exit code of the command
+
+        Raises:
+            SandboxTimeoutError: If the command was interrupted after timeout
+            SandboxError: If the shell cannot be reached
+
+        Example:
+            >>> with sandbox.shell(cwd="/app") as sh:
+            ...     sh.run("export PATH=$PWD/.venv/bin:$PATH; cd src")
+            ...     sh.run("python -m build").exit_code
+            0
+        """
+        return self._run(command, timeout, on_stdout, on_stderr)
+
+    def _run(
+        self,
+        command: str,
+        timeout: Optional[float] = 30.0,
+        on_stdout: Optional[Callable[[str], None]] = None,
+        on_stderr: Optional[Callable[[str], None]] = None,
+    ) -> CommandResult:
+        start_time = time.time()
+        stdout: List[str] = []
+        stderr: List[str] = []
+        exit_code = -1
+        exited = False
+        for frame in self._execute({"op": "execute", "command": command}, timeout):
+            kind = frame.get("type")
+            if kind == "stream":
+                text = frame.get("text", "")
+                if frame.get("name") == "stderr":
+                    stderr.append(text)
+                    if on_stderr:
+                        on_stderr(text)
+                else:
+                    stdout.append(text)
+                    if on_stdout:
+                        on_stdout(text)
+            elif kind == "done":
+                exit_code = frame.get("exit_code", -1)
+                exited = frame.get("exited", False)
+        if exited:
+            # The kernel stops with its shell
+            self._close()
+        return CommandResult(
+            stdout="".join(stdout),
+            stderr="".join(stderr),
+            exit_code=exit_code,
+            status=CommandStatus.FINISHED if exit_code == 0 else CommandStatus.FAILED,
+            duration=time.time() - start_time,
+            command=command,
+        )
+
+    def cd(self, path: str) -> None:
+        """
+        Change the working directory of the session.
+
+        Raises:
+            SandboxError: If the directory cannot be entered
+        """
+        result = self._run(f"cd {shlex.quote(path)}")
+        if not result.success:
+            raise SandboxError(f"Failed to change directory: {result.stderr.strip()}")
+
+    def export(self, env: Dict[str, str]) -> None:
+        """
+        Export environment variables in the session.
+
+        Raises:
+            SandboxError: If a variable cannot be exported
+        """
+        if not env:
+            return
+        assignments = " ".join(
+            f"{name}={shlex.quote(value)}" for name, value in env.items()
+        )
+        result = self._run(f"export {assignments}")
+        if not result.success:
+            raise SandboxError(f"Failed to export variables: {result.stderr.strip()}")
+
+    def interrupt(self) -> None:
+        """
+        Interrupt the running command with SIGINT.
+
+        Raises:
+            SandboxError: If the shell cannot be reached
+        """
+        self._interrupt()
+
+
+class AsyncShell(Shell):
+    """
+    Async persistent shell session inside a sandbox.
+    Inherits from Shell and provides async wrappers for all operations.
+    """
+
+    async def _run_sync(self, method, *args, **kwargs):
+        return await run_sync_in_executor(method, *args, **kwargs)
+
+    @async_wrapper("start")
+    async def start(self) -> "AsyncShell":
+        """Start the shell process asynchronously."""
+        raise NotImplementedError  # Implemented by async_wrapper
+
+    @async_wrapper("run")
+    async def run(
+        self,
+        command: str,
+        timeout: Optional[float] = 30.0,
+        on_stdout: Optional[Callable[[str], None]] = None,
+        on_stderr: Optional[Callable[[str], None]] = None,
+    ) -> CommandResult:
+        """Run a command in the session asynchronously."""
+        raise NotImplementedError  # Implemented by async_wrapper
+
+    @async_wrapper("cd")
+    async def cd(self, path: str) -> None:
+        """Change the working directory of the session asynchronously."""
+        raise NotImplementedError  # Implemented by async_wrapper
+
+    @async_wrapper("export")
+    async def export(self, env: Dict[str, str]) -> None:
+        """Export environment variables in the session asynchronously."""
+        raise NotImplementedError  # Implemented by async_wrapper
+
+    @async_wrapper("interrupt")
+    async def interrupt(self) -> None:
+        """Interrupt the running command asynchronously."""
+        raise NotImplementedError  # Implemented by async_wrapper
+
+    @async_wrapper("restart")
+    async def restart(self) -> None:
+        """Restart the shell asynchronously."""
+        raise NotImplementedError  # Implemented by async_wrapper
+
+    @async_wrapper("close")
+    async def close(self) -> None:
+        """Stop the shell process asynchronously."""
+        raise NotImplementedError  # Implemented by async_wrapper
+
+    async def __aenter__(self) -> "AsyncShell":
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self.close()
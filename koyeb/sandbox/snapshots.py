@@ -0,0 +1,328 @@
+# coding: utf-8
+
+"""
+Volume snapshots for Koyeb Sandbox instances
+"""
+
+from __future__ import annotations
+
+import posixpath
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+from koyeb.api.api.deployments_api import DeploymentsApi
+from koyeb.api.api.persistent_volumes_api import PersistentVolumesApi
+from koyeb.api.api.services_api import ServicesApi
+from koyeb.api.api.snapshots_api import SnapshotsApi
+from koyeb.api.exceptions import ApiException, NotFoundException
+from koyeb.api.models.create_persistent_volume_request import (
+    CreatePersistentVolumeRequest,
+)
+from koyeb.api.models.create_snapshot_request import CreateSnapshotRequest
+from koyeb.api.models.persistent_volume_backing_store import (
+    PersistentVolumeBackingStore,
+)
+from koyeb.api.models.service_status import ServiceStatus
+from koyeb.api.models.snapshot import Snapshot
+from koyeb.api.models.snapshot_status import SnapshotStatus
+
+from .utils import (
+    DEFAULT_POLL_INTERVAL,
+    SandboxError,
+    SandboxTimeoutError,
+    get_api_client,
+    logger,
+)
+
+if TYPE_CHECKING:
+    from koyeb.api.api_client import ApiClient
+
+    from .sandbox import Sandbox
+
+DEFAULT_VOLUME_SIZE = 10  # GB
+DEFAULT_SNAPSHOT_TIMEOUT = 600.0
+DEFAULT_DETACH_TIMEOUT = 120.0
+
+# Snapshots in these statuses will never become available
+_FAILED_STATUSES = (
+    SnapshotStatus.SNAPSHOT_STATUS_DELETING,
+    SnapshotStatus.SNAPSHOT_STATUS_DELETED,
+    SnapshotStatus.SNAPSHOT_STATUS_INVALID,
+)
+
+
+@dataclass
+class SandboxSnapshot:
+    """Snapshot of the volume backing a sandbox directory."""
+
+    id: str
+    name: Optional[str] = None
+    volume_id: Optional[str] = None
+    path: Optional[str] = None  # Mount path of the volume in the sandbox
+    region: Optional[str] = None
+    size: Optional[int] = None
+
+
+def wait_for_snapshot(
+    api_client: ApiClient,
+    snapshot_id: str,
+    timeout: float = DEFAULT_SNAPSHOT_TIMEOUT,
+    poll_interval: float = DEFAULT_POLL_INTERVAL,
+) -> Snapshot:
+    """
+    Poll a snapshot until it is available.
+
+    Args:
+        api_client: Configured API client
+        snapshot_id: ID of the snapshot
+        timeout: Maximum seconds to wait
+        poll_interval: Seconds between two polls
+
+    Returns:
+        Snapshot: The available snapshot
+
+    Raises:
+        SandboxError: If the snapshot does not exist or failed
+        SandboxTimeoutError: If the snapshot is not available within timeout
+    """
+    snapshots_api = SnapshotsApi(api_client)
+    deadline = time.time() + timeout
+    while True:
+        try:
+            snapshot = snapshots_api.get_snapshot(id=snapshot_id).snapshot
+        except NotFoundException as e:
+            raise SandboxError(f"Snapshot not found with id: {snapshot_id}") from e
+        except ApiException as e:
+            raise SandboxError(f"Failed to get snapshot {snapshot_id}: {e}") from e
+        status = snapshot.status if snapshot else None
+        if snapshot is not None and status == SnapshotStatus.SNAPSHOT_STATUS_AVAILABLE:
+            return snapshot
+        if status in _FAILED_STATUSES:
+            raise SandboxError(
+                f"Snapshot {snapshot_id} is not usable (status: {status.value})"
+            )
+        if time.time() >= deadline:
+            raise SandboxTimeoutError(
+                f"Snapshot {snapshot_id} was not available within {timeout} seconds"
+            )
+        logger.debug(f"Waiting for snapshot {snapshot_id} (status: {status})")
+        time.sleep(poll_interval)
+
+
+def create_volume(
+    api_client: ApiClient,
+    name: str,
+    region: Optional[str] = None,
+    size: int = DEFAULT_VOLUME_SIZE,
+    snapshot_id: Optional[str] = None,
+    timeout: float = DEFAULT_SNAPSHOT_TIMEOUT,
+) -> Tuple[str, str]:
+    """
+    Create the volume of a new sandbox, optionally from a snapshot.
+
+    Args:
+        api_client: Configured API client
+        name: Name of the volume
+        region: Region of the volume (default: the snapshot's region, else "na")
+        size: Maximum size of the volume in GB
+        snapshot_id: Snapshot whose content pre-populates the volume
+        timeout: Maximum seconds to wait for the snapshot to be available
+
+    Returns:
+        Tuple[str, str]: ID and region of the volume
+
+    Raises:
+        SandboxError: If the snapshot is unusable or the volume cannot be created
+        SandboxTimeoutError: If the snapshot is not available within timeout
+    """
+    if snapshot_id is not None:
+        snapshot = wait_for_snapshot(api_client, snapshot_id, timeout=timeout)
+        if region is None:
+            region = snapshot.region
+    if region is None:
+        region = "na"
+
+    try:
+        volume = (
+            PersistentVolumesApi(api_client)
+            .create_persistent_volume(
+                body=CreatePersistentVolumeRequest(
+                    volume_type=PersistentVolumeBackingStore.PERSISTENT_VOLUME_BACKING_STORE_LOCAL_BLK,
+                    name=name,
+                    region=region,
+                    max_size=size,
+                    snapshot_id=snapshot_id,
+                )
+            )
+            .volume
+        )
+    except ApiException as e:
+        raise SandboxError(f"Failed to create sandbox volume: {e}") from e
+    if volume is None or not volume.id:
+        raise SandboxError("Failed to create sandbox volume: no volume returned")
+    return volume.id, region
+
+
+def delete_volume(api_client: ApiClient, volume_id: str) -> None:
+    """Delete a volume, ignoring failures."""
+    try:
+        PersistentVolumesApi(api_client).delete_persistent_volume(id=volume_id)
+    except Exception as e:
+        logger.warning(f"Failed to delete volume {volume_id}: {e}")
+
+
+def delete_service_volume(
+    api_client: ApiClient,
+    volume_id: str,
+    service_id: str,
+    timeout: float = DEFAULT_DETACH_TIMEOUT,
+    poll_interval: float = DEFAULT_POLL_INTERVAL,
+) -> None:
+    """
+    Delete the volume of a deleted service, once the service is gone.
+
+    A volume cannot be deleted while mounted, so the service is polled until
+    it is deleted first. Failures are logged and ignored.
+
+    Args:
+        api_client: Configured API client
+        volume_id: ID of the volume
+        service_id: ID of the service the volume is mounted in
+        timeout: Maximum seconds to wait for the service to be gone
+        poll_interval: Seconds between two polls
+    """
+    services_api = ServicesApi(api_client)
+    deadline = time.time() + timeout
+    while True:
+        try:
+            service = services_api.get_service(id=service_id).service
+        except NotFoundException:
+            break
+        except ApiException as e:
+            logger.warning(f"Failed to delete volume {volume_id}: {e}")
+            return
+        status = service.status if service else None
+        if status is None or status == ServiceStatus.DELETED:
+            break
+        if time.time() >= deadline:
+            logger.warning(
+                f"Failed to delete volume {volume_id}: service {service_id} "
+                f"was not deleted within {timeout} seconds"
+            )
+            return
+        logger.debug(
+            f"Waiting for service {service_id} to be deleted (status: {status})"
+        )
+        time.sleep(poll_interval)
+    delete_volume(api_client, volume_id)
+
+
+def _mounted_volumes(sandbox: Sandbox, api_client: ApiClient) -> List[Tuple[str, str]]:
+    deployment_id = sandbox.route.deployment_id
+    try:
+        if deployment_id is None:
+            service = ServicesApi(api_client).get_service(id=sandbox.service_id).service
+            if service is not None:
+                deployment_id = (
+                    service.active_deployment_id or service.latest_deployment_id
+                )
+            sandbox.route.deployment_id = deployment_id
+        if deployment_id is None:
+            raise SandboxError("Sandbox has no deployment")
+        deployment = (
+            DeploymentsApi(api_client).get_deployment(id=deployment_id).deployment
+        )
+    except ApiException as e:
+        raise SandboxError(f"Failed to get sandbox volumes: {e}") from e
+    definition = deployment.definition if deployment else None
+    volumes = (definition.volumes if definition else None) or []
+    return [(v.id, v.path) for v in volumes if v.id and v.path]
+
+
+def _select_volume(
+    volumes: List[Tuple[str, str]], path: Optional[str]
+) -> Tuple[str, str]:
+    if not volumes:
+        raise SandboxError(
+            "Sandbox has no volume to checkpoint, create it with "
+            "Sandbox.create(mount_path=...)"
+        )
+    if path is None:
+        if len(volumes) > 1:
+            raise SandboxError(
+                "Sandbox has several volumes, pass the path to checkpoint"
+            )
+        return volumes[0]
+    path = posixpath.normpath(path)
+    matches = [
+        (volume_id, mount_path)
+        for volume_id, mount_path in volumes
+        if path == posixpath.normpath(mount_path)
+        or path.startswith(posixpath.normpath(mount_path).rstrip("/") + "/")
+    ]
+    if not matches:
+        mounts = ", ".join(mount_path for _, mount_path in volumes)
+        raise SandboxError(f"{path} is not on a sandbox volume (mounted at: {mounts})")
+    # The innermost mount holds the path
+    return max(matches, key=lambda volume: len(volume[1]))
+
+
+def create_checkpoint(
+    sandbox: Sandbox,
+    path: Optional[str] = None,
+    name: Optional[str] = None,
+    timeout: float = DEFAULT_SNAPSHOT_TIMEOUT,
+) -> SandboxSnapshot:
+    """
+    Snapshot the volume holding a directory of a sandbox.
+
+    Args:
+        sandbox: Sandbox to checkpoint
+        path: Directory on a volume (default: the sandbox's only volume)
+        name: Name of the snapshot (default: generated from the sandbox name)
+        timeout: Maximum seconds to wait for the snapshot to be available
+
+    Returns:
+        SandboxSnapshot: The available snapshot
+
+    Raises:
+        SandboxError: If the sandbox has no matching volume or the snapshot failed
+        SandboxTimeoutError: If the snapshot is not available within timeout
+    """
+    apps_api, _, _, _, _ = get_api_client(
+        sandbox.api_token, rate_limiter=sandbox.rate_limiter
+    )
+    api_client = apps_api.api_client
+    volume_id, mount_path = _select_volume(_mounted_volumes(sandbox, api_client), path)
+
+    # Flush the page cache so the snapshot sees recent writes
+    try:
+        sandbox._get_client().run("sync", timeout=60)
+    except Exception as e:
+        logger.debug(f"Could not sync the sandbox filesystem: {e}")
+
+    name = name or f"sandbox-{sandbox.name or sandbox.service_id}-{int(time.time())}"
+    try:
+        snapshot = (
+            SnapshotsApi(api_client)
+            .create_snapshot(
+                body=CreateSnapshotRequest(parent_volume_id=volume_id, name=name)
+            )
+            .snapshot
+        )
+    except ApiException as e:
+        raise SandboxError(f"Failed to create snapshot: {e}") from e
+    if snapshot is None or not snapshot.id:
+        raise SandboxError("Failed to create snapshot: no snapshot returned")
+
+    snapshot_id = snapshot.id
+    snapshot = wait_for_snapshot(api_client, snapshot_id, timeout=timeout)
+    return SandboxSnapshot(
+        id=snapshot_id,
+        name=snapshot.name,
+        volume_id=volume_id,
+        path=mount_path,
+        region=snapshot.region,
+        size=snapshot.size,
+    )
@@ -0,0 +1,529 @@
+# coding: utf-8
+
+"""
+Stdin streaming for commands and background processes in Koyeb Sandbox instances
+"""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import secrets
+import shlex
+import threading
+from typing import (
+    IO,
+    TYPE_CHECKING,
+    Any,
+    AsyncIterable,
+    Iterable,
+    Iterator,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from .utils import SandboxError, logger
+
+if TYPE_CHECKING:
+    from .sandbox import Sandbox
+
+#: Accepted stdin sources: data, a file object or an (async) iterator of chunks
+StdinSource = Union[
+    bytes,
+    str,
+    IO[Any],
+    Iterable[Union[bytes, str]],
+    AsyncIterable[Union[bytes, str]],
+]
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+DEFAULT_WINDOW = 4  # Chunks uploaded but not yet read by the process
+
+# Data up to this size is sent within the command itself, which must stay
+# below the 128KiB limit of a single exec argument once base64-encoded
+_INLINE_LIMIT = 64 * 1024
+
+# Data up to this size is uploaded to a file in one request and redirected
+# to the command; larger data and iterators are streamed through a fifo
+_UPLOAD_LIMIT = 64 * 1024 * 1024
+
+# Seconds a drain request waits in the sandbox before reporting progress
+_DRAIN_TIMEOUT = 10.0
+
+# Writes the base64 data given as argument to stdout
+_DECODE = "import base64,sys;sys.stdout.buffer.write(base64.b64decode(sys.argv[1]))"
+
+# Writes the base64 content of the file given as argument to stdout, deleting
+# the file once open
+_DECODE_FILE = (
+    "import base64,os,sys;f=open(sys.argv[1],'rb');os.unlink(sys.argv[1]);"
+    "w=sys.stdout.buffer.write\n"
+    "for b in iter(lambda:f.read(1<<22),b''):w(base64.b64decode(b))"
+)
+
+# Started in the background by the wrapped command. Writes the chunks
+# uploaded to the spool directory, named <seq>-<base64 size> or <seq>-eof,
+# to the fifo the command reads as stdin, in order, deleting each one once
+# the command has taken it. The spool is removed when stdin is closed, by
+# the host or by the command exiting.
+_FEEDER = r"""
+import base64, os, shutil, sys, time
+spool, pid = sys.argv[1], int(sys.argv[2])
+def alive():
+    try:
+        with open("/proc/%d/stat" % pid) as f:
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except (OSError, IndexError):
+        return False
+try:
+    while True:
+        try:
+            fd = os.open(os.path.join(spool, "fifo"), os.O_WRONLY | os.O_NONBLOCK)
+            break
+        except OSError:  # No reader yet
+            if not alive():
+                sys.exit()
+            time.sleep(0.005)
+    os.set_blocking(fd, True)
+    out = open(fd, "wb")
+    seq, delay = 0, 0.001
+    while True:
+        prefix = "%010d-" % seq
+        names = [n for n in os.listdir(spool) if n.startswith(prefix)]
+        if names:
+            size = names[0][len(prefix):]
+            if size == "eof":
+                break
+            path = os.path.join(spool, names[0])
+            if os.path.getsize(path) == int(size):
+                with open(path, "rb") as f:
+                    out.write(base64.b64decode(f.read()))
+                out.flush()
+                os.unlink(path)
+                seq, delay = seq + 1, 0.001
+                continue
+        elif not alive():
+            break
+        time.sleep(delay)
+        delay = min(delay * 2, 0.05)
+    out.close()
+except BrokenPipeError:
+    pass
+finally:
+    shutil.rmtree(spool, ignore_errors=True)
+"""
+
+# Waits until the chunks before a sequence number are taken, and prints the
+# first chunk not taken yet, or "closed" once the feeder is gone (a chunk
+# uploaded after it removed the spool may have created it again)
+_DRAIN = r"""
+import os, shutil, sys, time
+spool, target, deadline = sys.argv[1], int(sys.argv[2]), time.time() + float(sys.argv[3])
+delay = 0.002
+while True:
+    if not os.path.exists(os.path.join(spool, "fifo")):
+        shutil.rmtree(spool, ignore_errors=True)
+        print("closed")
+        break
+    pending = [int(n[:10]) for n in os.listdir(spool) if n[:10].isdigit()]
+    first = min(pending) if pending else target
+    if first >= target or time.time() >= deadline:
+        print(first)
+        break
+    time.sleep(delay)
+    delay = min(delay * 2, 0.05)
+"""
+
+
+def _read_finite(source: Any, limit: int) -> Optional[bytes]:
+    """
+    Read a stdin source of known size, up to limit bytes.
+
+    Returns:
+        Optional[bytes]: The whole data, None for iterators, unseekable files
+            and data larger than limit (nothing is consumed then)
+    """
+    if isinstance(source, str):
+        source = source.encode("utf-8")
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source) if len(source) <= limit else None
+    seekable = getattr(source, "seekable", None)
+    if not callable(seekable) or not seekable():
+        return None
+    position = source.tell()
+    size = source.seek(0, 2) - position
+    source.seek(position)
+    if size > limit:
+        return None
+    data = source.read()
+    return data.encode("utf-8") if isinstance(data, str) else data
+
+
+def _iter_chunks(source: Any, chunk_size: int) -> Iterator[Union[bytes, memoryview]]:
+    """Split a synchronous stdin source into chunks of at most chunk_size bytes."""
+    if isinstance(source, str):
+        source = source.encode("utf-8")
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        view = memoryview(source)
+        for offset in range(0, len(view), chunk_size):
+            yield view[offset : offset + chunk_size]
+        return
+    if hasattr(source, "read"):
+        while True:
+            data = source.read(chunk_size)
+            if not data:
+                return
+            yield data.encode("utf-8") if isinstance(data, str) else data
+    for item in source:
+        yield from _iter_chunks(item, chunk_size)
+
+
+class StdinWriter:
+    """
+    Streams data to the stdin of a command running in a sandbox.
+
+    The executor has no stdin channel, so the command is wrapped to read
+    its stdin from a fifo, filled by a feeder process from chunks uploaded
+    with write_file. At most window chunks are waiting in the sandbox at
+    any time: write() blocks until the command has read enough of them.
+
+    Data of known size is rather uploaded at once with upload(), and the
+    command reads it from the uploaded file.
+    """
+
+    def __init__(
+        self,
+        sandbox: Sandbox,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        window: int = DEFAULT_WINDOW,
+        python: str = "python3",
+    ) -> None:
+        """
+        Args:
+            sandbox: Sandbox running the command
+            chunk_size: Maximum bytes uploaded per request
+            window: Maximum chunks waiting in the sandbox
+            python: Python executable used by the feeder
+        """
+        self.sandbox = sandbox
+        self.chunk_size = chunk_size
+        self.window = max(2, window)
+        self.python = python
+        self.spool = f"/tmp/koyeb-stdin-{secrets.token_hex(8)}"
+        self.bytes_written = 0
+        self._seq = 0  # Next chunk to upload
+        self._taken = 0  # First chunk not read by the command yet
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._closed = False
+        self._closed_by_process = False
+        self._uploaded = False
+        self._encoded = False  # Uploaded as base64
+        self._task: Optional[asyncio.Future[None]] = None
+
+    @property
+    def closed(self) -> bool:
+        """Whether stdin was closed, by close() or by the command exiting."""
+        return self._closed or self._closed_by_process
+
+    def open(self) -> "StdinWriter":
+        """Create the spool directory and fifo in the sandbox."""
+        spool = shlex.quote(self.spool)
+        self._run(f"mkdir -m 700 {spool} && mkfifo {spool}/fifo", timeout=30)
+        return self
+
+    def upload(self, data: bytes) -> "StdinWriter":
+        """
+        Upload the whole stdin in one request, instead of streaming it.
+
+        The data is sent as text when it is valid UTF-8, else base64-encoded
+        and decoded by the wrapped command. Stdin is closed afterwards.
+        """
+        try:
+            content = data.decode("utf-8")
+        except UnicodeDecodeError:
+            content = base64.b64encode(data).decode("ascii")
+            self._encoded = True
+        try:
+            response = self.sandbox._get_client().write_file(self.spool, content)
+        except Exception as e:
+            raise SandboxError(f"Failed to upload stdin: {str(e)}") from e
+        if response.get("error"):
+            raise SandboxError(f"Failed to upload stdin: {response['error']}")
+        self.bytes_written = len(data)
+        self._uploaded = self._closed = True
+        return self
+
+    def wrap(self, cmd: str) -> str:
+        """Wrap a shell command so it reads its stdin from this writer."""
+        spool = shlex.quote(self.spool)
+        if self._encoded:
+            decode = " ".join(
+                shlex.quote(arg)
+                for arg in [self.python, "-S", "-c", _DECODE_FILE, self.spool]
+            )
+            return f"{decode} | {{\n{cmd}\n}}"
+        if self._uploaded:
+            # The file stays readable once open, it is deleted right away
+            return f"exec <{spool} && rm -f {spool}\n{cmd}"
+        feeder = " ".join(
+            shlex.quote(arg) for arg in [self.python, "-S", "-c", _FEEDER, self.spool]
+        )
+        return (
+            f"{feeder} $$ </dev/null >/dev/null 2>&1 &\n"
+            f"exec <{shlex.quote(self.spool + '/fifo')}\n{cmd}"
+        )
+
+    def _run(self, cmd: str, timeout: float) -> str:
+        try:
+            response = self.sandbox._get_client().run(cmd=cmd, timeout=timeout)
+        except Exception as e:
+            raise SandboxError(f"Failed to stream stdin: {str(e)}") from e
+        if response.get("exit_code", 0) != 0:
+            raise SandboxError(
+                f"Failed to stream stdin: {response.get('stderr', '').strip()}"
+            )
+        return response.get("stdout", "").strip()
+
+    def _upload(self, name: str, content: str) -> None:
+        try:
+            response = self.sandbox._get_client().write_file(
+                f"{self.spool}/{name}", content
+            )
+        except Exception as e:
+            raise SandboxError(f"Failed to stream stdin: {str(e)}") from e
+        if response.get("error"):
+            raise SandboxError(f"Failed to stream stdin: {response['error']}")
+
+    def _drain(self, target: int) -> None:
+        """Wait until the command has read the chunks before target."""
+        command = " ".join(
+            shlex.quote(arg)
+            for arg in [
+                self.python,
+                "-S",
+                "-c",
+                _DRAIN,
+                self.spool,
+                str(target),
+                str(_DRAIN_TIMEOUT),
+            ]
+        )
+        while self._taken < target:
+            if self._stop.is_set():
+                raise SandboxError("Stdin streaming was stopped")
+            output = self._run(command, timeout=_DRAIN_TIMEOUT + 30)
+            if output == "closed":
+                self._closed_by_process = True
+                raise SandboxError("The process closed its stdin")
+            self._taken = int(output)
+
+    def write(self, data: Union[bytes, memoryview, str]) -> None:
+        """
+        Write data to stdin, blocking while window chunks are not read yet.
+
+        Raises:
+            SandboxError: If stdin is closed or the data cannot be uploaded
+        """
+        with self._lock:
+            for chunk in _iter_chunks(data, self.chunk_size):
+                if self.closed:
+                    raise SandboxError("Stdin is closed")
+                if self._stop.is_set():
+                    raise SandboxError("Stdin streaming was stopped")
+                if self._seq - self._taken >= self.window:
+                    self._drain(self._seq - self.window // 2)
+                encoded = base64.b64encode(chunk).decode("ascii")
+                self._upload(f"{self._seq:010d}-{len(encoded)}", encoded)
+                self._seq += 1
+                self.bytes_written += len(chunk)
+
+    def close(self) -> None:
+        """Close stdin, the command reads EOF once it has read all the data."""
+        with self._lock:
+            if self.closed:
+                return
+            self._closed = True
+            try:
+                self._upload(f"{self._seq:010d}-eof", "")
+            except SandboxError:
+                # The feeder removes the spool when the command exits first
+                logger.debug(f"Could not close stdin spool {self.spool}")
+
+    def feed(self, source: Any) -> None:
+        """Write a synchronous source to stdin, then close it."""
+        try:
+            if isinstance(source, (bytes, bytearray, memoryview, str)) or hasattr(
+                source, "read"
+            ):
+                for chunk in _iter_chunks(source, self.chunk_size):
+                    self.write(chunk)
+            else:
+                self._feed_items(source)
+            self.close()
+        except SandboxError as e:
+            if not self._closed_by_process and not self._stop.is_set():
+                logger.warning(str(e))
+
+    def _feed_items(self, source: Iterable[Any]) -> None:
+        # Items are read ahead by a thread into a buffer of up to one chunk, so
+        # those produced while a chunk is uploaded are sent together
+        buffer = bytearray()
+        condition = threading.Condition()
+        state = {"ended": False, "finished": False}
+
+        def produce() -> None:
+            try:
+                for chunk in _iter_chunks(source, self.chunk_size):
+                    with condition:
+                        while len(buffer) >= self.chunk_size and not state["finished"]:
+                            condition.wait(0.5)
+                        if state["finished"]:
+                            return
+                        buffer.extend(chunk)
+                        condition.notify_all()
+            except Exception as e:
+                logger.warning(f"Stdin source failed: {str(e)}")
+            finally:
+                with condition:
+                    state["ended"] = True
+                    condition.notify_all()
+
+        threading.Thread(target=produce, name="koyeb-stdin-source", daemon=True).start()
+        try:
+            while True:
+                with condition:
+                    while not buffer and not state["ended"]:
+                        condition.wait()
+                    if not buffer:
+                        return
+                    data = bytes(buffer[: self.chunk_size])
+                    del buffer[: self.chunk_size]
+                    condition.notify_all()
+                self.write(data)
+        finally:
+            with condition:
+                state["finished"] = True
+                condition.notify_all()
+
+    async def feed_async(self, source: Any) -> None:
+        """Write a source, possibly an async iterator, to stdin, then close it."""
+        loop = asyncio.get_running_loop()
+        if not hasattr(source, "__aiter__"):
+            await loop.run_in_executor(None, self.feed, source)
+            return
+        buffer = bytearray()
+        condition = asyncio.Condition()
+        ended = False
+
+        async def produce() -> None:
+            nonlocal ended
+            try:
+                async for item in source:
+                    for chunk in _iter_chunks(item, self.chunk_size):
+                        async with condition:
+                            await condition.wait_for(
+                                lambda: len(buffer) < self.chunk_size
+                            )
+                            buffer.extend(chunk)
+                            condition.notify_all()
+            except Exception as e:
+                logger.warning(f"Stdin source failed: {str(e)}")
+            finally:
+                async with condition:
+                    ended = True
+                    condition.notify_all()
+
+        producer = asyncio.ensure_future(produce())
+        try:
+            while True:
+                async with condition:
+                    await condition.wait_for(lambda: buffer or ended)
+                    if not buffer:
+                        break
+                    data = bytes(buffer[: self.chunk_size])
+                    del buffer[: self.chunk_size]
+                    condition.notify_all()
+                await loop.run_in_executor(None, self.write, data)
+            await loop.run_in_executor(None, self.close)
+        except SandboxError as e:
+            if not self._closed_by_process and not self._stop.is_set():
+                logger.warning(str(e))
+        finally:
+            producer.cancel()
+
+    def start(self, source: Any) -> Optional[threading.Thread]:
+        """Feed a synchronous source from a background thread, unless uploaded."""
+        if self._uploaded:
+            return None
+        thread = threading.Thread(
+            target=self.feed, args=(source,), name="koyeb-stdin", daemon=True
+        )
+        thread.start()
+        return thread
+
+    def feed_in_background(self, source: Any) -> Optional[asyncio.Future[None]]:
+        """
+        Feed a source, possibly an async iterator, from a task of the running
+        event loop, unless uploaded. The task is cancelled by stop().
+        """
+        if self._uploaded:
+            return None
+        self._task = asyncio.ensure_future(self.feed_async(source))
+        return self._task
+
+    def stop(self) -> None:
+        """Stop feeding, e.g. once the command has finished."""
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+
+    def discard(self) -> None:
+        """Stop feeding and remove the spool, if the feeder did not."""
+        self.stop()
+        # Wait for an upload in flight, which would create the spool again
+        locked = self._lock.acquire(timeout=_DRAIN_TIMEOUT + 30)
+        try:
+            self._run(f"rm -rf {shlex.quote(self.spool)}", timeout=30)
+        except SandboxError as e:
+            logger.debug(f"Could not remove stdin spool {self.spool}: {e}")
+        finally:
+            if locked:
+                self._lock.release()
+
+
+def wrap_stdin(
+    sandbox: Sandbox, cmd: str, stdin: Union[StdinSource, bool]
+) -> Tuple[str, Optional[StdinWriter]]:
+    """
+    Wrap a command to read the given stdin.
+
+    Small bytes or str data is embedded in the command, without any extra
+    request. Larger data and seekable files are uploaded in one request and
+    redirected to the command. Iterators, unseekable files, data over 64MiB,
+    or stdin=True to write it later, get an open StdinWriter, created with
+    one request, to stream stdin through a fifo.
+
+    Returns:
+        Tuple[str, Optional[StdinWriter]]: The wrapped command and its
+            writer, None when the data is embedded
+    """
+    data = None if stdin is True else _read_finite(stdin, _UPLOAD_LIMIT)
+    if data is not None and len(data) > _INLINE_LIMIT:
+        writer = StdinWriter(sandbox).upload(data)
+        return writer.wrap(cmd), writer
+    if data is not None:
+        decode = " ".join(
+            shlex.quote(arg)
+            for arg in [
+                "python3",
+                "-S",
+                "-c",
+                _DECODE,
+                base64.b64encode(data).decode("ascii"),
+            ]
+        )
+        return f"{decode} | {{\n{cmd}\n}}", None
+    writer = StdinWriter(sandbox).open()
+    return writer.wrap(cmd), writer
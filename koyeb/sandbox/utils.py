@@ -30,6 +30,7 @@ from koyeb.api.models.deployment_scaling_target import DeploymentScalingTarget
 from koyeb.api.models.deployment_scaling_target_sleep_idle_delay import (
     DeploymentScalingTargetSleepIdleDelay,
 )
+from koyeb.api.models.deployment_volume import DeploymentVolume
 from koyeb.api.models.docker_source import DockerSource
 from koyeb.api.models.proxy_port_protocol import ProxyPortProtocol
 
@@ -88,7 +89,10 @@ def _validate_port_protocol(protocol: str) -> str:
 
 
 def get_api_client(
-    api_token: Optional[str] = None, host: Optional[str] = None
+    api_token: Optional[str] = None,
+    host: Optional[str] = None,
+    rate_limiter: Optional[Any] = None,
+    single_flight: Optional[Any] = None,
 ) -> tuple[AppsApi, ServicesApi, InstancesApi, CatalogInstancesApi, DeploymentsApi]:
     """
     Get configured API clients for Koyeb operations.
@@ -96,6 +100,9 @@ def get_api_client(
     Args:
         api_token: Koyeb API token. If not provided, will try to get from KOYEB_API_TOKEN env var
         host: Koyeb API host URL. If not provided, will try to get from KOYEB_API_HOST env var (defaults to https://app.koyeb.com)
+        rate_limiter: Optional koyeb.api.rate_limit.RateLimiter for the API requests
+        single_flight: Optional koyeb.api.single_flight.SingleFlight, shared by the
+            clients that should coalesce identical concurrent GETs (disabled if None)
 
     Returns:
         Tuple of (AppsApi, ServicesApi, InstancesApi, CatalogInstancesApi) instances
@@ -113,8 +120,9 @@ def get_api_client(
     configuration = Configuration(host=api_host)
     configuration.api_key["Bearer"] = token
     configuration.api_key_prefix["Bearer"] = "Bearer"
+    configuration.rate_limiter = rate_limiter
 
-    api_client = ApiClient(configuration)
+    api_client = ApiClient(configuration, single_flight=single_flight)
     return (
         AppsApi(api_client),
         ServicesApi(api_client),
@@ -241,6 +249,7 @@ def create_deployment_definition(
     idle_timeout: int = 300,
     enable_tcp_proxy: bool = False,
     _experimental_enable_light_sleep: bool = False,
+    volumes: Optional[List[DeploymentVolume]] = None,
 ) -> DeploymentDefinition:
     """
     Create deployment definition for a sandbox service.
@@ -259,6 +268,7 @@ def create_deployment_definition(
         enable_tcp_proxy: If True, enables TCP proxy for direct TCP access to port 3031
         _experimental_enable_light_sleep: If True, uses light sleep when reaching idle_timeout.
             Light Sleep reduces cold starts to ~200ms. After scaling to zero, the service stays in Light Sleep for 3600s before going into Deep Sleep.
+        volumes: Persistent volumes to mount, in the deployment region
 
     Returns:
         DeploymentDefinition object
@@ -320,6 +330,7 @@ def create_deployment_definition(
         instance_types=[DeploymentInstanceType(type=instance_type)],
         scalings=scalings,
         regions=regions_list,
+        volumes=volumes,
     )
 
 
@@ -393,7 +404,9 @@ async def run_sync_in_executor(
     return await loop.run_in_executor(None, lambda: method(*args, **kwargs))
 
 
-def async_wrapper(method_name: str):
+def async_wrapper(
+    method_name: str,
+) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
     """
     Decorator to automatically create async wrapper for sync methods.
 
@@ -410,8 +423,8 @@ def async_wrapper(method_name: str):
             pass  # Implementation is handled by decorator
     """
 
-    def decorator(func):
-        async def wrapper(self, *args, **kwargs):
+    def decorator(func: Callable[..., Any]) -> Callable[..., Any]:
+        async def wrapper(self: Any, *args: Any, **kwargs: Any) -> Any:
             # Get the parent class from MRO (Method Resolution Order)
             # __mro__[0] is the current class, __mro__[1] is the parent
             parent_class = self.__class__.__mro__[1]
@@ -435,6 +448,9 @@ def create_sandbox_client(
     sandbox_url: Optional[str],
     sandbox_secret: Optional[str],
     existing_client: Optional[Any] = None,
+    rate_limiter: Optional[Any] = None,
+    resolve_url: Optional[Callable[[], Optional[str]]] = None,
+    on_request: Optional[Callable[[float], None]] = None,
 ) -> Any:
     """
     Create or return existing SandboxClient instance with validation.
@@ -446,6 +462,11 @@ def create_sandbox_client(
         sandbox_url: The sandbox URL (from _get_sandbox_url() or sandbox._get_sandbox_url())
         sandbox_secret: The sandbox secret
         existing_client: Existing client instance to return if not None
+        rate_limiter: Optional koyeb.api.rate_limit.RateLimiter for the client
+        resolve_url: Optional callable looking up the sandbox URL again when
+            requests to the cached one fail (see Sandbox._resolve_url)
+        on_request: Optional callable given the time of each response
+            (see Sandbox._record_use)
 
     Returns:
         SandboxClient: Configured client instance
@@ -463,7 +484,13 @@ def create_sandbox_client(
 
     from .executor_client import SandboxClient
 
-    return SandboxClient(sandbox_url, sandbox_secret)
+    return SandboxClient(
+        sandbox_url,
+        sandbox_secret,
+        rate_limiter=rate_limiter,
+        resolve_url=resolve_url,
+        on_request=on_request,
+    )
 
 
 class SandboxError(Exception):
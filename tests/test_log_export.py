@@ -0,0 +1,132 @@
+import gzip
+import json
+import threading
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, List, Tuple
+
+import pytest
+
+from koyeb.api.api_client import ApiClient
+from koyeb.api.configuration import Configuration
+from koyeb.api.log_export import LogExporter
+from koyeb.api.models.log_entry import LogEntry
+from koyeb.api.models.query_logs_reply import QueryLogsReply
+from koyeb.api.models.query_logs_reply_pagination import QueryLogsReplyPagination
+
+T0 = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+class FakeLogsApi:
+    """Serves query_logs from a list of entries, with inclusive bounds."""
+
+    def __init__(self, entries: List[LogEntry]) -> None:
+        self.entries = sorted(entries, key=lambda e: e.created_at or T0)
+        self.windows: List[Tuple[datetime, datetime]] = []
+        self._lock = threading.Lock()
+
+    def query_logs(
+        self, start: datetime, end: datetime, order: str, limit: str, **filters: Any
+    ) -> QueryLogsReply:
+        with self._lock:
+            self.windows.append((start, end))
+        data = [
+            e for e in self.entries if e.created_at and start <= e.created_at <= end
+        ]
+        if len(data) > int(limit):
+            next_start = data[int(limit)].created_at
+            return QueryLogsReply(
+                data=data[: int(limit)],
+                pagination=QueryLogsReplyPagination(
+                    has_more=True, next_start=next_start, next_end=end
+                ),
+            )
+        return QueryLogsReply(
+            data=data, pagination=QueryLogsReplyPagination(has_more=False)
+        )
+
+
+def entry(msg: str, seconds: float) -> LogEntry:
+    return LogEntry(msg=msg, created_at=T0 + timedelta(seconds=seconds), labels={})
+
+
+def exporter(entries: List[LogEntry], **kwargs: Any) -> Tuple[LogExporter, FakeLogsApi]:
+    logs_api = FakeLogsApi(entries)
+    exporter = LogExporter(ApiClient(Configuration(host="http://localhost")), **kwargs)
+    exporter.logs_api = logs_api  # type: ignore[assignment]
+    return exporter, logs_api
+
+
+def test_exports_every_entry_once_in_order() -> None:
+    entries = [entry(f"m{i}", i * 3.7 % 3600) for i in range(2000)]
+    export, _ = exporter(entries, shards=4, page_limit=50)
+
+    result = list(export.iter_entries(T0, T0 + timedelta(hours=1)))
+
+    assert sorted(e.msg or "" for e in result) == sorted(e.msg or "" for e in entries)
+    times = [e.created_at or T0 for e in result]
+    assert times == sorted(times)
+
+
+def test_splits_full_shards() -> None:
+    entries = [entry(f"m{i}", i) for i in range(400)]
+    export, logs_api = exporter(entries, shards=2, page_limit=100)
+
+    assert len(list(export.iter_entries(T0, T0 + timedelta(seconds=400)))) == 400
+    assert export.splits > 0
+    assert export.queries == len(logs_api.windows)
+    for start, end in logs_api.windows:
+        assert T0 <= start < end <= T0 + timedelta(seconds=400)
+
+
+def test_pages_through_dense_shards() -> None:
+    # More entries than a page holds within less than min_shard
+    entries = [entry(f"burst{i}", 10 + i / 1000) for i in range(250)]
+    export, _ = exporter(entries, shards=1, page_limit=100)
+
+    result = list(export.iter_entries(T0, T0 + timedelta(seconds=20)))
+
+    assert [e.msg for e in result] == [f"burst{i}" for i in range(250)]
+
+
+def test_warns_when_pagination_does_not_advance(
+    caplog: pytest.LogCaptureFixture,
+) -> None:
+    entries = [entry(f"burst{i}", 10) for i in range(250)]
+    export, _ = exporter(entries, shards=1, page_limit=100)
+
+    result = list(export.iter_entries(T0, T0 + timedelta(seconds=20)))
+
+    assert len(result) == 100
+    assert "did not advance" in caplog.text
+
+
+def test_deduplicates_entries_on_shard_boundaries() -> None:
+    # Both shards include the entry at their shared bound
+    entries = [entry("a", 0), entry("b", 50), entry("c", 100)]
+    export, _ = exporter(entries, shards=2)
+
+    result = list(export.iter_entries(T0, T0 + timedelta(seconds=100)))
+
+    assert [e.msg for e in result] == ["a", "b", "c"]
+
+
+def test_export_writes_gzipped_ndjson(tmp_path: Path) -> None:
+    entries = [entry(f"m{i}", i) for i in range(10)]
+    export, _ = exporter(entries, shards=3)
+    path = str(tmp_path / "logs.ndjson.gz")
+
+    assert export.export(T0, T0 + timedelta(seconds=10), path) == 10
+    with gzip.open(path, "rt") as f:
+        lines = [json.loads(line) for line in f]
+    assert [line["msg"] for line in lines] == [f"m{i}" for i in range(10)]
+
+
+def test_rejects_invalid_parameters() -> None:
+    api_client = ApiClient(Configuration(host="http://localhost"))
+    with pytest.raises(ValueError):
+        LogExporter(api_client, shards=0)
+    with pytest.raises(ValueError):
+        LogExporter(api_client, page_limit=5000)
+    with pytest.raises(ValueError):
+        LogExporter(api_client, start=T0)
@@ -0,0 +1,129 @@
+import asyncio
+import json
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+import pytest
+import urllib3
+
+from koyeb.api.api_client import ApiClient
+from koyeb.api.configuration import Configuration
+from koyeb.api.log_stream import LogStreamError, LogTail
+
+Chunk = Union[bytes, Exception]
+
+
+def frame(msg: str, second: int, **labels: str) -> bytes:
+    result = {
+        "msg": msg,
+        "created_at": f"2024-01-01T00:00:{second:02d}Z",
+        "labels": labels,
+    }
+    return json.dumps({"result": result}).encode() + b"\n"
+
+
+class FakeStream:
+    def __init__(self, chunks: List[Chunk]) -> None:
+        self.chunks = chunks
+        self.closed = False
+
+    def stream(self, chunk_size: int) -> Iterator[bytes]:
+        for chunk in self.chunks:
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+
+    def close(self) -> None:
+        self.closed = True
+
+
+class FakeResponse:
+    def __init__(self, chunks: List[Chunk]) -> None:
+        self.response = FakeStream(chunks)
+
+
+class ScriptedTail(LogTail):
+    """Serves one scripted response per connection, then closes the tail."""
+
+    def __init__(self, connections: List[List[Chunk]], **kwargs: Any) -> None:
+        kwargs.setdefault("reconnect_backoff", 0)
+        super().__init__(ApiClient(Configuration(host="http://localhost")), **kwargs)
+        self.connections = connections
+        self.starts: List[Optional[datetime]] = []
+
+    def _open(self) -> FakeResponse:
+        self.starts.append(self.last_timestamp)
+        if not self.connections:
+            self.close()
+            return FakeResponse([])
+        return FakeResponse(self.connections.pop(0))
+
+
+def messages(tail: LogTail) -> List[Optional[str]]:
+    return [entry.msg for entry in tail]
+
+
+def test_parses_frames_split_across_chunks() -> None:
+    data = frame("a", 1) + frame("b", 2)
+    chunks: List[Chunk] = [data[i : i + 7] for i in range(0, len(data), 7)]
+
+    assert messages(ScriptedTail([chunks], reconnect=False)) == ["a", "b"]
+
+
+def test_reconnects_from_last_timestamp_and_skips_duplicates() -> None:
+    drop = urllib3.exceptions.ProtocolError("connection reset")
+    tail = ScriptedTail(
+        [
+            [frame("a", 1), frame("b", 2), drop],
+            # The server replays entries at the resume timestamp
+            [frame("b", 2), frame("c", 2), frame("d", 3)],
+        ]
+    )
+
+    assert messages(tail) == ["a", "b", "c", "d"]
+    assert tail.starts[0] is None
+    assert tail.starts[1] == datetime.fromisoformat("2024-01-01T00:00:02+00:00")
+
+
+def test_entries_with_same_message_and_different_labels_are_kept() -> None:
+    tail = ScriptedTail(
+        [[frame("a", 1, instance="i1"), frame("a", 1, instance="i2")]],
+        reconnect=False,
+    )
+
+    assert messages(tail) == ["a", "a"]
+
+
+def test_skips_malformed_and_oversized_frames() -> None:
+    tail = ScriptedTail(
+        [[b"not json\n", b"x" * 120, b"x\n", frame("a", 1)]],
+        reconnect=False,
+        max_line_bytes=100,
+    )
+
+    assert messages(tail) == ["a"]
+
+
+def test_error_frame_raises() -> None:
+    error: Dict[str, Any] = {"error": {"code": 13, "message": "internal"}}
+    tail = ScriptedTail([[json.dumps(error).encode() + b"\n"]])
+
+    with pytest.raises(LogStreamError, match="internal"):
+        messages(tail)
+
+
+def test_gives_up_after_max_reconnects() -> None:
+    drop = urllib3.exceptions.ProtocolError("connection reset")
+    tail = ScriptedTail([[drop], [drop], [drop]], max_reconnects=1)
+
+    with pytest.raises(LogStreamError):
+        messages(tail)
+    assert len(tail.starts) == 2
+
+
+def test_async_iteration() -> None:
+    async def collect() -> List[Optional[str]]:
+        tail = ScriptedTail([[frame("a", 1), frame("b", 2)]], reconnect=False)
+        return [entry.msg async for entry in tail]
+
+    assert asyncio.run(collect()) == ["a", "b"]
@@ -0,0 +1,85 @@
+import math
+from typing import List, Sequence
+
+import pytest
+
+from koyeb.api.metrics_client import (
+    MetricSeries,
+    _format_step,
+    align,
+    downsample,
+    parse_step,
+)
+
+
+def series(points: Sequence[float], values: Sequence[float]) -> MetricSeries:
+    result = MetricSeries("instance", "i1", "MEM_RSS")
+    result.timestamps.extend(points)
+    result.values.extend(values)
+    return result
+
+
+def as_list(values: Sequence[float]) -> List[float]:
+    return [float(v) for v in values]
+
+
+@pytest.mark.parametrize(
+    "step, seconds",
+    [("30s", 30), ("5m", 300), ("1h", 3600), (" 2 m ", 120), ("90", 90), (60, 60)],
+)
+def test_parse_step(step: str, seconds: float) -> None:
+    assert parse_step(step) == seconds
+
+
+@pytest.mark.parametrize("step", ["5d", "m", "", "-1m", 0, -5])
+def test_parse_step_rejects_invalid_steps(step: str) -> None:
+    with pytest.raises(ValueError):
+        parse_step(step)
+
+
+def test_format_step() -> None:
+    assert _format_step(60) == "1m"
+    assert _format_step(5400) == "90m"
+    assert _format_step(7200) == "2h"
+    with pytest.raises(ValueError):
+        _format_step(30)
+
+
+def test_downsample() -> None:
+    data = series([0, 30, 60, 150], [1, 3, 10, 20])
+
+    mean = downsample(data, "1m")
+    assert as_list(mean.timestamps) == [0, 60, 120]
+    assert as_list(mean.values) == [2, 10, 20]
+    assert as_list(downsample(data, "1m", how="max").values) == [3, 10, 20]
+    with pytest.raises(ValueError):
+        downsample(data, "1m", how="median")
+
+
+def test_align_fills_missing_cells_with_nan() -> None:
+    first = series([60, 120, 180], [1, 2, 3])
+    second = series([130, 250], [10, 20])
+
+    grid, rows = align([first, second], "1m")
+
+    assert as_list(grid) == [60, 120, 180, 240]
+    assert as_list(rows[0])[:3] == [1, 2, 3]
+    assert math.isnan(rows[0][3])
+    assert math.isnan(rows[1][0])
+    assert math.isnan(rows[1][2])
+    assert (rows[1][1], rows[1][3]) == (10, 20)
+
+
+def test_align_with_explicit_bounds() -> None:
+    grid, rows = align([series([0, 600], [1, 2])], "5m", start=301, end=900)
+
+    assert as_list(grid) == [300, 600, 900]
+    assert math.isnan(rows[0][0])
+    assert rows[0][1] == 2
+
+
+def test_align_empty_series() -> None:
+    grid, rows = align([MetricSeries("instance", "i1", "MEM_RSS")], "1m")
+
+    assert len(grid) == 1
+    assert len(rows) == 1
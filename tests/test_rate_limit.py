@@ -0,0 +1,159 @@
+import email.utils
+from typing import Dict, List, Optional
+
+import pytest
+import urllib3
+
+from koyeb.api import rate_limit
+from koyeb.api.rate_limit import (
+    RateLimiter,
+    TokenBucket,
+    compute_backoff,
+    parse_rate_limit_reset,
+    parse_retry_after,
+)
+from koyeb.api.rest import RESTResponse
+
+URL = "https://app.koyeb.com/v1/apps"
+
+
+class Clock:
+    """Fake monotonic and wall clock, advanced by sleeping."""
+
+    def __init__(self) -> None:
+        self.now = 1000.0
+        self.sleeps: List[float] = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def time(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(rate_limit.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(rate_limit.time, "time", clock.time)
+    monkeypatch.setattr(rate_limit.time, "sleep", clock.sleep)
+    return clock
+
+
+def make_response(
+    status: int, headers: Optional[Dict[str, str]] = None
+) -> RESTResponse:
+    return RESTResponse(
+        urllib3.HTTPResponse(body=b"", status=status, headers=headers or {})
+    )
+
+
+def test_parse_retry_after_seconds() -> None:
+    assert parse_retry_after({"Retry-After": "3"}) == 3.0
+    assert parse_retry_after({"retry-after": " 1.5 "}) == 1.5
+    assert parse_retry_after({"Retry-After": "-2"}) == 0.0
+
+
+def test_parse_retry_after_http_date(clock: Clock) -> None:
+    date = email.utils.formatdate(clock.now + 30, usegmt=True)
+    assert parse_retry_after({"Retry-After": date}) == pytest.approx(30, abs=1)
+
+
+def test_parse_retry_after_invalid() -> None:
+    assert parse_retry_after(None) is None
+    assert parse_retry_after({}) is None
+    assert parse_retry_after({"Retry-After": "soon"}) is None
+
+
+def test_parse_rate_limit_reset(clock: Clock) -> None:
+    exhausted = {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "12"}
+    assert parse_rate_limit_reset(exhausted) == 12.0
+    epoch = {"RateLimit-Remaining": "0", "RateLimit-Reset": str(clock.now + 5e7)}
+    assert parse_rate_limit_reset(epoch) == pytest.approx(5e7)
+    remaining = {"X-RateLimit-Remaining": "3", "X-RateLimit-Reset": "12"}
+    assert parse_rate_limit_reset(remaining) is None
+
+
+def test_compute_backoff_bounds() -> None:
+    for attempt in range(10):
+        delay = compute_backoff(attempt, base=0.5, cap=8.0)
+        ceiling = min(8.0, 0.5 * 2**attempt)
+        assert ceiling / 2 <= delay <= ceiling
+    assert compute_backoff(0, base=0.5, cap=8.0, retry_after=20) >= 20
+
+
+def test_token_bucket_allows_burst_then_throttles(clock: Clock) -> None:
+    bucket = TokenBucket(rate=2, burst=3)
+
+    assert [bucket.acquire() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.acquire() == pytest.approx(0.5)
+    # The sleep refilled the token that was just taken
+    assert bucket.acquire() == pytest.approx(0.5)
+
+
+def test_token_bucket_refills_up_to_burst(clock: Clock) -> None:
+    bucket = TokenBucket(rate=1, burst=2)
+    bucket.acquire()
+    bucket.acquire()
+
+    clock.now += 100
+    assert [bucket.acquire() for _ in range(2)] == [0.0, 0.0]
+    assert bucket.acquire() == pytest.approx(1.0)
+
+
+def test_token_bucket_pause(clock: Clock) -> None:
+    bucket = TokenBucket(rate=10, burst=10)
+    bucket.pause(4)
+    assert bucket.acquire() == pytest.approx(4.0)
+
+
+def test_token_bucket_rejects_invalid_parameters() -> None:
+    with pytest.raises(ValueError):
+        TokenBucket(rate=0, burst=1)
+    with pytest.raises(ValueError):
+        TokenBucket(rate=1, burst=0)
+
+
+def test_buckets_are_shared_per_host_and_token() -> None:
+    limiter = RateLimiter()
+
+    assert limiter.bucket(URL, "a") is limiter.bucket(URL + "/1", "a")
+    assert limiter.bucket(URL, "a") is not limiter.bucket(URL, "b")
+    assert limiter.bucket(URL, "a") is not limiter.bucket("https://other/v1", "a")
+
+
+def test_execute_retries_429_with_retry_after(clock: Clock) -> None:
+    limiter = RateLimiter(max_retries=3)
+    responses = [make_response(429, {"Retry-After": "7"}), make_response(200)]
+
+    response = limiter.execute("POST", URL, {}, lambda: responses.pop(0))
+
+    assert response.status == 200
+    assert limiter.stats.retries == 1
+    assert limiter.stats.rate_limited_responses == 1
+    assert clock.sleeps[0] >= 7
+
+
+def test_execute_does_not_retry_non_idempotent_errors(clock: Clock) -> None:
+    limiter = RateLimiter()
+    first = make_response(503)
+
+    assert limiter.execute("POST", URL, {}, lambda: first) is first
+    assert limiter.stats.retries == 0
+    assert first.data is None
+
+
+def test_execute_gives_up_after_max_retries(clock: Clock) -> None:
+    limiter = RateLimiter(max_retries=2)
+    calls: List[int] = []
+
+    def send() -> RESTResponse:
+        calls.append(1)
+        return make_response(503)
+
+    assert limiter.execute("GET", URL, {}, send).status == 503
+    assert len(calls) == 3
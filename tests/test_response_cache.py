@@ -0,0 +1,136 @@
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import pytest
+
+from koyeb.api import response_cache
+from koyeb.api.response_cache import ResponseCache
+
+URL = "https://app.koyeb.com/v1/catalog/regions"
+
+
+class FakeResponse:
+    def __init__(
+        self, status: int, data: bytes, headers: Optional[Dict[str, str]] = None
+    ) -> None:
+        self.status = status
+        self.reason = "OK"
+        self.headers = headers or {}
+        self._data = data
+
+    def read(self) -> bytes:
+        return self._data
+
+
+class FakeServer:
+    """Answers with a new body per call, and 304 to a matching If-None-Match."""
+
+    def __init__(self, etag: Optional[str] = None) -> None:
+        self.etag = etag
+        self.requests: List[Dict[str, str]] = []
+
+    def __call__(self, headers: Dict[str, str]) -> FakeResponse:
+        self.requests.append(headers)
+        if self.etag and headers.get("If-None-Match") == self.etag:
+            return FakeResponse(304, b"")
+        body = f"body-{len(self.requests)}".encode()
+        return FakeResponse(200, body, {"ETag": self.etag} if self.etag else {})
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(response_cache.time, "time", clock)
+    return clock
+
+
+def test_serves_fresh_entries_from_cache(clock: Clock) -> None:
+    cache = ResponseCache(ttls={r"^/v1/catalog/regions$": 60})
+    server = FakeServer()
+
+    assert cache.request(URL, {}, server).read() == b"body-1"
+    clock.now += 59
+    assert cache.request(URL, {}, server).read() == b"body-1"
+    assert len(server.requests) == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_refetches_expired_entries(clock: Clock) -> None:
+    cache = ResponseCache(ttls={r"^/v1/catalog/regions$": 60})
+    server = FakeServer()
+
+    cache.request(URL, {}, server)
+    clock.now += 61
+    assert cache.request(URL, {}, server).read() == b"body-2"
+    assert "If-None-Match" not in server.requests[1]
+
+
+def test_revalidates_expired_entries_with_etag(clock: Clock) -> None:
+    cache = ResponseCache(ttls={r"^/v1/catalog/regions$": 60})
+    server = FakeServer(etag='"v1"')
+
+    cache.request(URL, {}, server)
+    clock.now += 61
+    response = cache.request(URL, {}, server)
+
+    assert server.requests[1]["If-None-Match"] == '"v1"'
+    assert response.status == 200
+    assert response.read() == b"body-1"
+    assert cache.revalidations == 1
+    # The 304 refreshed the entry for another TTL
+    clock.now += 59
+    cache.request(URL, {}, server)
+    assert len(server.requests) == 2
+
+
+def test_evicts_least_recently_used_entries(clock: Clock) -> None:
+    cache = ResponseCache(default_ttl=60, max_entries=2)
+    server = FakeServer()
+
+    cache.request(URL + "/a", {}, server)
+    cache.request(URL + "/b", {}, server)
+    cache.request(URL + "/a", {}, server)
+    cache.request(URL + "/c", {}, server)
+
+    assert len(cache) == 2
+    cache.request(URL + "/a", {}, server)
+    assert len(server.requests) == 3
+    cache.request(URL + "/b", {}, server)
+    assert len(server.requests) == 4
+
+
+def test_does_not_cache_unmatched_paths_or_errors(clock: Clock) -> None:
+    cache = ResponseCache()
+    server = FakeServer()
+
+    cache.request("https://app.koyeb.com/v1/apps", {}, server)
+    cache.request(URL, {}, lambda headers: FakeResponse(500, b"oops"))
+    assert len(cache) == 0
+
+
+def test_keys_entries_on_credentials(clock: Clock) -> None:
+    cache = ResponseCache()
+    server = FakeServer()
+
+    cache.request(URL, {"Authorization": "Bearer a"}, server)
+    cache.request(URL, {"Authorization": "Bearer b"}, server)
+    assert len(server.requests) == 2
+
+
+def test_persists_entries(clock: Clock, tmp_path: Path) -> None:
+    path = str(tmp_path / "cache.json")
+    server = FakeServer()
+    ResponseCache(persist_path=path).request(URL, {}, server)
+
+    cache = ResponseCache(persist_path=path)
+    assert cache.request(URL, {}, server).read() == b"body-1"
+    assert len(server.requests) == 1
+    assert cache.invalidate("regions") == 1
@@ -0,0 +1,87 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+import pytest
+
+from koyeb.sandbox.shell import _SHELL_KERNEL
+
+pytestmark = pytest.mark.skipif(
+    sys.platform == "win32", reason="the shell kernel uses unix sockets"
+)
+
+Run = Callable[[str], Tuple[str, str, Dict[str, Any]]]
+
+
+@pytest.fixture
+def run(tmp_path: Path) -> Iterator[Run]:
+    """Runs the shell kernel locally and sends it commands."""
+    path = str(tmp_path / "shell.sock")
+    kernel = subprocess.Popen([sys.executable, "-c", _SHELL_KERNEL, path, "sh"])
+    deadline = time.monotonic() + 10
+    while not os.path.exists(path):
+        assert time.monotonic() < deadline, "the kernel did not start"
+        time.sleep(0.01)
+
+    def execute(command: str) -> Tuple[str, str, Dict[str, Any]]:
+        stdout: List[str] = []
+        stderr: List[str] = []
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+            conn.settimeout(10)
+            conn.connect(path)
+            request = {"op": "execute", "command": command}
+            conn.sendall((json.dumps(request) + "\n").encode())
+            for line in conn.makefile("rb"):
+                frame = json.loads(line)
+                if frame["type"] == "stream":
+                    (stdout if frame["name"] == "stdout" else stderr).append(
+                        frame["text"]
+                    )
+                elif frame["type"] == "done":
+                    return "".join(stdout), "".join(stderr), frame
+        raise AssertionError("the kernel closed the connection without a result")
+
+    yield execute
+    kernel.kill()
+    kernel.wait()
+
+
+def test_splits_stdout_stderr_and_exit_code(run: Run) -> None:
+    stdout, stderr, done = run("echo out; echo err >&2")
+    assert (stdout, stderr, done["exit_code"]) == ("out\n", "err\n", 0)
+
+    stdout, stderr, done = run("echo before; (exit 3)")
+    assert (stdout, stderr, done["exit_code"]) == ("before\n", "", 3)
+
+
+def test_output_without_trailing_newline(run: Run) -> None:
+    stdout, stderr, _ = run("printf abc; printf def >&2")
+    assert (stdout, stderr) == ("abc", "def")
+
+
+def test_keeps_text_resembling_a_marker(run: Run) -> None:
+    stdout, _, done = run("printf '__koyeb_'; echo; printf '__koyeb_'")
+    assert stdout == "__koyeb_\n__koyeb_"
+    assert done["exit_code"] == 0
+
+
+def test_large_and_multibyte_output(run: Run) -> None:
+    stdout, _, _ = run("i=0; while [ $i -lt 20000 ]; do printf 'é€'; i=$((i+1)); done")
+    assert stdout == "é€" * 20000
+
+
+def test_state_persists_between_commands(run: Run, tmp_path: Path) -> None:
+    run(f"cd {tmp_path}; export GREETING=hello")
+    stdout, _, _ = run('pwd; echo "$GREETING"')
+    assert stdout == f"{tmp_path}\nhello\n"
+
+
+def test_exit_ends_the_session(run: Run) -> None:
+    stdout, _, done = run("echo bye; exit 4")
+    assert stdout == "bye\n"
+    assert done == {"type": "done", "exit_code": 4, "exited": True}
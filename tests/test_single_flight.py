@@ -0,0 +1,124 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+import pytest
+
+from koyeb.api.single_flight import SingleFlight
+
+URL = "https://app.koyeb.com/v1/services/1"
+
+
+class FakeResponse:
+    def __init__(self, data: bytes) -> None:
+        self.status = 200
+        self.reason = "OK"
+        self.headers: Dict[str, str] = {}
+        self._data = data
+
+    def read(self) -> bytes:
+        return self._data
+
+
+class BlockingServer:
+    """Holds every request until released, counting the requests received."""
+
+    def __init__(self) -> None:
+        self.release = threading.Event()
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, headers: Dict[str, str]) -> FakeResponse:
+        with self._lock:
+            self.calls += 1
+            number = self.calls
+        self.release.wait(5)
+        return FakeResponse(f"body-{number}".encode())
+
+
+def _wait_for_waiters(flight: SingleFlight, count: int) -> None:
+    for _ in range(500):
+        if flight.requests >= count:
+            return
+        threading.Event().wait(0.01)
+    raise AssertionError("requests did not arrive")
+
+
+def test_coalesces_identical_concurrent_requests() -> None:
+    flight = SingleFlight()
+    server = BlockingServer()
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        futures = [
+            pool.submit(flight.request, "GET", URL, {"Authorization": "a"}, server)
+            for _ in range(8)
+        ]
+        _wait_for_waiters(flight, 8)
+        server.release.set()
+        bodies = [future.result().read() for future in futures]
+
+    assert server.calls == 1
+    assert bodies == [b"body-1"] * 8
+    assert flight.coalesced == 7
+    assert flight.in_flight() == 0
+
+
+def test_each_caller_gets_its_own_response() -> None:
+    flight = SingleFlight()
+    server = BlockingServer()
+    server.release.set()
+
+    first = flight.request("GET", URL, {}, server)
+    second = flight.request("GET", URL, {}, server)
+
+    # Sequential requests are not coalesced
+    assert server.calls == 2
+    assert first is not second
+
+
+def test_does_not_coalesce_different_credentials() -> None:
+    flight = SingleFlight()
+    server = BlockingServer()
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        futures = [
+            pool.submit(flight.request, "GET", URL, {"Authorization": token}, server)
+            for token in ("a", "b")
+        ]
+        _wait_for_waiters(flight, 2)
+        server.release.set()
+        for future in futures:
+            future.result()
+
+    assert server.calls == 2
+    assert flight.coalesced == 0
+
+
+def test_shares_the_leader_exception() -> None:
+    flight = SingleFlight()
+    release = threading.Event()
+    calls: List[int] = []
+
+    def fail(headers: Dict[str, str]) -> FakeResponse:
+        calls.append(1)
+        release.wait(5)
+        raise ConnectionError("boom")
+
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        futures = [pool.submit(flight.request, "GET", URL, {}, fail) for _ in range(3)]
+        _wait_for_waiters(flight, 3)
+        release.set()
+        for future in futures:
+            with pytest.raises(ConnectionError):
+                future.result()
+
+    assert len(calls) == 1
+    assert flight.in_flight() == 0
+
+
+def test_accepts_only_configured_methods() -> None:
+    flight = SingleFlight()
+
+    assert flight.accepts("get")
+    assert not flight.accepts("POST")
+    assert SingleFlight(methods=["POST"]).accepts("post")
@@ -0,0 +1,147 @@
+import io
+import os
+import subprocess
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Tuple, cast
+
+import pytest
+
+from koyeb.sandbox.sandbox import Sandbox
+from koyeb.sandbox.stdin import (
+    _INLINE_LIMIT,
+    StdinWriter,
+    _iter_chunks,
+    _read_finite,
+    wrap_stdin,
+)
+
+pytestmark = pytest.mark.skipif(
+    sys.platform == "win32", reason="wrapped commands are POSIX shell scripts"
+)
+
+
+class LocalClient:
+    """Executor client running commands and writing files on this machine."""
+
+    def __init__(self) -> None:
+        self.commands: List[str] = []
+        self.files: List[str] = []
+
+    def run(self, cmd: str, timeout: float) -> Dict[str, Any]:
+        self.commands.append(cmd)
+        result = subprocess.run(
+            ["sh", "-c", cmd], capture_output=True, text=True, timeout=timeout
+        )
+        return {
+            "stdout": result.stdout,
+            "stderr": result.stderr,
+            "exit_code": result.returncode,
+        }
+
+    def write_file(self, path: str, content: str) -> Dict[str, Any]:
+        self.files.append(path)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+        return {}
+
+
+class LocalSandbox:
+    def __init__(self) -> None:
+        self.client = LocalClient()
+
+    def _get_client(self) -> LocalClient:
+        return self.client
+
+
+def local_sandbox() -> Tuple[Sandbox, LocalClient]:
+    sandbox = LocalSandbox()
+    return cast(Sandbox, sandbox), sandbox.client
+
+
+def run_wrapped(command: str) -> bytes:
+    return subprocess.run(
+        ["sh", "-c", command], capture_output=True, check=True, timeout=30
+    ).stdout
+
+
+def test_iter_chunks_splits_data() -> None:
+    chunks = [bytes(c) for c in _iter_chunks(b"abcdefg", 3)]
+    assert chunks == [b"abc", b"def", b"g"]
+    assert [bytes(c) for c in _iter_chunks("é", 1)] == [b"\xc3", b"\xa9"]
+
+
+def test_iter_chunks_reads_files_and_iterators() -> None:
+    assert list(_iter_chunks(io.StringIO("abcde"), 2)) == [b"ab", b"cd", b"e"]
+    chunks = [bytes(c) for c in _iter_chunks(iter([b"abcd", "ef"]), 3)]
+    assert chunks == [b"abc", b"d", b"ef"]
+
+
+def test_read_finite() -> None:
+    assert _read_finite("abc", 10) == b"abc"
+    assert _read_finite(b"abc", 2) is None
+    assert _read_finite(iter([b"abc"]), 10) is None
+
+    source = io.BytesIO(b"0123456789")
+    source.seek(4)
+    assert _read_finite(source, 6) == b"456789"
+    source.seek(4)
+    assert _read_finite(source, 5) is None
+    # Nothing was consumed from a source over the limit
+    assert source.tell() == 4
+
+
+def test_small_data_is_inlined() -> None:
+    sandbox, client = local_sandbox()
+    data = bytes(range(256)) * 4
+
+    command, writer = wrap_stdin(sandbox, "cat", data)
+
+    assert writer is None
+    assert client.commands == client.files == []
+    assert run_wrapped(command) == data
+
+
+def test_inlined_command_keeps_its_syntax() -> None:
+    sandbox, _ = local_sandbox()
+
+    command, _ = wrap_stdin(sandbox, 'read line; echo "got $line"\nexit 0', "hi\n")
+
+    assert run_wrapped(command) == b"got hi\n"
+
+
+@pytest.mark.parametrize(
+    "data",
+    [b"x" * (_INLINE_LIMIT + 1), bytes(range(256)) * 300],
+    ids=["text", "binary"],
+)
+def test_larger_data_is_uploaded(data: bytes) -> None:
+    sandbox, client = local_sandbox()
+
+    command, writer = wrap_stdin(sandbox, "cat", data)
+
+    assert writer is not None and writer.closed
+    assert client.files == [writer.spool]
+    assert run_wrapped(command) == data
+    assert not os.path.exists(writer.spool)
+
+
+def test_iterators_are_streamed_with_a_window() -> None:
+    sandbox, client = local_sandbox()
+    writer = StdinWriter(sandbox, chunk_size=4, window=2).open()
+    process = subprocess.Popen(["sh", "-c", writer.wrap("cat")], stdout=subprocess.PIPE)
+    feeder = threading.Thread(target=writer.feed, args=(iter([b"0123456789"] * 5),))
+    feeder.start()
+
+    stdout, _ = process.communicate(timeout=30)
+    feeder.join(30)
+
+    assert stdout == b"0123456789" * 5
+    assert writer.bytes_written == 50
+    assert any("mkfifo" in command for command in client.commands)
+    # The feeder removes the spool once the command has read EOF
+    deadline = time.monotonic() + 10
+    while os.path.exists(writer.spool) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert not os.path.exists(writer.spool)